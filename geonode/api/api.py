@@ -262,6 +262,7 @@ class RegionResource(TypeFilteredResource):
         queryset = Region.objects.all().order_by('name')
         resource_name = 'regions'
         allowed_methods = ['get']
+        excludes = ['bbox_polygon']
         filtering = {
             'name': ALL,
             'code': ALL,
@@ -18,10 +18,19 @@
 #
 #########################################################################
 
+from urllib.parse import urlencode
+
 from django.conf import settings
+from django.db.models import QuerySet
 from tastypie.exceptions import BadRequest
 from tastypie.paginator import Paginator
 
+from geonode.base.api.pagination import (
+    CURSOR_QUERY_PARAM,
+    COUNT_QUERY_PARAM,
+    KeysetPage,
+    get_count)
+
 
 class CrossSiteXHRPaginator(Paginator):
 
@@ -80,3 +89,45 @@ class CrossSiteXHRPaginator(Paginator):
             raise BadRequest("Invalid offset provided. Please provide a positive integer >= 0.")
 
         return offset
+
+    def _generate_cursor_uri(self, cursor):
+        if self.resource_uri is None or cursor is None:
+            return None
+
+        if hasattr(self.request_data, 'lists'):
+            request_params = {_k: _v for _k, _v in self.request_data.lists()}
+        else:
+            request_params = dict(self.request_data)
+        request_params.pop('offset', None)
+        request_params[CURSOR_QUERY_PARAM] = cursor
+        return '%s?%s' % (self.resource_uri, urlencode(request_params, doseq=True))
+
+    def page(self):
+        """
+        Generates the page of objects, walking the objects with keyset pagination
+        when a ``cursor`` is requested.
+
+        Keyset pages carry opaque ``next``/``previous`` cursor links and a
+        ``total_count`` that, depending on the ``count`` parameter, is exact,
+        estimated or not computed at all.
+        """
+        limit = self.get_limit()
+        if CURSOR_QUERY_PARAM not in self.request_data or not limit or \
+                not isinstance(self.objects, QuerySet):
+            return super(CrossSiteXHRPaginator, self).page()
+
+        try:
+            keyset = KeysetPage(self.objects, self.request_data.get(CURSOR_QUERY_PARAM), limit)
+        except ValueError:
+            raise BadRequest("Invalid cursor provided.")
+
+        meta = {
+            'limit': limit,
+            'next': self._generate_cursor_uri(keyset.next_cursor),
+            'previous': self._generate_cursor_uri(keyset.previous_cursor),
+            'total_count': get_count(self.objects, self.request_data.get(COUNT_QUERY_PARAM)),
+        }
+        return {
+            self.collection_name: keyset,
+            'meta': meta,
+        }
@@ -22,7 +22,7 @@ import json
 import logging
 
 from django.urls import resolve
-from django.db.models import Q
+from django.db.models import Q, Prefetch, prefetch_related_objects
 from django.http import HttpResponse
 from django.conf import settings
 from django.contrib.staticfiles.templatetags import staticfiles
@@ -39,7 +39,6 @@ from tastypie.utils import trailing_slash
 from guardian.shortcuts import get_objects_for_user
 
 from django.conf.urls import url
-from django.core.paginator import Paginator, InvalidPage
 from django.http import Http404
 from django.core.exceptions import ObjectDoesNotExist
 from django.forms.models import model_to_dict
@@ -47,16 +46,16 @@ from django.forms.models import model_to_dict
 from tastypie.utils.mime import build_content_type
 
 from geonode import get_version, qgis_server, geoserver
-from geonode.layers.models import Layer
+from geonode.layers.models import Layer, UploadSession
 from geonode.maps.models import Map
 from geonode.geoapps.models import GeoApp
 from geonode.documents.models import Document
 from geonode.base.models import ResourceBase
 from geonode.base.models import HierarchicalKeyword
-from geonode.base.bbox_utils import filter_bbox
+from geonode.base.bbox_utils import filter_bbox, rank_bbox
 from geonode.groups.models import GroupProfile
 from geonode.utils import check_ogc_backend
-from geonode.security.utils import get_visible_resources
+from geonode.security.utils import get_visible_resources, get_visible_resources_sq
 from .authentication import OAuthAuthentication
 from .authorization import GeoNodeAuthorization, GeonodeApiKeyAuthentication
 
@@ -158,6 +157,17 @@ class CommonModelApi(ModelResource):
         'is_published',
         'dirty_state',
     ]
+    # relations read by format_objects, loaded once for a whole page
+    LIST_PREFETCH = [
+        'owner',
+        'curatedthumbnail',
+    ]
+    RESOURCE_LIST_PREFETCH = LIST_PREFETCH + [
+        'category',
+        'group',
+        'keywords',
+        'regions',
+    ]
 
     def build_filters(self, filters=None, ignore_bad_filters=False, **kwargs):
         if filters is None:
@@ -235,6 +245,8 @@ class CommonModelApi(ModelResource):
 
         if extent:
             filtered = filter_bbox(filtered, extent)
+            if request and request.GET.get('extent_ranking') == 'overlap':
+                filtered = rank_bbox(filtered, extent)
 
         if keywords:
             filtered = self.filter_h_keywords(filtered, keywords)
@@ -475,63 +487,36 @@ class CommonModelApi(ModelResource):
         sqs = self.build_haystack_filters(request.GET)
 
         if not settings.SKIP_PERMS_FILTER:
-
-            filter_set = get_objects_for_user(
-                request.user, 'base.view_resourcebase')
-
-            filter_set = get_visible_resources(
-                filter_set,
+            # The visibility rules are indexed, see geonode.base.search_indexes
+            visible = get_visible_resources_sq(
                 request.user if request else None,
                 admin_approval_required=settings.ADMIN_MODERATE_UPLOADS,
                 unpublished_not_visible=settings.RESOURCE_PUBLISHING,
                 private_groups_not_visibile=settings.GROUP_PRIVATE_RESOURCES)
-
-            filter_set_ids = filter_set.values_list('id')
-            # Do the query using the filterset and the query term. Facet the
-            # results
-            if len(filter_set) > 0:
-                sqs = sqs.filter(id__in=filter_set_ids).facet('type').facet('subtype').facet(
-                    'owner') .facet('keywords').facet('regions').facet('category')
-            else:
-                sqs = None
-        else:
-            sqs = sqs.facet('type').facet('subtype').facet(
-                'owner').facet('keywords').facet('regions').facet('category')
-
-        if sqs:
-            # Build the Facet dict
-            facets = {}
-            for facet in sqs.facet_counts()['fields']:
-                facets[facet] = {}
-                for item in sqs.facet_counts()['fields'][facet]:
-                    facets[facet][item[0]] = item[1]
-
-            # Paginate the results
-            paginator = Paginator(sqs, request.GET.get('limit'))
-
-            try:
-                page = paginator.page(
-                    int(request.GET.get('offset') or 0) /
-                    int(request.GET.get('limit') or 0 + 1))
-            except InvalidPage:
-                raise Http404("Sorry, no results on that page.")
-
-            if page.has_previous():
-                previous_page = page.previous_page_number()
-            else:
-                previous_page = 1
-            if page.has_next():
-                next_page = page.next_page_number()
-            else:
-                next_page = 1
-            total_count = sqs.count()
-            objects = page.object_list
-        else:
-            next_page = 0
-            previous_page = 0
-            total_count = 0
-            facets = {}
-            objects = []
+            if visible is not None:
+                sqs = sqs.filter(visible)
+        sqs = sqs.facet('type').facet('subtype').facet(
+            'owner').facet('keywords').facet('regions').facet('category')
+
+        limit = int(request.GET.get('limit') or settings.CLIENT_RESULTS_LIMIT)
+        offset = int(request.GET.get('offset') or 0)
+        if limit < 1 or offset < 0:
+            raise Http404("Sorry, no results on that page.")
+
+        # A single query to the search backend returns the page, the total count and the facets
+        objects = sqs[offset:offset + limit]
+        total_count = sqs.count()
+        if offset and offset >= total_count:
+            raise Http404("Sorry, no results on that page.")
+
+        # Build the Facet dict
+        facets = {}
+        for facet, items in (sqs.facet_counts().get('fields') or {}).items():
+            facets[facet] = {item[0]: item[1] for item in items}
+
+        page = offset // limit + 1
+        previous_page = page - 1 if page > 1 else 1
+        next_page = page + 1 if offset + limit < total_count else 1
 
         object_list = {
             "meta": {
@@ -550,7 +535,7 @@ class CommonModelApi(ModelResource):
 
     def get_haystack_api_fields(self, haystack_object):
         return {k: v for k, v in haystack_object.get_stored_fields().items()
-                if not re.search('_exact$|_sortable$', k)}
+                if not re.search('_exact$|_sortable$|^acl_', k)}
 
     def get_list(self, request, **kwargs):
         """
@@ -585,6 +570,26 @@ class CommonModelApi(ModelResource):
         return self.create_response(
             request, to_be_serialized, response_objects=objects)
 
+    def prefetch_objects(self, objects):
+        """
+        Loads the LIST_PREFETCH relations of the objects of a page with one query
+        per relation instead of a few queries per object.
+        """
+        objects = list(objects)
+        prefetch_related_objects(objects, *self.LIST_PREFETCH)
+        return objects
+
+    def get_group_profiles(self, objects):
+        """
+        Returns the GroupProfiles of the groups of the objects, by slug.
+        """
+        group_names = {obj.group.name for obj in objects if obj.group}
+        if not group_names:
+            return {}
+        return {
+            profile.slug: profile for profile in GroupProfile.objects.filter(slug__in=group_names)
+        }
+
     def format_objects(self, objects):
         """
         Format the objects for output in a response.
@@ -595,6 +600,7 @@ class CommonModelApi(ModelResource):
                 del self.VALUES[idx]
 
         # hack needed because dehydrate does not seem to work in CommonModelApi
+        objects = self.prefetch_objects(objects)
         formatted_objects = []
         for obj in objects:
             formatted_obj = model_to_dict(obj, fields=self.VALUES)
@@ -636,9 +642,13 @@ class CommonModelApi(ModelResource):
         filtered_objects_ids = None
         try:
             if data['objects']:
-                filtered_objects_ids = [
-                    item.id for item in data['objects'] if request.user.has_perm(
-                        'view_resourcebase', item.get_self_resource())]
+                page_ids = [item.id for item in data['objects']]
+                viewable_ids = set(get_objects_for_user(
+                    request.user,
+                    'base.view_resourcebase',
+                    klass=ResourceBase.objects.filter(id__in=page_ids),
+                    accept_global_perms=False).values_list('id', flat=True))
+                filtered_objects_ids = [_id for _id in page_ids if _id in viewable_ids]
         except Exception:
             pass
 
@@ -709,6 +719,13 @@ class FeaturedResourceBaseResource(CommonModelApi):
 class LayerResource(CommonModelApi):
 
     """Layer API"""
+    LIST_PREFETCH = CommonModelApi.RESOURCE_LIST_PREFETCH + [
+        'default_style',
+        'remote_service',
+        'link_set',
+        'attribute_set',
+        Prefetch('uploadsession_set', queryset=UploadSession.objects.order_by('pk')),
+    ]
     links = fields.ListField(
         attribute='links',
         null=True,
@@ -739,6 +756,8 @@ class LayerResource(CommonModelApi):
         """
         Formats the object.
         """
+        objects = self.prefetch_objects(objects)
+        group_profiles = self.get_group_profiles(objects)
         formatted_objects = []
         for obj in objects:
             # convert the object to a dict using the standard values.
@@ -756,10 +775,7 @@ class LayerResource(CommonModelApi):
                 formatted_obj['category__gn_description'] = _(obj.category.gn_description)
             if obj.group:
                 formatted_obj['group'] = obj.group
-                try:
-                    formatted_obj['group_name'] = GroupProfile.objects.get(slug=obj.group.name)
-                except GroupProfile.DoesNotExist:
-                    formatted_obj['group_name'] = obj.group
+                formatted_obj['group_name'] = group_profiles.get(obj.group.name, obj.group)
 
             formatted_obj['keywords'] = [k.name for k in obj.keywords.all()] if obj.keywords else []
             formatted_obj['regions'] = [r.name for r in obj.regions.all()] if obj.regions else []
@@ -814,7 +830,10 @@ class LayerResource(CommonModelApi):
 
         links = obj.link_set.all()
         if link_types:
-            links = links.filter(link_type__in=link_types)
+            if 'link_set' in getattr(obj, '_prefetched_objects_cache', {}):
+                links = [lnk for lnk in links if lnk.link_type in link_types]
+            else:
+                links = links.filter(link_type__in=link_types)
         for lnk in links:
             formatted_link = model_to_dict(lnk, fields=link_fields)
             dehydrated.append(formatted_link)
@@ -940,6 +959,8 @@ class MapResource(CommonModelApi):
 
     """Maps API"""
 
+    LIST_PREFETCH = CommonModelApi.RESOURCE_LIST_PREFETCH + ['layer_set']
+
     def format_objects(self, objects):
         """
         Formats the objects and provides reference to list of layers in map
@@ -947,6 +968,8 @@ class MapResource(CommonModelApi):
 
         :param objects: Map objects
         """
+        objects = self.prefetch_objects(objects)
+        group_profiles = self.get_group_profiles(objects)
         formatted_objects = []
         for obj in objects:
             # convert the object to a dict using the standard values.
@@ -959,10 +982,7 @@ class MapResource(CommonModelApi):
                 formatted_obj['category__gn_description'] = _(obj.category.gn_description)
             if obj.group:
                 formatted_obj['group'] = obj.group
-                try:
-                    formatted_obj['group_name'] = GroupProfile.objects.get(slug=obj.group.name)
-                except GroupProfile.DoesNotExist:
-                    formatted_obj['group_name'] = obj.group
+                formatted_obj['group_name'] = group_profiles.get(obj.group.name, obj.group)
 
             formatted_obj['keywords'] = [k.name for k in obj.keywords.all()] if obj.keywords else []
             formatted_obj['regions'] = [r.name for r in obj.regions.all()] if obj.regions else []
@@ -1024,6 +1044,8 @@ class GeoAppResource(CommonModelApi):
 
     """GeoApps API"""
 
+    LIST_PREFETCH = CommonModelApi.RESOURCE_LIST_PREFETCH
+
     def format_objects(self, objects):
         """
         Formats the objects and provides reference to list of layers in GeoApp
@@ -1031,6 +1053,8 @@ class GeoAppResource(CommonModelApi):
 
         :param objects: GeoApp objects
         """
+        objects = self.prefetch_objects(objects)
+        group_profiles = self.get_group_profiles(objects)
         formatted_objects = []
         for obj in objects:
             # convert the object to a dict using the standard values.
@@ -1043,10 +1067,7 @@ class GeoAppResource(CommonModelApi):
                 formatted_obj['category__gn_description'] = obj.category.gn_description
             if obj.group:
                 formatted_obj['group'] = obj.group
-                try:
-                    formatted_obj['group_name'] = GroupProfile.objects.get(slug=obj.group.name)
-                except GroupProfile.DoesNotExist:
-                    formatted_obj['group_name'] = obj.group
+                formatted_obj['group_name'] = group_profiles.get(obj.group.name, obj.group)
 
             formatted_obj['keywords'] = [k.name for k in obj.keywords.all()] if obj.keywords else []
             formatted_obj['regions'] = [r.name for r in obj.regions.all()] if obj.regions else []
@@ -1087,6 +1108,8 @@ class DocumentResource(CommonModelApi):
 
     """Documents API"""
 
+    LIST_PREFETCH = CommonModelApi.RESOURCE_LIST_PREFETCH
+
     def format_objects(self, objects):
         """
         Formats the objects and provides reference to list of layers in map
@@ -1094,6 +1117,8 @@ class DocumentResource(CommonModelApi):
 
         :param objects: Map objects
         """
+        objects = self.prefetch_objects(objects)
+        group_profiles = self.get_group_profiles(objects)
         formatted_objects = []
         for obj in objects:
             # convert the object to a dict using the standard values.
@@ -1106,10 +1131,7 @@ class DocumentResource(CommonModelApi):
                 formatted_obj['category__gn_description'] = _(obj.category.gn_description)
             if obj.group:
                 formatted_obj['group'] = obj.group
-                try:
-                    formatted_obj['group_name'] = GroupProfile.objects.get(slug=obj.group.name)
-                except GroupProfile.DoesNotExist:
-                    formatted_obj['group_name'] = obj.group
+                formatted_obj['group_name'] = group_profiles.get(obj.group.name, obj.group)
 
             formatted_obj['keywords'] = [k.name for k in obj.keywords.all()] if obj.keywords else []
             formatted_obj['regions'] = [r.name for r in obj.regions.all()] if obj.regions else []
@@ -199,6 +199,25 @@ class PermissionsApiTests(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
             finally:
                 _ogc_geofence_enabled['default']['GEOFENCE_SECURITY_ENABLED'] = False
 
+    def test_layer_list_formatting_queries(self):
+        """Test that formatting a page of layers does not query the db per layer"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from geonode.api.resourcebase_api import LayerResource
+
+        resource = LayerResource()
+        layers = Layer.objects.order_by('pk')
+        self.assertGreater(layers.count(), 1)
+        with CaptureQueriesContext(connection) as single_layer:
+            resource.format_objects(layers[:1])
+        with CaptureQueriesContext(connection) as all_layers:
+            formatted = resource.format_objects(layers)
+        self.assertEqual([_l['id'] for _l in formatted], list(layers.values_list('id', flat=True)))
+        # at most one more query per prefetched relation, plus the group profiles
+        self.assertLessEqual(
+            len(all_layers.captured_queries),
+            len(single_layer.captured_queries) + len(LayerResource.LIST_PREFETCH) + 1)
+
 
 class OAuthApiTests(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
     def setUp(self):
@@ -21,7 +21,7 @@ import logging
 
 from rest_framework.filters import SearchFilter, BaseFilterBackend
 
-from geonode.base.bbox_utils import filter_bbox
+from geonode.base.bbox_utils import filter_bbox, rank_bbox
 
 logger = logging.getLogger(__name__)
 
@@ -39,5 +39,8 @@ class ExtentFilter(BaseFilterBackend):
 
     def filter_queryset(self, request, queryset, view):
         if request.query_params.get('extent'):
-            return filter_bbox(queryset, request.query_params.get('extent'))
+            extent = request.query_params.get('extent')
+            queryset = filter_bbox(queryset, extent)
+            if request.query_params.get('extent_ranking') == 'overlap':
+                queryset = rank_bbox(queryset, extent)
         return queryset
@@ -17,13 +17,194 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 #########################################################################
+import json
+import base64
+import datetime
+import hashlib
+
+from decimal import Decimal
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 DEFAULT_PAGE = getattr(settings, 'REST_API_DEFAULT_PAGE', 1)
 DEFAULT_PAGE_SIZE = getattr(settings, 'REST_API_DEFAULT_PAGE_SIZE', 10)
 DEFAULT_PAGE_QUERY_PARAM = getattr(settings, 'REST_API_DEFAULT_PAGE_QUERY_PARAM', 'page_size')
+# keyset pagination is used instead of page numbers when the cursor parameter is present,
+# an empty cursor requesting the first page
+CURSOR_QUERY_PARAM = getattr(settings, 'REST_API_CURSOR_QUERY_PARAM', 'cursor')
+COUNT_QUERY_PARAM = getattr(settings, 'REST_API_COUNT_QUERY_PARAM', 'count')
+# how the total is computed for keyset pages: 'exact', 'estimate' or 'none'
+DEFAULT_CURSOR_COUNT = getattr(settings, 'REST_API_CURSOR_COUNT', 'estimate')
+COUNT_CACHE_TIMEOUT = getattr(settings, 'REST_API_COUNT_CACHE_TIMEOUT', 60)
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+def _cursor_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        # keep the microseconds, DjangoJSONEncoder would truncate them
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(position, reverse=False):
+    """
+    Encodes a keyset position, a (sort value, primary key) pair, as an opaque cursor.
+    """
+    data = {'p': [_cursor_value(_v) for _v in position]}
+    if reverse:
+        data['r'] = 1
+    return base64.urlsafe_b64encode(
+        json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Returns the position and direction encoded in a cursor, (None, False) for an
+    empty cursor. Raises ValueError if the cursor is not valid.
+    """
+    if not cursor:
+        return None, False
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        position = data['p']
+        reverse = bool(data.get('r'))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(position, list) or len(position) != 2:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position, reverse
+
+
+def get_keyset_ordering(queryset):
+    """
+    Returns the name of the field the queryset is sorted by and whether the sort is
+    descending. The field is None when the queryset can only be paginated on the
+    primary key, i.e. it is not sorted or sorted by a related, nullable or computed field.
+    """
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    if not ordering or not isinstance(ordering[0], str):
+        return None, False
+    descending = ordering[0].startswith('-')
+    name = ordering[0].lstrip('-')
+    if name == 'pk' or '__' in name:
+        return None, descending
+    try:
+        field = queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None, False
+    if field.primary_key:
+        return None, descending
+    if not field.concrete or field.is_relation or field.null:
+        return None, False
+    return field.name, descending
+
+
+def estimate_count(queryset):
+    """
+    Returns the approximate number of objects of a queryset: the planner statistics
+    of the table for unfiltered querysets on PostgreSQL, an exact count cached for
+    REST_API_COUNT_CACHE_TIMEOUT seconds otherwise.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # tables never analyzed report 0 or -1
+        if row and row[0] > 0:
+            return int(row[0])
+    try:
+        cache_key = 'queryset_count:' + hashlib.md5(str(queryset.query).encode('utf-8')).hexdigest()
+    except EmptyResultSet:
+        return 0
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def get_count(queryset, mode=None):
+    """
+    Counts the objects of a queryset according to one of COUNT_MODES.
+    """
+    mode = mode if mode in COUNT_MODES else DEFAULT_CURSOR_COUNT
+    if mode == 'exact':
+        return queryset.count()
+    if mode == 'estimate':
+        return estimate_count(queryset)
+    return None
+
+
+class KeysetPage(object):
+    """
+    The `size` objects of a queryset following the position encoded in `cursor`, or
+    preceding it for cursors pointing backwards.
+
+    Pages are fetched with a range condition on (sort field, primary key) instead of
+    an OFFSET, so that deep pages cost as much as the first one.
+    """
+
+    def __init__(self, queryset, cursor, size):
+        self.position, self.reverse = decode_cursor(cursor)
+        self.field, descending = get_keyset_ordering(queryset)
+        self.size = size
+        pk_name = queryset.model._meta.pk.name
+        # scan direction, flipped when walking backwards
+        scan_descending = descending != self.reverse
+        lookup = 'lt' if scan_descending else 'gt'
+        if self.position is not None:
+            value, pk = self.position
+            condition = Q(**{f'{pk_name}__{lookup}': pk})
+            if self.field:
+                condition = Q(**{f'{self.field}__{lookup}': value}) | (Q(**{self.field: value}) & condition)
+            queryset = queryset.filter(condition)
+        prefix = '-' if scan_descending else ''
+        ordering = [f'{prefix}{pk_name}']
+        if self.field:
+            ordering.insert(0, f'{prefix}{self.field}')
+        objects = list(queryset.order_by(*ordering)[:size + 1])
+        self.has_more = len(objects) > size
+        self.object_list = objects[:size]
+        if self.reverse:
+            self.object_list.reverse()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def _position(self, obj):
+        return [getattr(obj, self.field) if self.field else None, obj.pk]
+
+    @property
+    def next_cursor(self):
+        if not self.object_list or not (self.reverse or self.has_more):
+            return None
+        return encode_cursor(self._position(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self.object_list or not (self.has_more if self.reverse else self.position is not None):
+            return None
+        return encode_cursor(self._position(self.object_list[0]), reverse=True)
 
 
 class GeoNodeApiPagination(PageNumberPagination):
@@ -31,8 +212,48 @@ class GeoNodeApiPagination(PageNumberPagination):
     page = DEFAULT_PAGE
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = DEFAULT_PAGE_QUERY_PARAM
+    cursor_query_param = CURSOR_QUERY_PARAM
+    count_query_param = COUNT_QUERY_PARAM
+    invalid_cursor_message = _('Invalid cursor')
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params or not isinstance(queryset, QuerySet):
+            return super(GeoNodeApiPagination, self).paginate_queryset(queryset, request, view=view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        try:
+            self.keyset = KeysetPage(
+                queryset, request.query_params[self.cursor_query_param], int(page_size))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        self.total = get_count(queryset, request.query_params.get(self.count_query_param))
+        return list(self.keyset)
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            _paginated_response = {
+                'links': {
+                    'next': self.get_cursor_link(self.keyset.next_cursor),
+                    'previous': self.get_cursor_link(self.keyset.previous_cursor)
+                },
+                'total': self.total,
+                DEFAULT_PAGE_QUERY_PARAM: self.keyset.size
+            }
+            _paginated_response.update(data)
+            return Response(_paginated_response)
+
         _paginated_response = {
             'links': {
                 'next': self.get_next_link(),
@@ -19,13 +19,18 @@
 #########################################################################
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
 
 from rest_framework import serializers
 from rest_framework_gis import fields
 from dynamic_rest.serializers import DynamicEphemeralSerializer, DynamicModelSerializer
 from dynamic_rest.fields.fields import DynamicRelationField, DynamicComputedField
 
+from avatar.conf import settings as avatar_settings
+from avatar.providers import PrimaryAvatarProvider
 from avatar.templatetags.avatar_tags import avatar_url
+from avatar.utils import cache_result
 
 from geonode.base.models import (
     ResourceBase,
@@ -137,14 +142,52 @@ class SpatialRepresentationTypeSerializer(DynamicModelSerializer):
         fields = ('identifier',)
 
 
+def _primary_avatar(avatars, size):
+    """
+    `avatar.utils.get_primary_avatar` over the prefetched avatars of a user.
+    """
+    avatars = sorted(avatars, key=lambda _a: (_a.primary, _a.date_uploaded), reverse=True)
+    avatar = avatars[0] if avatars else None
+    if avatar and not avatar.thumbnail_exists(size):
+        avatar.create_thumbnail(size)
+    return avatar
+
+
+@cache_result()
+def _prefetched_avatar_url(user, size):
+    for provider_path in avatar_settings.AVATAR_PROVIDERS:
+        provider = import_string(provider_path)
+        if provider.get_avatar_url.__func__ is PrimaryAvatarProvider.get_avatar_url.__func__:
+            avatar = _primary_avatar(user.avatar_set.all(), size)
+            url = avatar.avatar_url(size) if avatar else None
+        else:
+            url = provider.get_avatar_url(user, size)
+        if url:
+            return url
+
+
+def _avatar_url(user, size):
+    """
+    `avatar_url`, resolved through the same providers and cache, but taking the
+    primary avatar from `avatar_set` when it is prefetched instead of running a
+    query per user.
+    """
+    if 'avatar_set' not in getattr(user, '_prefetched_objects_cache', {}):
+        return avatar_url(user, size)
+    return _prefetched_avatar_url(user, size)
+
+
 class AvatarUrlField(DynamicComputedField):
 
     def __init__(self, avatar_size, **kwargs):
         self.avatar_size = avatar_size
+        # let the DynamicFilterBackend prefetch the avatars of all the users,
+        # and load the field of their gravatar
+        kwargs.setdefault('requires', ['avatar_set.', avatar_settings.AVATAR_GRAVATAR_FIELD])
         super(AvatarUrlField, self).__init__(**kwargs)
 
     def get_attribute(self, instance):
-        return avatar_url(instance, self.avatar_size)
+        return _avatar_url(instance, self.avatar_size)
 
 
 class UserSerializer(DynamicModelSerializer):
@@ -168,17 +211,41 @@ class ContactRoleField(DynamicComputedField):
 
     def __init__(self, contat_type, **kwargs):
         self.contat_type = contat_type
+        # let the DynamicFilterBackend prefetch the contacts of all the resources
+        kwargs.setdefault('requires', ['contactrole_set.contact.', 'contactrole_set.contact.avatar_set.'])
         super(ContactRoleField, self).__init__(**kwargs)
 
+    @cached_property
+    def user_serializer(self):
+        # built once and reused for the contacts of all the resources
+        return UserSerializer(embed=True, many=False)
+
     def get_attribute(self, instance):
         return getattr(instance, self.contat_type)
 
     def to_representation(self, value):
-        return UserSerializer(embed=True, many=False).to_representation(value)
+        return self.user_serializer.to_representation(value)
 
 
 class ResourceBaseSerializer(DynamicModelSerializer):
 
+    # relations rendered by the fields, joined or prefetched by setup_eager_loading
+    SELECT_RELATED = {
+        'owner': 'owner',
+        'group': 'group',
+        'category': 'category',
+        'restriction_code_type': 'restriction_code_type',
+        'license': 'license',
+        'spatial_representation_type': 'spatial_representation_type',
+    }
+    PREFETCH_RELATED = {
+        'owner': 'owner__avatar_set',
+        'keywords': 'keywords',
+        'regions': 'regions',
+        'poc': 'contactrole_set__contact__avatar_set',
+        'metadata_author': 'contactrole_set__contact__avatar_set',
+    }
+
     def __init__(self, *args, **kwargs):
         # Instantiate the superclass normally
         super(ResourceBaseSerializer, self).__init__(*args, **kwargs)
@@ -252,3 +319,21 @@ class ResourceBaseSerializer(DynamicModelSerializer):
             # metadata_uploaded, metadata_uploaded_preserve, metadata_xml,
             # users_geolimits, groups_geolimits
         )
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """ Perform necessary eager loading of data.
+
+        Joins or prefetches the relations rendered by `fields`, all of the
+        serializer fields by default. Meant for resources serialized outside of
+        the DynamicFilterBackend, which builds its own prefetches from the
+        requested fields.
+        """
+        fields = cls.Meta.fields if fields is None else fields
+        select_related = [cls.SELECT_RELATED[_f] for _f in fields if _f in cls.SELECT_RELATED]
+        prefetch_related = sorted({cls.PREFETCH_RELATED[_f] for _f in fields if _f in cls.PREFETCH_RELATED})
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
@@ -197,6 +197,42 @@ class BaseApiTests(APITestCase, URLPatternsTestCase):
         # Pagination
         self.assertEqual(len(response.data['resources']), 17)
 
+    def test_base_resources_cursor(self):
+        """
+        Ensure we can walk the Resource Base list with cursors.
+        """
+        url = reverse('base-resources-list')
+        # Admin
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+
+        response = self.client.get(f"{url}?cursor=&count=exact&sort[]=title", format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 26)
+        self.assertIsNone(response.data['links']['previous'])
+        first_page = [_r['pk'] for _r in response.data['resources']]
+        self.assertEqual(len(first_page), 10)
+
+        pages = [first_page]
+        while response.data['links']['next']:
+            response = self.client.get(response.data['links']['next'], format='json')
+            self.assertEqual(response.status_code, 200)
+            pages.append([_r['pk'] for _r in response.data['resources']])
+        self.assertEqual([len(_p) for _p in pages], [10, 10, 6])
+        crawled = [_pk for _p in pages for _pk in _p]
+        expected = ResourceBase.objects.order_by('title', 'pk').values_list('pk', flat=True)
+        self.assertEqual(crawled, [str(_pk) for _pk in expected])
+
+        # walk back from the last page
+        response = self.client.get(response.data['links']['previous'], format='json')
+        self.assertEqual([_r['pk'] for _r in response.data['resources']], pages[1])
+
+        response = self.client.get(f"{url}?cursor=&count=none", format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['total'])
+
+        response = self.client.get(f"{url}?cursor=notacursor", format='json')
+        self.assertEqual(response.status_code, 404)
+
     def test_search_resources(self):
         """
         Ensure we can search across the Resource Base list.
@@ -288,6 +324,15 @@ class BaseApiTests(APITestCase, URLPatternsTestCase):
         # Pagination
         self.assertEqual(len(response.data['resources']), 26)
 
+        # Extent Filter: ranked by overlap with the extent
+        response = self.client.get(f"{url}?page_size=26&extent=0,0,100,100&extent_ranking=overlap", format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 26)
+        self.assertEqual(
+            {_r['title'] for _r in response.data['resources'][:3]},
+            {'common morx', 'something titledupe else '})
+        self.assertIn(response.data['resources'][-1]['title'], ('common double it', 'map one', 'doc one'))
+
         response = self.client.get(f"{url}?page_size=26&extent=-10,-10,-1,-1", format='json')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 5)
@@ -342,6 +387,51 @@ class BaseApiTests(APITestCase, URLPatternsTestCase):
         reversed_resource_titles = sorted(resource_titles.copy())
         self.assertNotEqual(resource_titles, reversed_resource_titles)
 
+    def test_resources_query_count(self):
+        """
+        Ensure the number of queries listing the Resource Base does not depend on the page size.
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.contrib.auth import get_user_model
+        from geonode.base.models import ContactRole
+
+        # every resource has its own owner and contacts, so that the users, their
+        # contacts and avatars are counted for each of them
+        for resource in ResourceBase.objects.filter(resource_type='document'):
+            owner, poc, author = [
+                get_user_model().objects.create(username=f'{_role}_{resource.id}')
+                for _role in ('owner', 'poc', 'author')]
+            ResourceBase.objects.filter(id=resource.id).update(owner=owner)
+            ContactRole.objects.filter(resource=resource).delete()
+            ContactRole.objects.create(resource=resource, contact=poc, role='pointOfContact')
+            ContactRole.objects.create(resource=resource, contact=author, role='author')
+
+        url = reverse('base-resources-list')
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+        queries = []
+        for page_size in (2, 4, 8):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(
+                    f"{url}?page_size={page_size}&filter{{resource_type}}=document", format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['resources']), page_size)
+            queries.append(len(context.captured_queries))
+        self.assertEqual(len(set(queries)), 1, queries)
+
+    def test_prefetched_avatar_url(self):
+        """
+        Ensure the avatar URL of a user with prefetched avatars matches the avatar_url tag.
+        """
+        from django.contrib.auth import get_user_model
+        from avatar.templatetags.avatar_tags import avatar_url
+        from geonode.base.api.serializers import _avatar_url
+
+        user = get_user_model().objects.prefetch_related('avatar_set').get(username='bobby')
+        with self.assertNumQueries(0):
+            url = _avatar_url(user, 240)
+        self.assertEqual(url, avatar_url(get_user_model().objects.get(username='bobby'), 240))
+
     def test_perms_resources(self):
         """
         Ensure we can Get & Set Permissions across the Resource Base list.
@@ -415,6 +505,23 @@ class BaseApiTests(APITestCase, URLPatternsTestCase):
         # Pagination
         self.assertEqual(len(response.data['resources']), 2)
 
+    def test_featured_resources_permissions(self):
+        """
+        Ensure the featured Resources are restricted to the ones the user can view.
+        """
+        from django.contrib.auth import get_user_model
+        ResourceBase.objects.update(featured=True)
+        norman = get_user_model().objects.get(username='norman')
+        visible = [_r.id for _r in ResourceBase.objects.all()
+                   if norman.has_perm('view_resourcebase', _r.get_self_resource())]
+        self.assertTrue(self.client.login(username='norman', password='norman'))
+
+        url = urljoin(f"{reverse('base-resources-list')}/", 'featured/')
+        response = self.client.get(url, {'page_size': 100}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], len(visible))
+        self.assertEqual(sorted(int(_r['pk']) for _r in response.data['resources']), sorted(visible))
+
     def test_resource_types(self):
         """
         Ensure we can Get & Set Permissions across the Resource Base list.
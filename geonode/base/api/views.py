@@ -86,6 +86,7 @@ class UserViewSet(DynamicModelViewSet):
             admin_approval_required=settings.ADMIN_MODERATE_UPLOADS,
             unpublished_not_visible=settings.RESOURCE_PUBLISHING,
             private_groups_not_visibile=settings.GROUP_PRIVATE_RESOURCES)
+        resources = ResourceBaseSerializer.setup_eager_loading(resources)
         return Response(ResourceBaseSerializer(embed=True, many=True).to_representation(resources))
 
     @extend_schema(methods=['get'], responses={200: GroupProfileSerializer(many=True)},
@@ -151,12 +152,11 @@ class ResourceBaseViewSet(DynamicModelViewSet):
         paginator = GeoNodeApiPagination()
         paginator.page_size = request.GET.get('page_size', 10)
         resources = ResourceBase.objects.filter(**filter)
-        exclude = []
-        for resource in resources:
-            if not request.user.is_superuser and \
-            not request.user.has_perm('view_resourcebase', resource.get_self_resource()):
-                exclude.append(resource.id)
-        resources = resources.exclude(id__in=exclude)
+        if not request.user.is_superuser:
+            # one subquery instead of a permissions check per resource
+            permitted = get_objects_for_user(request.user, 'base.view_resourcebase', accept_global_perms=False)
+            resources = resources.filter(id__in=permitted.values('id'))
+        resources = ResourceBaseSerializer.setup_eager_loading(resources)
         result_page = paginator.paginate_queryset(resources, request)
         serializer = ResourceBaseSerializer(result_page, embed=True, many=True)
         return paginator.get_paginated_response({"resources": serializer.data})
@@ -19,8 +19,12 @@
 
 from decimal import Decimal
 
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Intersection
 from django.contrib.gis.geos import Polygon
-from django.db.models import Q
+from django.db import connections
+from django.db.models import ExpressionWrapper, F, FloatField, Func, Q, Value
+from django.db.models.functions import NullIf
 
 
 class BBOXHelper:
@@ -61,14 +65,15 @@ def polygon_from_bbox(bbox, srid=4326):
     return poly
 
 
-def filter_bbox(queryset, bbox):
+def search_polygons(bbox):
     """
-    Filters a queryset by a provided bounding box.
+    Converts the extent(s) of a bbox search into EPSG:4326 polygons.
 
-    :param bbox: Comma-separated coordinates as "xmin,ymin,xmax,ymax"
+    :param bbox: Comma-separated coordinates as "xmin,ymin,xmax,ymax", possibly
+        repeated for several extents
+    :return: a list holding, for each extent, its polygons (two for extents
+        crossing the 180th meridian) or None if the extent spans 360deg or more
     """
-    assert queryset.model.__class__.__name__ == "PolymorphicModelBase"
-
     bboxes = []
     _bbox_index = -1
     for _x, _y in enumerate(bbox.split(",")):
@@ -77,28 +82,98 @@ def filter_bbox(queryset, bbox):
             _bbox_index += 1
         bboxes[_bbox_index].append(_y)
 
+    polygons = []
     for _bbox in bboxes:
         _bbox = list(map(Decimal, _bbox))
 
-        # Return all layers when the search extent exceeds 360deg
+        # The whole world when the search extent exceeds 360deg
         if abs(_bbox[0] - _bbox[2]) >= 360:
-            return queryset.all()
+            polygons.append(None)
+            continue
 
         x_min = normalize_x_value(_bbox[0])
         x_max = normalize_x_value(_bbox[2])
 
         # When the search extent crosses the 180th meridian, we'll need to search
-        # on two conditions
+        # on both sides of it
         if x_min > x_max:
-            left_polygon = polygon_from_bbox((-180, _bbox[1], x_max, _bbox[3]))
-            right_polygon = polygon_from_bbox((x_min, _bbox[1], 180, _bbox[3]))
-            queryset = queryset.filter(
-                Q(bbox_polygon__intersects=left_polygon) |
-                Q(bbox_polygon__intersects=right_polygon)
-            )
-
+            polygons.append([
+                polygon_from_bbox((-180, _bbox[1], x_max, _bbox[3])),
+                polygon_from_bbox((x_min, _bbox[1], 180, _bbox[3]))
+            ])
         # Otherwise, we do a simple polygon-based search
         else:
-            search_polygon = polygon_from_bbox((x_min, _bbox[1], x_max, _bbox[3]))
-            queryset = queryset.filter(bbox_polygon__intersects=search_polygon)
+            polygons.append([polygon_from_bbox((x_min, _bbox[1], x_max, _bbox[3]))])
+    return polygons
+
+
+def bbox_lookup(queryset):
+    """
+    The lookup matching the resources whose `bbox_polygon` meets a search polygon.
+
+    ST_Intersects by default, which already goes through the GiST index with its
+    `&&` prefilter. With API_EXTENT_SEARCH_BBOX_OVERLAPS, on PostGIS, only the
+    bounding boxes are compared: `bbox_polygon` is transformed to EPSG:4326 when
+    saved, so the bbox of a resource in a projected SRID is not a rectangle anymore
+    and may then match extents it does not intersect.
+    """
+    if getattr(settings, 'API_EXTENT_SEARCH_BBOX_OVERLAPS', False) and \
+            connections[queryset.db].vendor == 'postgresql':
+        return 'bbox_polygon__bboverlaps'
+    return 'bbox_polygon__intersects'
+
+
+def filter_bbox(queryset, bbox, lookup=None):
+    """
+    Filters a queryset by a provided bounding box.
+
+    :param bbox: Comma-separated coordinates as "xmin,ymin,xmax,ymax"
+    :param lookup: the spatial lookup to use, see `bbox_lookup`
+    """
+    assert queryset.model.__class__.__name__ == "PolymorphicModelBase"
+
+    lookup = lookup or bbox_lookup(queryset)
+    for _polygons in search_polygons(bbox):
+        # Return all layers when the search extent exceeds 360deg
+        if _polygons is None:
+            return queryset.all()
+
+        _filter = Q()
+        for _polygon in _polygons:
+            _filter |= Q(**{lookup: _polygon})
+        queryset = queryset.filter(_filter)
     return queryset
+
+
+def rank_bbox(queryset, bbox):
+    """
+    Sorts a queryset by how well the resources match a bounding box search, best
+    first. Resources are annotated with `bbox_rank`, the area of the intersection
+    of their `bbox_polygon` with the search extent(s) divided by the area of the
+    union (in squared degrees).
+
+    Supported on PostGIS and SpatiaLite, the queryset is returned unchanged
+    otherwise. The ranking is computed on the rows selected by `filter_bbox` only.
+
+    :param bbox: Comma-separated coordinates as "xmin,ymin,xmax,ymax"
+    """
+    if connections[queryset.db].vendor not in ('postgresql', 'sqlite'):
+        return queryset
+
+    overlap = None
+    search_area = 0
+    for _polygons in search_polygons(bbox):
+        for _polygon in _polygons or []:
+            search_area += _polygon.area
+            _overlap = Func(
+                Intersection('bbox_polygon', _polygon), function='ST_Area', output_field=FloatField())
+            overlap = _overlap if overlap is None else overlap + _overlap
+    if overlap is None:
+        return queryset
+
+    area = Func(F('bbox_polygon'), function='ST_Area', output_field=FloatField())
+    union = ExpressionWrapper(
+        area + Value(float(search_area)) - overlap, output_field=FloatField())
+    return queryset.annotate(
+        bbox_rank=ExpressionWrapper(overlap / NullIf(union, Value(0.0)), output_field=FloatField())
+    ).order_by(F('bbox_rank').desc(nulls_last=True), '-pk')
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2016 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""Aggregated counters for the popularity of GeoNode resources
+"""
+
+# Standard Modules
+import time
+import atexit
+import logging
+import threading
+from collections import Counter
+
+# Django functionality
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+
+# Geonode functionality
+from geonode.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two flushes of the pending views to the database (0 to flush on every view)
+POPULAR_COUNT_FLUSH_INTERVAL = getattr(settings, 'POPULAR_COUNT_FLUSH_INTERVAL', 30)
+# Number of resources updated by a single UPDATE statement
+POPULAR_COUNT_BATCH_SIZE = getattr(settings, 'POPULAR_COUNT_BATCH_SIZE', 500)
+# Seconds during which the views of the same user on the same resource are counted once (0 to disable)
+POPULAR_COUNT_VIEWER_WINDOW = getattr(settings, 'POPULAR_COUNT_VIEWER_WINDOW', 0)
+
+
+class ViewCounter(object):
+    """
+    Accumulates the views of the resources in process and periodically flushes
+    them to the database, updating popular_count with one UPDATE per batch of resources.
+
+    The pending views are flushed by a later view once due, or by a timer at
+    most `flush_interval` seconds after the first of them.
+    """
+
+    def __init__(self, flush_interval=None, batch_size=None, viewer_window=None):
+        self.flush_interval = POPULAR_COUNT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = batch_size or POPULAR_COUNT_BATCH_SIZE
+        self.viewer_window = POPULAR_COUNT_VIEWER_WINDOW if viewer_window is None else viewer_window
+        self.pending = Counter()
+        self.last_flush = time.time()
+        self.last_flush_duration = None
+        self.flushed = 0
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, resource_id, viewer=None):
+        """
+        Records a view of the resource, flushing the pending views if they are due.
+
+        If a viewer window is configured, the views of the same viewer are only counted
+        once per window.
+        """
+        if viewer and self.viewer_window:
+            key = 'popular_count_viewer:{}:{}'.format(resource_id, viewer)
+            if not cache.add(key, True, self.viewer_window):
+                return False
+        with self._lock:
+            self.pending[resource_id] += 1
+            due = (len(self.pending) >= self.batch_size or
+                   time.time() - self.last_flush >= self.flush_interval)
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+        return True
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            # the timer thread has its own database connection
+            connection.close()
+
+    def flush(self):
+        """
+        Writes the pending views to the database and returns the number of updated resources.
+        """
+        with self._lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.time()
+        if not pending:
+            return 0
+
+        from geonode.base.models import ResourceBase
+
+        start = time.time()
+        updated = 0
+        try:
+            for ids in chunked(sorted(pending), self.batch_size):
+                increment = Case(
+                    *[When(id=_id, then=Value(pending[_id])) for _id in ids],
+                    default=Value(0),
+                    output_field=IntegerField())
+                updated += ResourceBase.objects.filter(id__in=ids).update(
+                    popular_count=F('popular_count') + increment)
+        except Exception as e:
+            logger.exception(e)
+            # Keep the views for the next flush
+            with self._lock:
+                self.pending.update(pending)
+            return 0
+        self.last_flush_duration = time.time() - start
+        self.flushed += sum(pending.values())
+        logger.debug(
+            "Flushed {} views of {} resources in {:.1f} ms".format(
+                sum(pending.values()), len(pending), self.last_flush_duration * 1000))
+        return updated
+
+    def stats(self):
+        """
+        Returns the size of the pending counts and the latency of the last flush.
+        """
+        with self._lock:
+            return {
+                'pending_resources': len(self.pending),
+                'pending_views': sum(self.pending.values()),
+                'flushed_views': self.flushed,
+                'last_flush': self.last_flush,
+                'last_flush_duration': self.last_flush_duration,
+            }
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
+
+
+def count_view(resource, user):
+    """
+    Counts a view of the resource for popularity ranking,
+    but do not includes admins or resource owners.
+    """
+    if user == resource.owner or user.is_superuser:
+        return False
+    return view_counter.add(resource.id, viewer=user.pk or user.username)
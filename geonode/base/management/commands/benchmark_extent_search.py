@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import time
+import uuid
+import random
+import logging
+
+from django.db import connection, transaction
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+
+from geonode.base.models import ResourceBase
+from geonode.base.bbox_utils import filter_bbox, polygon_from_bbox, rank_bbox
+
+logger = logging.getLogger(__name__)
+
+
+def _random_extent(rnd, max_size, antimeridian=False):
+    width = rnd.uniform(0.01, max_size)
+    height = rnd.uniform(0.01, min(max_size, 90))
+    if antimeridian:
+        x_min = rnd.uniform(180 - width, 180)
+    else:
+        x_min = rnd.uniform(-180, 180 - width)
+    y_min = rnd.uniform(-90, 90 - height)
+    return x_min, y_min, x_min + width, y_min + height
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the extent (bbox) search of the catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-r',
+            '--resources',
+            dest='resources',
+            type=int,
+            default=0,
+            help='Number of synthetic resources to add to the catalogue for the benchmark. '
+                 'They are removed when it ends. Default is 0')
+        parser.add_argument(
+            '-q',
+            '--queries',
+            dest='queries',
+            type=int,
+            default=100,
+            help='Number of random extents to search. Default is 100')
+        parser.add_argument(
+            '--max-size',
+            dest='max_size',
+            type=float,
+            default=30,
+            help='Maximum width and height of the extents, in degrees. Default is 30')
+        parser.add_argument(
+            '--antimeridian',
+            dest='antimeridian',
+            type=float,
+            default=0.2,
+            help='Share of the extents crossing the 180th meridian. Default is 0.2')
+        parser.add_argument(
+            '--seed',
+            dest='seed',
+            type=int,
+            default=0,
+            help='Random seed, to compare runs. Default is 0')
+
+    def handle(self, **options):
+        if options['queries'] < 1:
+            raise CommandError("At least one query is needed.")
+
+        with transaction.atomic():
+            try:
+                if options['resources']:
+                    self._populate(options['resources'], random.Random(options['seed']), options['max_size'])
+                self._benchmark(options)
+            finally:
+                # never keep the synthetic resources
+                transaction.set_rollback(True)
+
+    def _populate(self, count, rnd, max_size):
+        owner = get_user_model().objects.filter(is_superuser=True).first()
+        ctype = ContentType.objects.get_for_model(ResourceBase)
+        batch = []
+        for _i in range(count):
+            batch.append(ResourceBase(
+                uuid=str(uuid.uuid4()),
+                title=f'Extent benchmark {_i}',
+                owner=owner,
+                polymorphic_ctype=ctype,
+                bbox_polygon=polygon_from_bbox(_random_extent(rnd, max_size))))
+            if len(batch) == 5000:
+                ResourceBase.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            ResourceBase.objects.bulk_create(batch)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {ResourceBase._meta.db_table}')
+        self.stdout.write(f'Added {count} synthetic resources')
+
+    def _benchmark(self, options):
+        rnd = random.Random(options['seed'] + 1)
+        extents = []
+        for _i in range(options['queries']):
+            extent = _random_extent(rnd, options['max_size'], antimeridian=rnd.random() < options['antimeridian'])
+            extents.append(','.join(str(_c) for _c in extent))
+
+        queryset = ResourceBase.objects.all()
+        modes = [
+            ('intersects', lambda extent: filter_bbox(queryset, extent, lookup='bbox_polygon__intersects')),
+            ('ranked', lambda extent: rank_bbox(filter_bbox(queryset, extent), extent)),
+        ]
+        if connection.vendor == 'postgresql':
+            modes.append(
+                ('bboverlaps', lambda extent: filter_bbox(queryset, extent, lookup='bbox_polygon__bboverlaps')))
+        self.stdout.write(f'{queryset.count()} resources, {len(extents)} extents')
+        results = {}
+        for name, search in modes:
+            timings = []
+            results[name] = []
+            for extent in extents:
+                start = time.perf_counter()
+                ids = set(search(extent).values_list('id', flat=True))
+                timings.append((time.perf_counter() - start) * 1000)
+                results[name].append(ids)
+            self.stdout.write(
+                f'{name:>10}: mean {sum(timings) / len(timings):.2f} ms, '
+                f'p50 {_percentile(timings, 50):.2f} ms, p95 {_percentile(timings, 95):.2f} ms')
+
+        if 'bboverlaps' in results:
+            mismatches = sum(
+                1 for _a, _b in zip(results['intersects'], results['bboverlaps']) if _a != _b)
+            if mismatches:
+                self.stdout.write(self.style.WARNING(
+                    f'{mismatches} extents returned different resources with && than with ST_Intersects'))
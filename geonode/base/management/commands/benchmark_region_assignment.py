@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import re
+import time
+import random
+import logging
+
+from django.db import transaction
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.management.base import BaseCommand, CommandError
+
+from geonode.base.bbox_utils import polygon_from_bbox
+from geonode.base.models import Region, ResourceBase, get_intersecting_regions
+
+logger = logging.getLogger(__name__)
+
+
+def _random_extent(rnd, max_size):
+    width = rnd.uniform(0.01, max_size)
+    height = rnd.uniform(0.01, min(max_size, 90))
+    x_min = rnd.uniform(-180, 180 - width)
+    y_min = rnd.uniform(-90, 90 - height)
+    return x_min, y_min, x_min + width, y_min + height
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _legacy_intersecting_regions(poly1):
+    """The region matching of resourcebase_post_save before Region.bbox_polygon"""
+    regions = []
+    for region in Region.objects.all().order_by('name'):
+        try:
+            srid2, wkt2 = region.geographic_bounding_box.split(";")
+            srid2 = re.findall(r'\d+', srid2)
+
+            poly2 = GEOSGeometry(wkt2, srid=int(srid2[0]))
+            poly2.transform(4326)
+
+            if poly2.intersection(poly1):
+                regions.append(region)
+        except Exception as e:
+            logger.debug(e)
+    return regions
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the automatic assignment of the regions on resource save'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n',
+            '--saves',
+            dest='saves',
+            type=int,
+            default=100,
+            help='Number of resource saves to simulate, each with a random extent. Default is 100')
+        parser.add_argument(
+            '--max-size',
+            dest='max_size',
+            type=float,
+            default=30,
+            help='Maximum width and height of the extents, in degrees. Default is 30')
+        parser.add_argument(
+            '--seed',
+            dest='seed',
+            type=int,
+            default=0,
+            help='Random seed, to compare runs. Default is 0')
+
+    def handle(self, **options):
+        if options['saves'] < 1:
+            raise CommandError("At least one save is needed.")
+        resource = ResourceBase.objects.first()
+        if not resource:
+            raise CommandError("At least one resource is needed.")
+
+        rnd = random.Random(options['seed'])
+        extents = [polygon_from_bbox(_random_extent(rnd, options['max_size'])) for _i in range(options['saves'])]
+        self.stdout.write(f'{Region.objects.count()} regions, {len(extents)} saves')
+
+        with transaction.atomic():
+            try:
+                results = {}
+                for name, match in (('before', _legacy_intersecting_regions), ('after', get_intersecting_regions)):
+                    timings = []
+                    results[name] = []
+                    for extent in extents:
+                        resource.regions.clear()
+                        start = time.perf_counter()
+                        regions = match(extent)
+                        if regions and len(regions) <= 30:
+                            resource.regions.add(*regions)
+                        timings.append((time.perf_counter() - start) * 1000)
+                        results[name].append({_r.id for _r in regions})
+                    self.stdout.write(
+                        f'{name:>7}: mean {sum(timings) / len(timings):.2f} ms, '
+                        f'p50 {_percentile(timings, 50):.2f} ms, p95 {_percentile(timings, 95):.2f} ms')
+            finally:
+                # leave the regions of the resource untouched
+                transaction.set_rollback(True)
+
+        mismatches = sum(1 for _a, _b in zip(results['before'], results['after']) if _a != _b)
+        if mismatches:
+            self.stdout.write(self.style.WARNING(
+                f'{mismatches} saves matched different regions than before'))
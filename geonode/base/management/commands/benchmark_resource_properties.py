@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import io
+import time
+import pstats
+import logging
+import cProfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from geonode.base.models import ResourceBase
+from geonode.utils import count_queries
+
+logger = logging.getLogger(__name__)
+
+PROPERTIES = (
+    'bbox',
+    'll_bbox',
+    'bbox_string',
+    'll_bbox_string',
+    'geographic_bounding_box',
+    'license_light',
+    'metadata_completeness',
+)
+
+METHODS = (
+    'keyword_list',
+    'keyword_slug_list',
+    'region_name_list',
+)
+
+
+class Command(BaseCommand):
+
+    help = 'Profile the computed properties of the resources read by a catalogue listing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n',
+            '--resources',
+            dest='resources',
+            type=int,
+            default=100,
+            help='Number of resources listed. Default is 100')
+        parser.add_argument(
+            '-r',
+            '--reads',
+            dest='reads',
+            type=int,
+            default=3,
+            help='How many times every property is read per resource, '
+                 'as the templates and serializers do. Default is 3')
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            dest='profile',
+            default=False,
+            help='Print the cProfile statistics of every run')
+
+    def handle(self, **options):
+        if options['resources'] < 1 or options['reads'] < 1:
+            raise CommandError("At least one resource and one read are needed.")
+
+        queryset = ResourceBase.objects.filter(
+            bbox_polygon__isnull=False).select_related('license').order_by('-date')
+        ids = list(queryset.values_list('id', flat=True)[:options['resources']])
+        if not ids:
+            raise CommandError("There are no resources with a bounding box to list.")
+        queryset = queryset.filter(id__in=ids)
+        self.stdout.write(f'{len(ids)} resources, {options["reads"]} reads per property')
+
+        runs = (
+            # without the stored extents the bbox is transformed again on every new instance
+            ('recomputed', queryset.defer('bbox_extent', 'll_bbox_extent')),
+            ('stored', queryset),
+            ('prefetched', queryset.prefetch_related('keywords', 'regions')),
+        )
+        for name, resources in runs:
+            profile = cProfile.Profile() if options['profile'] else None
+            with count_queries() as queries:
+                start = time.perf_counter()
+                if profile:
+                    profile.enable()
+                self._read(resources, options['reads'])
+                if profile:
+                    profile.disable()
+                elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(f'{name:>10}: {elapsed:.2f} ms, {queries[0]} queries')
+            if profile:
+                stream = io.StringIO()
+                pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(15)
+                self.stdout.write(stream.getvalue())
+
+    def _read(self, resources, reads):
+        for resource in resources:
+            for _i in range(reads):
+                for name in PROPERTIES:
+                    getattr(resource, name)
+                for name in METHODS:
+                    getattr(resource, name)()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import multiprocessing
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections as db_connections
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _init_worker():
+    from haystack import connections
+    # the forked workers must not share the search engine sessions
+    for alias in connections.connections_info:
+        connections[alias].reset_sessions()
+
+
+def _index_chunk(args):
+    from geonode.haystack_signals import update_index
+    label, pks, batch_size = args
+    update_index({label: pks}, batch_size=batch_size)
+    return label, len(pks)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search index in chunks, optionally with parallel workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-m',
+            '--model',
+            dest='models',
+            action='append',
+            default=[],
+            help='Only reindex the given model, e.g. layers.Layer (can be repeated)')
+        parser.add_argument(
+            '-w',
+            '--workers',
+            dest='workers',
+            type=int,
+            default=1,
+            help='Number of parallel worker processes')
+        parser.add_argument(
+            '-b',
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=None,
+            help='Objects per chunk and bulk request, defaults to the backend BATCH_SIZE')
+        parser.add_argument(
+            '-c',
+            '--clear',
+            action='store_true',
+            dest='clear',
+            default=False,
+            help='Clear the index of the models first')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'HAYSTACK_SEARCH', False):
+            raise CommandError('HAYSTACK_SEARCH is not enabled.')
+
+        from haystack import connections, connection_router
+
+        aliases = connection_router.for_write()
+        indexed_models = set()
+        for alias in aliases:
+            indexed_models.update(connections[alias].get_unified_index().get_indexed_models())
+        if options.get('models'):
+            models = [apps.get_model(label) for label in options.get('models')]
+            for model in models:
+                if model not in indexed_models:
+                    raise CommandError(f'{model._meta.label} is not indexed.')
+        else:
+            models = sorted(indexed_models, key=lambda model: model._meta.label)
+
+        batch_size = options.get('batch_size') or min(
+            connections[alias].get_backend().batch_size for alias in aliases)
+        if options.get('clear'):
+            for alias in aliases:
+                connections[alias].get_backend().clear(models=models)
+
+        chunks = []
+        totals = {}
+        for model in models:
+            index = connections[aliases[0]].get_unified_index().get_index(model)
+            pks = list(index.build_queryset(using=aliases[0]).prefetch_related(None).order_by(
+                'pk').values_list('pk', flat=True))
+            totals[model._meta.label] = len(pks)
+            chunks.extend(
+                (model._meta.label, pks[start:start + batch_size], batch_size)
+                for start in range(0, len(pks), batch_size))
+
+        done = dict.fromkeys(totals, 0)
+        workers = max(options.get('workers'), 1)
+        if workers > 1:
+            # the forked workers open their own database connections
+            db_connections.close_all()
+            pool = multiprocessing.Pool(workers, initializer=_init_worker)
+            results = pool.imap_unordered(_index_chunk, chunks)
+        else:
+            pool = None
+            results = map(_index_chunk, chunks)
+        try:
+            for label, count in results:
+                done[label] += count
+                self.stdout.write(f"[{done[label]} / {totals[label]}] Indexed {label}")
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2020-12-10 10:12
+
+import re
+
+import django.contrib.gis.db.models.fields
+from django.contrib.gis.geos import Polygon
+from django.db import migrations
+
+
+def set_regions_bbox_polygon(apps, schema_editor):
+    Region = apps.get_model('base', 'Region')
+    for region in Region.objects.all():
+        if None in (region.bbox_x0, region.bbox_x1, region.bbox_y0, region.bbox_y1):
+            continue
+        bbox_polygon = Polygon.from_bbox(
+            (region.bbox_x0, region.bbox_y0, region.bbox_x1, region.bbox_y1))
+        try:
+            match = re.match(r'^(EPSG:)?(?P<srid>\d{4,5})$', str(region.srid))
+            bbox_polygon.srid = int(match.group('srid'))
+            bbox_polygon.transform(4326)
+        except Exception:
+            continue
+        Region.objects.filter(id=region.id).update(bbox_polygon=bbox_polygon)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0049_resourcebase_resource_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='region',
+            name='bbox_polygon',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, srid=4326),
+        ),
+        migrations.RunPython(set_regions_bbox_polygon, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2020-12-15 11:25
+
+import re
+
+from django.db import migrations, models
+
+
+def _extent(bbox_polygon, srid):
+    if bbox_polygon.srid is not None and bbox_polygon.srid != srid:
+        try:
+            bbox_polygon = bbox_polygon.transform(srid, clone=True)
+        except Exception:
+            pass
+    x0, y0, x1, y1 = bbox_polygon.extent
+    return ",".join(repr(float(value)) for value in (x0, y0, x1, y1))
+
+
+def set_resources_bbox_extent(apps, schema_editor):
+    ResourceBase = apps.get_model('base', 'ResourceBase')
+    resources = ResourceBase.objects.filter(bbox_polygon__isnull=False).only('id', 'bbox_polygon', 'srid')
+    for resource in resources.iterator():
+        try:
+            match = re.match(r'^(EPSG:)?(?P<srid>\d{4,6})$', str(resource.srid))
+            bbox_extent = _extent(resource.bbox_polygon, int(match.group('srid')))
+            ll_bbox_extent = _extent(resource.bbox_polygon, 4326)
+        except Exception:
+            continue
+        ResourceBase.objects.filter(id=resource.id).update(
+            bbox_extent=bbox_extent, ll_bbox_extent=ll_bbox_extent)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0050_region_bbox_polygon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourcebase',
+            name='bbox_extent',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='resourcebase',
+            name='ll_bbox_extent',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(set_resources_bbox_extent, migrations.RunPython.noop),
+    ]
@@ -22,10 +22,11 @@ import os
 import re
 import math
 import uuid
+import numbers
 import logging
 import traceback
 
-from django.db import models
+from django.db import connection, models
 from django.conf import settings
 from django.core import serializers
 from django.utils.functional import cached_property
@@ -70,6 +71,7 @@ from geonode.base.enumerations import (
     UPDATE_FREQUENCIES,
     DEFAULT_SUPPLEMENTAL_INFORMATION)
 from geonode.base.bbox_utils import BBOXHelper
+from geonode.base.post_commit import queue_resource_work
 from geonode.utils import (
     add_url_params,
     bbox_to_wkt)
@@ -229,9 +231,30 @@ class Region(MPTTModel):
         null=False,
         default='EPSG:4326')
 
+    # The bbox in EPSG:4326, spatially indexed for the region assignment
+    bbox_polygon = PolygonField(null=True, blank=True, editable=False)
+
     def __str__(self):
         return "{0}".format(self.name)
 
+    def set_bbox_polygon(self):
+        """
+        Set `bbox_polygon` from the bbox values, in EPSG:4326.
+        """
+        self.bbox_polygon = None
+        if None in (self.bbox_x0, self.bbox_x1, self.bbox_y0, self.bbox_y1):
+            return
+        bbox_polygon = Polygon.from_bbox(
+            (self.bbox_x0, self.bbox_y0, self.bbox_x1, self.bbox_y1))
+        try:
+            match = re.match(r'^(EPSG:)?(?P<srid>\d{4,5})$', str(self.srid))
+            bbox_polygon.srid = int(match.group('srid'))
+            bbox_polygon.transform(4326)
+        except Exception:
+            logger.warning("Could not transform the bounding box of the region %s", self)
+            return
+        self.bbox_polygon = bbox_polygon
+
     @property
     def bbox(self):
         """BBOX is in the format: [x0,x1,y0,y1]."""
@@ -266,6 +289,60 @@ class Region(MPTTModel):
         order_insertion_by = ['name']
 
 
+def region_pre_save(instance, *args, **kwargs):
+    # also reached by raw saves, e.g. loading the regions fixtures
+    instance.set_bbox_polygon()
+
+
+def region_post_change(*args, **kwargs):
+    global _regions_index
+    _regions_index = None
+
+
+signals.pre_save.connect(region_pre_save, sender=Region)
+signals.post_save.connect(region_post_change, sender=Region)
+signals.post_delete.connect(region_post_change, sender=Region)
+
+# In-memory STRtree of the regions bboxes, for the databases without PostGIS
+_regions_index = None
+
+
+def _get_regions_index():
+    global _regions_index
+    if _regions_index is None:
+        from shapely import wkb
+        from shapely.strtree import STRtree
+
+        regions = list(Region.objects.filter(bbox_polygon__isnull=False).order_by('name'))
+        shapes = [wkb.loads(bytes(_r.bbox_polygon.wkb)) for _r in regions]
+        _regions_index = (STRtree(shapes), shapes, regions)
+    return _regions_index
+
+
+def get_intersecting_regions(geometry):
+    """
+    Return the regions, ordered by name, whose bbox intersects the geometry.
+
+    On PostGIS this is a single ST_Intersects query on the indexed
+    `Region.bbox_polygon`, elsewhere an in-memory STRtree is used.
+    """
+    if connection.vendor == 'postgresql':
+        return list(Region.objects.filter(bbox_polygon__intersects=geometry).order_by('name'))
+
+    from shapely import wkb
+
+    tree, shapes, regions = _get_regions_index()
+    if not shapes:
+        return []
+    positions = {id(_s): _i for _i, _s in enumerate(shapes)}
+    shape = wkb.loads(bytes(geometry.transform(4326, clone=True).wkb))
+    # STRtree.query returns the indexes (Shapely 2) or the geometries (Shapely 1)
+    matches = sorted(
+        _hit if isinstance(_hit, numbers.Integral) else positions[id(_hit)]
+        for _hit in tree.query(shape))
+    return [regions[_i] for _i in matches if shapes[_i].intersects(shape)]
+
+
 class RestrictionCodeType(models.Model):
     """
     Metadata information about the spatial representation type.
@@ -451,6 +528,11 @@ class _HierarchicalTagManager(_TaggableManager):
             except Exception as e:
                 logger.exception(e)
 
+        signals.m2m_changed.send(
+            sender=self.through, action="post_add", instance=self.instance,
+            reverse=False, model=self.through.tag_model(),
+            pk_set=set(tag.pk for tag in tag_objs), using=self.instance._state.db)
+
 
 class Thesaurus(models.Model):
     """
@@ -529,6 +611,57 @@ class ThesaurusKeyword(models.Model):
         unique_together = (("thesaurus", "alt_label"),)
 
 
+def _polygon_bbox(bbox_polygon, srid):
+    """The extent of `bbox_polygon` in `srid` as [x0, x1, y0, y1, srid]."""
+    srid_code = int(srid.split(':')[-1])
+    if bbox_polygon.srid is not None and bbox_polygon.srid != srid_code:
+        try:
+            bbox_polygon = bbox_polygon.transform(srid_code, clone=True)
+        except Exception:
+            pass
+    bbox = BBOXHelper(bbox_polygon.extent)
+    return [bbox.xmin, bbox.xmax, bbox.ymin, bbox.ymax, srid]
+
+
+def _format_extent(bbox):
+    return ",".join(repr(float(value)) for value in (bbox[0], bbox[2], bbox[1], bbox[3]))
+
+
+def _parse_extent(extent):
+    x0, y0, x1, y1 = [float(value) for value in extent.split(',')]
+    return [x0, x1, y0, y1]
+
+
+def _srid_code(srid):
+    match = re.match(r'^(EPSG:)?(?P<srid>\d{4,6})$', str(srid))
+    return "EPSG:{}".format(int(match.group('srid')))
+
+
+def _stored_bbox_extents(bbox_polygon, srid):
+    """
+    The bbox and ll_bbox of `bbox_polygon` as read back from the database,
+    where the polygon is kept in EPSG:4326.
+    """
+    if bbox_polygon.srid is not None and bbox_polygon.srid != 4326:
+        bbox_polygon = bbox_polygon.transform(4326, clone=True)
+    return _polygon_bbox(bbox_polygon, _srid_code(srid)), _polygon_bbox(bbox_polygon, "EPSG:4326")
+
+
+def get_bbox_extents(bbox_polygon, srid):
+    """
+    The `bbox_extent` and `ll_bbox_extent` values of a resource, to write along
+    with `bbox_polygon` and `srid` when a `QuerySet.update()` skips `save()`.
+    """
+    if not bbox_polygon:
+        return {'bbox_extent': None, 'll_bbox_extent': None}
+    try:
+        bbox, ll_bbox = _stored_bbox_extents(bbox_polygon, srid)
+    except Exception as e:
+        logger.debug(e)
+        return {'bbox_extent': None, 'll_bbox_extent': None}
+    return {'bbox_extent': _format_extent(bbox), 'll_bbox_extent': _format_extent(ll_bbox)}
+
+
 class ResourceBaseManager(PolymorphicManager):
     def admin_contact(self):
         # this assumes there is at least one superuser
@@ -776,6 +909,12 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
         null=False,
         default='EPSG:4326')
 
+    # The bbox extents in `srid` and in EPSG:4326 as "x0,y0,x1,y1", computed
+    # from `bbox_polygon` at save time so that reading them does not need to
+    # transform the polygon again.
+    bbox_extent = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    ll_bbox_extent = models.CharField(max_length=255, null=True, blank=True, editable=False)
+
     # CSW specific fields
     csw_typename = models.CharField(
         _('CSW typename'),
@@ -879,6 +1018,7 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
         if all(bbox):
             kwargs['bbox_polygon'] = Polygon.from_bbox(bbox)
         super(ResourceBase, self).__init__(*args, **kwargs)
+        self._load_bbox_extents()
 
     def __str__(self):
         return "{0}".format(self.title)
@@ -918,51 +1058,50 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
         self.polymorphic_ctype.model:
             self.resource_type = self.polymorphic_ctype.model.lower()
 
+        notice_type_label = None
         if hasattr(self, 'class_name') and (self.pk is None or notify):
             if self.pk is None and self.title:
                 # Resource Created
-
                 notice_type_label = '%s_created' % self.class_name.lower()
-                recipients = get_notification_recipients(notice_type_label, resource=self)
-                send_notification(recipients, notice_type_label, {'resource': self})
             elif self.pk:
                 # Resource Updated
-                _notification_sent = False
 
                 # Approval Notifications Here
-                if not _notification_sent and settings.ADMIN_MODERATE_UPLOADS:
+                if not notice_type_label and settings.ADMIN_MODERATE_UPLOADS:
                     if not self.__is_approved and self.is_approved:
                         # Set "approved" workflow permissions
                         self.set_workflow_perms(approved=True)
 
                         # Send "approved" notification
                         notice_type_label = '%s_approved' % self.class_name.lower()
-                        recipients = get_notification_recipients(notice_type_label, resource=self)
-                        send_notification(recipients, notice_type_label, {'resource': self})
-                        _notification_sent = True
 
                 # Publishing Notifications Here
-                if not _notification_sent and settings.RESOURCE_PUBLISHING:
+                if not notice_type_label and settings.RESOURCE_PUBLISHING:
                     if not self.__is_published and self.is_published:
                         # Set "published" workflow permissions
                         self.set_workflow_perms(published=True)
 
                         # Send "published" notification
                         notice_type_label = '%s_published' % self.class_name.lower()
-                        recipients = get_notification_recipients(notice_type_label, resource=self)
-                        send_notification(recipients, notice_type_label, {'resource': self})
-                        _notification_sent = True
 
                 # Updated Notifications Here
-                if not _notification_sent:
+                if not notice_type_label:
                     notice_type_label = '%s_updated' % self.class_name.lower()
-                    recipients = get_notification_recipients(notice_type_label, resource=self)
-                    send_notification(recipients, notice_type_label, {'resource': self})
+
+        self._set_bbox_extents()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'bbox_polygon', 'srid'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'bbox_extent', 'll_bbox_extent'}
 
         super(ResourceBase, self).save(*args, **kwargs)
         self.__is_approved = self.is_approved
         self.__is_published = self.is_published
 
+        if notice_type_label:
+            # several saves of the resource in the same transaction notify once
+            queue_resource_work(
+                notice_type_label, self.pk, resourcebase_notify, self, notice_type_label)
+
     def delete(self, notify=True, *args, **kwargs):
         """
         Send a notification when a layer, map or document is deleted
@@ -1015,20 +1154,67 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
             return str(self.group).encode("utf-8", "replace")
         return None
 
+    def _bbox_cache(self):
+        """
+        Per instance cache of the values derived from `bbox_polygon` and
+        `srid`, dropped whenever any of them is replaced.
+        """
+        key = (self.bbox_polygon, self.srid)
+        cache = self.__dict__.get('_bbox_values_cache')
+        if cache is None or cache[0][0] is not key[0] or cache[0][1] != key[1]:
+            cache = self.__dict__['_bbox_values_cache'] = (key, {})
+        return cache[1]
+
+    def _bbox_srid(self):
+        return _srid_code(self.srid)
+
+    def _load_bbox_extents(self):
+        """
+        Caches the stored extents of the polygon just loaded, unless they are
+        deferred or were not updated along with it (see `get_bbox_extents`).
+        """
+        bbox_polygon = self.__dict__.get('bbox_polygon')
+        if not bbox_polygon or bbox_polygon.srid != 4326 or 'srid' not in self.__dict__ or \
+                not self.__dict__.get('bbox_extent') or not self.__dict__.get('ll_bbox_extent'):
+            return
+        try:
+            bbox = _parse_extent(self.bbox_extent) + [self._bbox_srid()]
+            ll_bbox = _parse_extent(self.ll_bbox_extent) + ["EPSG:4326"]
+        except (AttributeError, ValueError):
+            return
+        x0, y0, x1, y1 = bbox_polygon.extent
+        if ll_bbox[:4] != [x0, x1, y0, y1] or (bbox[4] == "EPSG:4326" and bbox != ll_bbox):
+            return
+        self._bbox_cache().update(bbox=bbox, ll_bbox=ll_bbox)
+
+    def _set_bbox_extents(self):
+        """
+        Stores the bbox extents as read back from the database, where the
+        polygon is kept in EPSG:4326.
+        """
+        if 'bbox_polygon' not in self.__dict__ or 'srid' not in self.__dict__:
+            # deferred, and so not changed
+            return
+        self.bbox_extent = self.ll_bbox_extent = None
+        if not self.bbox_polygon:
+            return
+        try:
+            bbox, ll_bbox = _stored_bbox_extents(self.bbox_polygon, self.srid)
+        except Exception as e:
+            logger.debug(e)
+            return
+        self.bbox_extent = _format_extent(bbox)
+        self.ll_bbox_extent = _format_extent(ll_bbox)
+        self._bbox_cache().update(bbox=bbox, ll_bbox=ll_bbox)
+
     @property
     def bbox(self):
         """BBOX is in the format: [x0, x1, y0, y1, srid]."""
         if self.bbox_polygon:
-            bbox = self.bbox_polygon
-            match = re.match(r'^(EPSG:)?(?P<srid>\d{4,6})$', self.srid)
-            srid = int(match.group('srid'))
-            if bbox.srid is not None and bbox.srid != srid:
-                try:
-                    bbox = bbox.transform(srid, clone=True)
-                except Exception:
-                    bbox.srid = srid
-            bbox = BBOXHelper(bbox.extent)
-            return [bbox.xmin, bbox.xmax, bbox.ymin, bbox.ymax, "EPSG:{}".format(srid)]
+            cache = self._bbox_cache()
+            if 'bbox' not in cache:
+                cache['bbox'] = _polygon_bbox(self.bbox_polygon, self._bbox_srid())
+            return list(cache['bbox'])
         bbox = BBOXHelper.from_xy([-180, 180, -90, 90])
         return [bbox.xmin, bbox.xmax, bbox.ymin, bbox.ymax, "EPSG:4326"]
 
@@ -1037,12 +1223,10 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
         """BBOX is in the format [x0, x1, y0, y1, "EPSG:srid"]. Provides backwards
         compatibility after transition to polygons."""
         if self.bbox_polygon:
-            bbox = self.bbox_polygon
-            if bbox.srid is not None and bbox.srid != 4326:
-                bbox = bbox.transform(4326, clone=True)
-
-            bbox = BBOXHelper(bbox.extent)
-            return [bbox.xmin, bbox.xmax, bbox.ymin, bbox.ymax, "EPSG:4326"]
+            cache = self._bbox_cache()
+            if 'll_bbox' not in cache:
+                cache['ll_bbox'] = _polygon_bbox(self.bbox_polygon, "EPSG:4326")
+            return list(cache['ll_bbox'])
         bbox = BBOXHelper.from_xy([-180, 180, -90, 90])
         return [bbox.xmin, bbox.xmax, bbox.ymin, bbox.ymax, "EPSG:4326"]
 
@@ -1112,10 +1296,13 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
         Returns an EWKT representation of the bounding box in EPSG:4326
         """
         if self.bbox_polygon:
-            bbox = self.bbox_polygon
-            if bbox.srid != 4326:
-                bbox = bbox.transform(4326, clone=True)
-            return str(bbox)
+            cache = self._bbox_cache()
+            if 'geographic_bounding_box' not in cache:
+                bbox = self.bbox_polygon
+                if bbox.srid != 4326:
+                    bbox = bbox.transform(4326, clone=True)
+                cache['geographic_bounding_box'] = str(bbox)
+            return cache['geographic_bounding_box']
         else:
             bbox = BBOXHelper.from_xy([-180, 180, -90, 90])
             return bbox_to_wkt(
@@ -1171,7 +1358,7 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
                     if field.name == 'Not Specified':
                         continue
                 if required_field == 'regions':
-                    if not field.all():
+                    if not self.region_name_list():
                         continue
                 if required_field == 'category':
                     if not field.identifier:
@@ -1188,14 +1375,32 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
         except Exception:
             return False
 
+    def _m2m_values(self, name, attr):
+        """
+        The `attr` values of the `name` relation, read once per instance and
+        dropped when the relation changes (see `resourcebase_m2m_changed`).
+        """
+        cache = self.__dict__.setdefault('_m2m_values_cache', {})
+        if (name, attr) not in cache:
+            cache[(name, attr)] = [getattr(obj, attr) for obj in getattr(self, name).all()]
+        return list(cache[(name, attr)])
+
+    def clear_m2m_values_cache(self):
+        self.__dict__.pop('_m2m_values_cache', None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.clear_m2m_values_cache()
+        super(ResourceBase, self).refresh_from_db(*args, **kwargs)
+        self._load_bbox_extents()
+
     def keyword_list(self):
-        return [kw.name for kw in self.keywords.all()]
+        return self._m2m_values('keywords', 'name')
 
     def keyword_slug_list(self):
-        return [kw.slug for kw in self.keywords.all()]
+        return self._m2m_values('keywords', 'slug')
 
     def region_name_list(self):
-        return [region.name for region in self.regions.all()]
+        return self._m2m_values('regions', 'name')
 
     def spatial_representation_type_string(self):
         if hasattr(self.spatial_representation_type, 'identifier'):
@@ -1604,13 +1809,18 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
             resource=self,
             contact=poc)
 
-    def _get_poc(self):
+    def _get_contact(self, role):
+        if 'contactrole_set' in getattr(self, '_prefetched_objects_cache', {}):
+            # contact roles loaded in bulk, e.g. by the API serializers
+            return next(
+                (_cr.contact for _cr in self.contactrole_set.all() if _cr.role == role), None)
         try:
-            the_poc = ContactRole.objects.get(
-                role='pointOfContact', resource=self).contact
+            return ContactRole.objects.get(role=role, resource=self).contact
         except ContactRole.DoesNotExist:
-            the_poc = None
-        return the_poc
+            return None
+
+    def _get_poc(self):
+        return self._get_contact('pointOfContact')
 
     poc = property(_get_poc, _set_poc)
 
@@ -1624,12 +1834,7 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
             contact=metadata_author)
 
     def _get_metadata_author(self):
-        try:
-            the_ma = ContactRole.objects.get(
-                role='author', resource=self).contact
-        except ContactRole.DoesNotExist:
-            the_ma = None
-        return the_ma
+        return self._get_contact('author')
 
     def handle_moderated_uploads(self):
         if settings.RESOURCE_PUBLISHING:
@@ -1878,11 +2083,25 @@ class GroupGeoLimit(models.Model):
         blank=True)
 
 
+def resourcebase_notify(instance, notice_type_label):
+    """
+    Sends the notifications of the resource to the subscribed users.
+    """
+    recipients = get_notification_recipients(notice_type_label, resource=instance)
+    send_notification(recipients, notice_type_label, {'resource': instance})
+
+
 def resourcebase_post_save(instance, *args, **kwargs):
     """
     Used to fill any additional fields after the save.
     Has to be called by the children
+
+    With ASYNC_SIGNALS the work runs once per resource, after the commit.
     """
+    queue_resource_work('resourcebase_post_save', instance.id, _resourcebase_post_save, instance)
+
+
+def _resourcebase_post_save(instance):
     try:
         # set default License if no specified
         if instance.license is None:
@@ -1912,30 +2131,12 @@ def resourcebase_post_save(instance, *args, **kwargs):
             poly1 = GEOSGeometry(wkt1, srid=int(srid1[0]))
             poly1.transform(4326)
 
-            queryset = Region.objects.all().order_by('name')
-            global_regions = []
-            regions_to_add = []
-            for region in queryset:
-                try:
-                    srid2, wkt2 = region.geographic_bounding_box.split(";")
-                    srid2 = re.findall(r'\d+', srid2)
-
-                    poly2 = GEOSGeometry(wkt2, srid=int(srid2[0]))
-                    poly2.transform(4326)
-
-                    if poly2.intersection(poly1):
-                        regions_to_add.append(region)
-                    if region.level == 0 and region.parent is None:
-                        global_regions.append(region)
-                except Exception:
-                    tb = traceback.format_exc()
-                    if tb:
-                        logger.debug(tb)
-            if regions_to_add or global_regions:
-                if regions_to_add and len(
-                        regions_to_add) > 0 and len(regions_to_add) <= 30:
-                    instance.regions.add(*regions_to_add)
-                else:
+            regions_to_add = get_intersecting_regions(poly1)
+            if regions_to_add and len(regions_to_add) <= 30:
+                instance.regions.add(*regions_to_add)
+            else:
+                global_regions = Region.objects.filter(level=0, parent__isnull=True).order_by('name')
+                if global_regions:
                     instance.regions.add(*global_regions)
     except Exception:
         tb = traceback.format_exc()
@@ -1943,8 +2144,8 @@ def resourcebase_post_save(instance, *args, **kwargs):
             logger.debug(tb)
     finally:
         # refresh catalogue metadata records
-        from geonode.catalogue.models import catalogue_post_save
-        catalogue_post_save(instance=instance, sender=instance.__class__)
+        from geonode.catalogue.models import catalogue_post_save_deferred
+        catalogue_post_save_deferred(instance=instance, sender=instance.__class__)
 
 
 def rating_post_save(instance, *args, **kwargs):
@@ -1957,3 +2158,15 @@ def rating_post_save(instance, *args, **kwargs):
 
 
 signals.post_save.connect(rating_post_save, sender=OverallRating)
+
+
+def resourcebase_m2m_changed(instance, action, reverse, *args, **kwargs):
+    """
+    Drops the memoized keywords and regions of a resource when they change.
+    """
+    if not reverse and action.startswith('post_') and isinstance(instance, ResourceBase):
+        instance.clear_m2m_values_cache()
+
+
+signals.m2m_changed.connect(resourcebase_m2m_changed, sender=TaggedContentItem)
+signals.m2m_changed.connect(resourcebase_m2m_changed, sender=ResourceBase.regions.through)
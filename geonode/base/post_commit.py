@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""
+Post-commit work queue for the side effects of the resources saves.
+
+A resource is often saved several times in the same request or transaction
+(uploads, metadata wizards, ...) and every save triggers the same side effects:
+notifications, `resourcebase_post_save`, the GeoServer synchronization...
+With ASYNC_SIGNALS that work is queued keyed by kind and resource id and run
+once per key, with the arguments of the last save, after the transaction
+commits. Inside `deferred_resource_work` (e.g. during a request, see
+`PostCommitWorkMiddleware`) it is held until the scope ends; the work queued
+in an atomic block joins the scope only once its transaction commits, so that
+the work of a rolled back transaction is dropped.
+
+Without ASYNC_SIGNALS the work is run straight away, as before.
+"""
+
+import logging
+import threading
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class _Batch(object):
+    """Pending work, {(kind, resource id): (func, args, kwargs)}"""
+
+    def __init__(self):
+        self.pending = {}
+
+    def __bool__(self):
+        return bool(self.pending)
+
+    def add(self, kind, resource_id, func, args, kwargs):
+        self.pending[(kind, resource_id)] = (func, args, kwargs)
+
+    def commit(self):
+        """Hands the work of a committed transaction to the scope, if any, or runs it."""
+        if _scope_depth():
+            _state.scope_batch.pending.update(self.pending)
+            self.pending = {}
+        else:
+            self.run()
+
+    def run(self):
+        while self.pending:
+            (kind, resource_id) = next(iter(self.pending))
+            func, args, kwargs = self.pending.pop((kind, resource_id))
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.exception(e)
+                logger.error(f"Could not run the '{kind}' work of the resource {resource_id}")
+
+
+def _scope_depth():
+    return getattr(_state, 'depth', 0)
+
+
+def _transaction_batch():
+    batch = getattr(_state, 'batch', None)
+    # a batch whose transaction, or savepoint, rolled back or which already ran
+    # is not among the connection commit hooks, (savepoint ids, func, ...), anymore
+    if batch is None or not any(getattr(_hook[1], '__self__', None) is batch for _hook in connection.run_on_commit):
+        batch = _state.batch = _Batch()
+        transaction.on_commit(batch.commit)
+    return batch
+
+
+def queue_resource_work(kind, resource_id, func, *args, **kwargs):
+    """
+    Run `func(*args, **kwargs)` once per kind and resource after the commit.
+
+    Queuing the same kind of work again for the same resource replaces the
+    pending call.
+    """
+    if not getattr(settings, 'ASYNC_SIGNALS', False):
+        return func(*args, **kwargs)
+    if connection.in_atomic_block:
+        batch = _transaction_batch()
+    elif _scope_depth():
+        batch = _state.scope_batch
+    else:
+        return func(*args, **kwargs)
+    batch.add(kind, resource_id, func, args, kwargs)
+
+
+@contextmanager
+def deferred_resource_work():
+    """
+    Holds the resources work queued in the block and runs it, coalesced, when
+    the outermost block ends and its transaction, if any, commits.
+    """
+    if not _scope_depth():
+        _state.scope_batch = _Batch()
+    _state.depth = _scope_depth() + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+        if not _state.depth:
+            batch, _state.scope_batch = _state.scope_batch, None
+            if batch:
+                transaction.on_commit(batch.run)
+
+
+class PostCommitWorkMiddleware:
+    """
+    Runs the side effects of the resources saved during a request once, at
+    the end of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with deferred_resource_work():
+            return self.get_response(request)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import json
+import hashlib
+
+from haystack import indexes
+
+from geonode.security.utils import get_view_acls
+
+
+def get_acl_fingerprint(owner_id, group_id, is_approved, is_published, dirty_state, users, groups):
+    """The digest of the indexed visibility rules of a resource, see `ResourceBaseACLIndex`"""
+    return hashlib.md5(json.dumps([
+        owner_id, group_id, bool(is_approved), bool(is_published), bool(dirty_state),
+        sorted(users), sorted(groups)]).encode('utf-8')).hexdigest()
+
+
+class ResourceBaseACLIndex(indexes.SearchIndex):
+    """
+    The visibility rules of the resources, so that the search backend can
+    filter the results by permissions, see
+    `geonode.security.utils.get_visible_resources_sq`.
+
+    `acl_hash` lets `geonode.haystack_signals.reconcile_search_acls` find the
+    documents whose rules are outdated.
+    """
+    owner_id = indexes.IntegerField(model_attr='owner_id', null=True, stored=False)
+    group_id = indexes.IntegerField(model_attr='group_id', null=True, stored=False)
+    is_approved = indexes.BooleanField(model_attr='is_approved', stored=False)
+    is_published = indexes.BooleanField(model_attr='is_published')
+    dirty_state = indexes.BooleanField(model_attr='dirty_state', stored=False)
+    acl_users = indexes.MultiValueField(null=True, stored=False)
+    acl_groups = indexes.MultiValueField(null=True, stored=False)
+    acl_hash = indexes.CharField(indexed=False)
+
+    def prefetch_acls(self, objs):
+        """Loads the permissions of `objs` with two queries instead of two per object"""
+        acls = get_view_acls([obj.pk for obj in objs])
+        for obj in objs:
+            obj._search_acls = acls[obj.pk]
+
+    def _acls(self, obj):
+        if not hasattr(obj, '_search_acls'):
+            self.prefetch_acls([obj])
+        return obj._search_acls
+
+    def prepare_acl_users(self, obj):
+        return sorted(self._acls(obj)['users'])
+
+    def prepare_acl_groups(self, obj):
+        return sorted(self._acls(obj)['groups'])
+
+    def prepare_acl_hash(self, obj):
+        acls = self._acls(obj)
+        return get_acl_fingerprint(
+            obj.owner_id, obj.group_id, obj.is_approved, obj.is_published, obj.dirty_state,
+            acls['users'], acls['groups'])
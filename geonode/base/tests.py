@@ -33,13 +33,19 @@ from geonode.maps.models import Map
 from geonode.services.models import Service
 from geonode.tests.base import GeoNodeBaseTestSupport
 from geonode.base.models import (
-    ResourceBase, MenuPlaceholder, Menu, MenuItem, Configuration, TopicCategory
+    ResourceBase, MenuPlaceholder, Menu, MenuItem, Configuration, TopicCategory, Region,
+    get_bbox_extents, get_intersecting_regions
 )
 from django.template import Template, Context
+from django.contrib.gis.geos import Polygon
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings, SimpleTestCase
+from django.db import transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings, SimpleTestCase
 from django.shortcuts import reverse
 
+from geonode.base.bbox_utils import polygon_from_bbox
+from geonode.base.counters import ViewCounter, count_view
+from geonode.base.post_commit import deferred_resource_work, queue_resource_work
 from geonode.base.middleware import ReadOnlyMiddleware, MaintenanceMiddleware
 from geonode.base.models import CuratedThumbnail
 from geonode.base.templatetags.base_tags import get_visibile_resources
@@ -834,3 +840,246 @@ class TestHtmlTagRemoval(SimpleTestCase):
         r = ResourceBase()
         filtered_value = r._remove_html_tags(tagged_value)
         self.assertEqual(filtered_value, attribute_target_value)
+
+
+class TestViewCounter(TestCase):
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create(username='owner')
+        self.viewer = get_user_model().objects.create(username='viewer')
+        self.resources = [ResourceBase.objects.create(owner=self.owner) for _ in range(3)]
+        self.counters = []
+
+    def tearDown(self):
+        for counter in self.counters:
+            if counter._timer is not None:
+                counter._timer.cancel()
+
+    def _counter(self, **kwargs):
+        counter = ViewCounter(**kwargs)
+        self.counters.append(counter)
+        return counter
+
+    def test_views_are_flushed_in_batches(self):
+        counter = self._counter(flush_interval=3600, batch_size=100)
+        for _ in range(3):
+            counter.add(self.resources[0].id)
+        counter.add(self.resources[1].id)
+
+        # Nothing is written until the counter is flushed
+        self.assertEqual(ResourceBase.objects.get(id=self.resources[0].id).popular_count, 0)
+        self.assertEqual(counter.stats()['pending_resources'], 2)
+        self.assertEqual(counter.stats()['pending_views'], 4)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(counter.flush(), 2)
+        self.assertEqual(ResourceBase.objects.get(id=self.resources[0].id).popular_count, 3)
+        self.assertEqual(ResourceBase.objects.get(id=self.resources[1].id).popular_count, 1)
+        self.assertEqual(ResourceBase.objects.get(id=self.resources[2].id).popular_count, 0)
+        self.assertEqual(counter.stats()['pending_views'], 0)
+        self.assertIsNotNone(counter.stats()['last_flush_duration'])
+
+    def test_views_are_flushed_on_time(self):
+        counter = self._counter(flush_interval=3600, batch_size=100)
+        counter.add(self.resources[0].id)
+        # a timer flushes the views even if no other view comes
+        timer = counter._timer
+        self.assertIsNotNone(timer)
+        timer.cancel()
+        counter.add(self.resources[0].id)
+        self.assertIs(counter._timer, timer)
+
+        with patch('geonode.base.counters.connection'):
+            counter._timed_flush()
+        self.assertIsNone(counter._timer)
+        self.assertEqual(ResourceBase.objects.get(id=self.resources[0].id).popular_count, 2)
+        self.assertEqual(counter.stats()['pending_views'], 0)
+
+    def test_owner_views_are_not_counted(self):
+        with patch('geonode.base.counters.view_counter', self._counter(flush_interval=0)):
+            self.assertFalse(count_view(self.resources[0], self.owner))
+            self.assertTrue(count_view(self.resources[0], self.viewer))
+        self.assertEqual(ResourceBase.objects.get(id=self.resources[0].id).popular_count, 1)
+
+
+class TestRegionsAssignment(TestCase):
+
+    def setUp(self):
+        self.world = Region.objects.create(
+            code='TST_GLO', name='Test World',
+            bbox_x0=-180, bbox_x1=180, bbox_y0=-90, bbox_y1=90)
+        self.italy = Region.objects.create(
+            code='TST_ITA', name='Test Italy', parent=self.world,
+            bbox_x0=6.6, bbox_x1=18.5, bbox_y0=35.5, bbox_y1=47.1)
+        self.japan = Region.objects.create(
+            code='TST_JPN', name='Test Japan', parent=self.world,
+            bbox_x0=122.9, bbox_x1=153.9, bbox_y0=24.0, bbox_y1=45.5)
+        # 3857 bbox of Iceland
+        self.iceland = Region.objects.create(
+            code='TST_ISL', name='Test Iceland', parent=self.world, srid='EPSG:3857',
+            bbox_x0=-2737000, bbox_x1=-1502000, bbox_y0=9285000, bbox_y1=9997000)
+
+    def test_region_bbox_polygon(self):
+        self.assertEqual(self.italy.bbox_polygon.srid, 4326)
+        self.assertEqual(self.italy.bbox_polygon.extent, (6.6, 35.5, 18.5, 47.1))
+        self.assertEqual(self.iceland.bbox_polygon.srid, 4326)
+        self.assertAlmostEqual(self.iceland.bbox_polygon.extent[0], -24.59, places=2)
+
+    def test_get_intersecting_regions(self):
+        regions = [_r for _r in get_intersecting_regions(polygon_from_bbox((10, 40, 12, 42)))
+                   if _r.code.startswith('TST_')]
+        self.assertEqual(regions, [self.italy, self.world])
+        regions = [_r for _r in get_intersecting_regions(polygon_from_bbox((-20, 64, -18, 65)))
+                   if _r.code.startswith('TST_')]
+        self.assertEqual(regions, [self.iceland, self.world])
+
+        # the index follows the changes of the regions
+        self.italy.bbox_x0, self.italy.bbox_x1 = 130, 140
+        self.italy.save()
+        regions = [_r for _r in get_intersecting_regions(polygon_from_bbox((10, 40, 12, 42)))
+                   if _r.code.startswith('TST_')]
+        self.assertEqual(regions, [self.world])
+
+    def test_resource_regions(self):
+        owner = get_user_model().objects.create(username='owner')
+        document = Document.objects.create(
+            owner=owner, title='Test document', bbox_polygon=Polygon.from_bbox((135, 30, 136, 31)))
+        self.assertIn(self.japan, document.regions.all())
+        self.assertNotIn(self.italy, document.regions.all())
+
+
+class TestResourceBaseComputedProperties(TestCase):
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create(username='owner')
+        self.resource = ResourceBase.objects.create(
+            owner=self.owner, title='Test resource', bbox_polygon=Polygon.from_bbox((10, 40, 12, 42)))
+
+    def test_bbox_extents_are_stored(self):
+        self.assertEqual(self.resource.bbox_extent, '10.0,40.0,12.0,42.0')
+        self.assertEqual(self.resource.ll_bbox_extent, '10.0,40.0,12.0,42.0')
+
+        resource = ResourceBase.objects.get(id=self.resource.id)
+        self.assertEqual(resource.bbox, [10.0, 12.0, 40.0, 42.0, 'EPSG:4326'])
+        self.assertEqual(resource.ll_bbox_string, '10.0000000,40.0000000,12.0000000,42.0000000')
+
+        # the extents follow the polygon
+        resource.set_bbox_polygon((0, 0, 1, 1), 'EPSG:4326')
+        self.assertEqual(resource.bbox, [0.0, 1.0, 0.0, 1.0, 'EPSG:4326'])
+        resource.save()
+        self.assertEqual(ResourceBase.objects.get(id=self.resource.id).bbox_extent, '0.0,0.0,1.0,1.0')
+
+    def test_bbox_extents_after_queryset_update(self):
+        ResourceBase.objects.filter(id=self.resource.id).update(bbox_polygon=polygon_from_bbox((0, 0, 1, 1)))
+
+        # the stale extents are ignored
+        resource = ResourceBase.objects.get(id=self.resource.id)
+        self.assertEqual(resource.bbox_extent, '10.0,40.0,12.0,42.0')
+        self.assertEqual(resource.bbox, [0.0, 1.0, 0.0, 1.0, 'EPSG:4326'])
+        self.assertEqual(resource.ll_bbox_string, '0.0000000,0.0000000,1.0000000,1.0000000')
+
+        # and stored when updated along with the polygon
+        bbox_polygon = polygon_from_bbox((2, 2, 3, 3))
+        ResourceBase.objects.filter(id=self.resource.id).update(
+            bbox_polygon=bbox_polygon, **get_bbox_extents(bbox_polygon, 'EPSG:4326'))
+        resource = ResourceBase.objects.get(id=self.resource.id)
+        self.assertEqual(resource.bbox_extent, '2.0,2.0,3.0,3.0')
+        self.assertEqual(resource.bbox, [2.0, 3.0, 2.0, 3.0, 'EPSG:4326'])
+
+    def test_keyword_list_is_memoized(self):
+        resource = ResourceBase.objects.get(id=self.resource.id)
+        self.assertEqual(resource.keyword_list(), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(resource.keyword_list(), [])
+
+        # and dropped when the keywords change
+        resource.keywords.add('test_keyword')
+        self.assertEqual(resource.keyword_list(), ['test_keyword'])
+        resource.keywords.clear()
+        self.assertEqual(resource.keyword_list(), [])
+
+
+class TestPostCommitWork(SimpleTestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def _work(self, *args):
+        self.calls.append(args)
+
+    def test_work_runs_straight_away_without_async_signals(self):
+        with override_settings(ASYNC_SIGNALS=False):
+            with deferred_resource_work():
+                queue_resource_work('kind', 1, self._work, 'first')
+                self.assertEqual(self.calls, [('first', )])
+
+    @patch('geonode.base.post_commit.transaction.on_commit', side_effect=lambda func: func())
+    def test_work_is_coalesced(self, on_commit):
+        with override_settings(ASYNC_SIGNALS=True):
+            with deferred_resource_work():
+                queue_resource_work('kind', 1, self._work, 'first')
+                with deferred_resource_work():
+                    queue_resource_work('kind', 1, self._work, 'second')
+                    queue_resource_work('kind', 2, self._work, 'other resource')
+                queue_resource_work('other kind', 1, self._work, 'other kind')
+                self.assertEqual(self.calls, [])
+        self.assertEqual(on_commit.call_count, 1)
+        self.assertEqual(
+            self.calls,
+            [('second', ), ('other resource', ), ('other kind', )])
+
+
+@override_settings(ASYNC_SIGNALS=True)
+class TestPostCommitWorkTransactions(TransactionTestCase):
+    """Runs the work queued in real atomic blocks, without patching on_commit."""
+
+    def setUp(self):
+        self.calls = []
+
+    def _work(self, *args):
+        self.calls.append(args)
+
+    def test_work_runs_once_after_commit(self):
+        with transaction.atomic():
+            queue_resource_work('kind', 1, self._work, 'first')
+            with transaction.atomic():
+                queue_resource_work('kind', 1, self._work, 'second')
+            self.assertEqual(self.calls, [])
+        self.assertEqual(self.calls, [('second', )])
+
+        with transaction.atomic():
+            queue_resource_work('kind', 1, self._work, 'next transaction')
+        self.assertEqual(self.calls, [('second', ), ('next transaction', )])
+
+    def test_work_is_dropped_on_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                queue_resource_work('kind', 1, self._work, 'rolled back')
+                raise RuntimeError()
+        self.assertEqual(self.calls, [])
+
+        with transaction.atomic():
+            queue_resource_work('kind', 1, self._work, 'committed')
+        self.assertEqual(self.calls, [('committed', )])
+
+    def test_work_is_dropped_on_savepoint_rollback(self):
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    queue_resource_work('kind', 1, self._work, 'rolled back')
+                    raise RuntimeError()
+            queue_resource_work('kind', 2, self._work, 'committed')
+        self.assertEqual(self.calls, [('committed', )])
+
+    def test_work_of_a_rolled_back_transaction_is_dropped_from_the_scope(self):
+        with deferred_resource_work():
+            queue_resource_work('kind', 1, self._work, 'scope')
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    queue_resource_work('kind', 2, self._work, 'rolled back')
+                    raise RuntimeError()
+            with transaction.atomic():
+                queue_resource_work('kind', 1, self._work, 'committed')
+                queue_resource_work('kind', 3, self._work, 'other resource')
+            self.assertEqual(self.calls, [])
+        self.assertEqual(self.calls, [('committed', ), ('other resource', )])
@@ -34,6 +34,7 @@ from owslib.csw import CatalogueServiceWeb, namespaces
 from owslib.util import http_post
 from defusedxml import lxml as dlxml
 from geonode.catalogue.backends.base import BaseCatalogueBackend
+from geonode.catalogue.records import DEFAULT_METADATA_TEMPLATE, iso_record
 
 logger = logging.getLogger(__name__)
 
@@ -177,6 +178,24 @@ class Catalogue(CatalogueServiceWeb):
         md_doc = tpl.render(context=ctx)
         return md_doc
 
+    def csw_gen_record(self, layer, template):
+        """
+        Returns the XML metadata document of the layer and its CSW anytext.
+
+        The default ISO template is served by the fast lxml serializer, unless
+        CATALOG_METADATA_FAST_RENDERING is disabled.
+        """
+        if template == DEFAULT_METADATA_TEMPLATE and \
+                getattr(settings, 'CATALOG_METADATA_FAST_RENDERING', True):
+            return iso_record(layer)
+        md_doc = self.csw_gen_xml(layer, template)
+        try:
+            csw_anytext = self.csw_gen_anytext(md_doc)
+        except Exception as e:
+            logger.exception(e)
+            csw_anytext = ''
+        return md_doc, csw_anytext
+
     def csw_gen_anytext(self, xml):
         """ get all element data from an XML document """
         xml = dlxml.fromstring(xml)
@@ -19,10 +19,15 @@
 #########################################################################
 
 import os
+import copy
+import threading
+from time import time
 from defusedxml import lxml as dlxml
 from django.conf import settings
+from django.utils.module_loading import import_string
 from owslib.iso import MD_Metadata
 from pycsw import server
+from pycsw.ogc.csw import csw2, csw3
 from geonode.catalogue.backends.generic import CatalogueBackend as GenericCatalogueBackend
 from geonode.catalogue.backends.generic import METADATA_FORMATS
 from shapely.errors import WKBReadingError, WKTReadingError
@@ -57,6 +62,98 @@ CONFIGURATION = {
     }
 }
 
+_engines = threading.local()
+
+
+def get_configuration():
+    """Returns the pycsw configuration, GeoNode defaults overridden by the user settings"""
+    mdict = copy.deepcopy(dict(settings.PYCSW['CONFIGURATION'], **CONFIGURATION))
+    if 'server' in settings.PYCSW['CONFIGURATION']:
+        # override server system defaults with user specified directives
+        mdict['server'].update(settings.PYCSW['CONFIGURATION']['server'])
+    return mdict
+
+
+class GeoNodeCsw(server.Csw):
+    """
+    pycsw server initialized once with the GeoNode configuration and mappings,
+    and then reused for many requests after a call to ``reset``.
+    """
+
+    def __init__(self, rtconfig, version='2.0.2'):
+        super(GeoNodeCsw, self).__init__(rtconfig, env={'QUERY_STRING': ''}, version=version)
+        self.default_version = version
+        self.default_mimetype = self.mimetype
+        self.default_filter = self.config.get('repository', 'filter', raw=True, fallback=None)
+        # dispatch() extends the models in place (output schemas, profiles),
+        # keep a pristine copy to start every request from the same state
+        self.pristine_models = copy.deepcopy(self.context.models)
+
+    def reset(self, env=None, repo_filter=None):
+        """Clears the state left by the previous request"""
+        self.environ = env or {'QUERY_STRING': ''}
+        self.kvp = {}
+        self.mode = 'csw'
+        self.asynchronous = False
+        self.soap = False
+        self.request = None
+        self.requesttype = None
+        self.exception = False
+        self.status = 'OK'
+        self.profiles = None
+        self.manager = False
+        self.mimetype = self.default_mimetype
+        self.process_time_start = time()
+        # the repository carries the authorization filter of the previous request
+        for attr in ('response', 'contenttype', 'oaiargs', 'repository'):
+            self.__dict__.pop(attr, None)
+
+        self.context.models = copy.deepcopy(self.pristine_models)
+        self.request_version = self.default_version
+        if self.request_version == '2.0.2':
+            self.iface = csw2.Csw2(server_csw=self)
+            self.context.set_model('csw')
+        else:
+            self.iface = csw3.Csw3(server_csw=self)
+            self.context.set_model('csw30')
+
+        repo_filter = repo_filter or self.default_filter
+        if repo_filter is not None:
+            self.config.set('repository', 'filter', repo_filter)
+        else:
+            self.config.remove_option('repository', 'filter')
+
+    def load_repository(self):
+        """
+        Builds the repository with the filter of the current request, as
+        dispatch() does, for the operations called without it.
+        """
+        repository_class = import_string(self.config.get('repository', 'source'))
+        self.repository = repository_class(
+            self.context, self.config.get('repository', 'filter', raw=True, fallback=None))
+
+
+def get_csw_engine(env=None, repo_filter=None, version='2.0.2'):
+    """
+    Returns the pycsw server of the current thread, ready to serve a new request
+    with the given HTTP environment and repository filter.
+    """
+    engines = getattr(_engines, 'engines', None)
+    if engines is None:
+        engines = _engines.engines = {}
+
+    csw = engines.get(version)
+    if csw is None:
+        csw = GeoNodeCsw(get_configuration(), version=version)
+        if hasattr(csw, 'response'):
+            # the configuration could not be loaded, let pycsw report the error
+            csw.environ = env or csw.environ
+            return csw
+        engines[version] = csw
+
+    csw.reset(env, repo_filter)
+    return csw
+
 
 class CatalogueBackend(GenericCatalogueBackend):
     def __init__(self, *args, **kwargs):
@@ -117,16 +214,8 @@ class CatalogueBackend(GenericCatalogueBackend):
         HTTP-less CSW
         """
 
-        mdict = dict(settings.PYCSW['CONFIGURATION'], **CONFIGURATION)
-        if 'server' in settings.PYCSW['CONFIGURATION']:
-            # override server system defaults with user specified directives
-            mdict['server'].update(settings.PYCSW['CONFIGURATION']['server'])
-
-        # fake HTTP environment variable
-        os.environ['QUERY_STRING'] = ''
-
-        # init pycsw
-        csw = server.Csw(mdict, version='2.0.2')
+        # init pycsw with a fake HTTP environment
+        csw = get_csw_engine()
 
         # fake HTTP method
         csw.requesttype = 'GET'
@@ -149,6 +238,7 @@ class CatalogueBackend(GenericCatalogueBackend):
                 'startposition': start,
                 'maxrecords': limit
             }
+            csw.load_repository()
             response = csw.getrecords()
         else:  # it's a GetRecordById request
             csw.kvp = {
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2021 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import time
+import statistics
+
+from django.core.management.base import BaseCommand
+from pycsw import server
+
+from geonode.base.models import ResourceBase
+from geonode.catalogue.backends.pycsw_local import get_configuration, get_csw_engine
+
+
+def _new_csw():
+    return server.Csw(get_configuration(), env={'QUERY_STRING': ''}, version='2.0.2')
+
+
+def _pooled_csw():
+    return get_csw_engine()
+
+
+class Command(BaseCommand):
+    help = ("Measure the latency of in-process CSW GetRecords and GetRecordById requests, "
+            "with a new pycsw server per request and with the pooled one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n',
+            '--iterations',
+            dest='iterations',
+            type=int,
+            default=50,
+            help='Number of requests to run for each case')
+
+    def handle(self, *args, **options):
+        iterations = max(1, options.get('iterations'))
+        uuid = ResourceBase.objects.values_list('uuid', flat=True).first()
+        requests = {
+            'GetRecords': {
+                'service': 'CSW',
+                'version': '2.0.2',
+                'request': 'GetRecords',
+                'typenames': 'csw:Record',
+                'elementsetname': 'full',
+                'resulttype': 'results',
+                'maxrecords': '10',
+            },
+            'GetRecordById': {
+                'service': 'CSW',
+                'version': '2.0.2',
+                'request': 'GetRecordById',
+                'id': uuid or '',
+                'outputschema': 'http://www.isotc211.org/2005/gmd',
+            },
+        }
+
+        for name, kvp in requests.items():
+            for label, factory in (('new server', _new_csw), ('pooled server', _pooled_csw)):
+                timings = []
+                for i in range(iterations):
+                    start = time.perf_counter()
+                    csw = factory()
+                    csw.requesttype = 'GET'
+                    csw.kvp = dict(kvp)
+                    csw.dispatch()
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                self.stdout.write('{:<14} {:<14} mean {:8.2f} ms  median {:8.2f} ms  p95 {:8.2f} ms'.format(
+                    name, label,
+                    statistics.mean(timings),
+                    statistics.median(timings),
+                    timings[int(len(timings) * 0.95) - 1]))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2021 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from geonode.base.models import ResourceBase
+from geonode.catalogue.models import CATALOGUE_SYNC_BATCH_SIZE, update_catalogue_records
+from geonode.utils import chunked
+
+
+class Command(BaseCommand):
+    help = 'Render and store again the catalogue records of all the resources'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b',
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=CATALOGUE_SYNC_BATCH_SIZE,
+            help='Number of records rendered and stored in each transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+        resource_ids = list(ResourceBase.objects.order_by('id').values_list('id', flat=True))
+        total = len(resource_ids)
+        start = time.perf_counter()
+        done = 0
+        for batch in chunked(resource_ids, batch_size):
+            update_catalogue_records(batch, batch_size=batch_size)
+            done += len(batch)
+            elapsed = time.perf_counter() - start
+            self.stdout.write('{}/{} records, {:.1f} records/s'.format(
+                done, total, done / elapsed if elapsed else 0))
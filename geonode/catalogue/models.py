@@ -21,17 +21,28 @@ import errno
 import logging
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import signals
 from lxml import etree
 from defusedxml import lxml as dlxml
 from geonode.layers.models import Layer
 from geonode.documents.models import Document
 from geonode.catalogue import get_catalogue
+from geonode.catalogue.records import RECORD_PREFETCH
 from geonode.base.models import Link, ResourceBase
+from geonode.utils import chunked
 
 
 LOGGER = logging.getLogger(__name__)
 
+CATALOGUE_SYNC_KEY = 'catalogue_sync:%s'
+# Seconds a queued update waits before running, saves in between are coalesced
+CATALOGUE_SYNC_DELAY = getattr(settings, 'CATALOGUE_SYNC_DELAY', 5)
+# Seconds after which a queued update which never ran is forgotten
+CATALOGUE_SYNC_TIMEOUT = getattr(settings, 'CATALOGUE_SYNC_TIMEOUT', 600)
+CATALOGUE_SYNC_BATCH_SIZE = getattr(settings, 'CATALOGUE_SYNC_BATCH_SIZE', 100)
+
 
 def catalogue_pre_delete(instance, sender, **kwargs):
     """Removes the layer from the catalogue"""
@@ -41,33 +52,99 @@ def catalogue_pre_delete(instance, sender, **kwargs):
 
 def catalogue_post_save(instance, sender, **kwargs):
     """Get information from catalogue"""
-    resources = ResourceBase.objects.filter(id=instance.resourcebase_ptr.id)
-
-    # Update the Catalog
-    try:
-        catalogue = get_catalogue()
-        catalogue.create_record(instance)
-        record = catalogue.get_record(instance.uuid)
-    except EnvironmentError as err:
-        msg = 'Could not connect to catalogue to save information for layer "%s"' % instance.name
-        if err.errno == errno.ECONNREFUSED:
-            LOGGER.warn(msg, err)
-            return
-        else:
-            raise err
+    update_catalogue_records([instance])
+
+
+def catalogue_post_save_deferred(instance, sender, **kwargs):
+    """
+    Queues the update of the catalogue record of the resource.
+
+    With ASYNC_SIGNALS the record is rendered by a background task after the
+    transaction commits; saves of a resource which is already waiting in the
+    queue are coalesced into the pending update.
+    """
+    if not settings.ASYNC_SIGNALS:
+        return catalogue_post_save(instance, sender, **kwargs)
+    queue_catalogue_records([instance.id])
+
 
-    if not record:
-        msg = ('Metadata record for %s does not exist,'
-               ' check the catalogue signals.' % instance.title)
-        LOGGER.exception(msg)
-        return
+def queue_catalogue_records(resource_ids):
+    """Queues the update of the catalogue records of the given resources"""
+    def _enqueue():
+        from geonode.catalogue.tasks import sync_catalogue_records
+        _ids = [_id for _id in resource_ids
+                if cache.add(CATALOGUE_SYNC_KEY % _id, True, CATALOGUE_SYNC_TIMEOUT)]
+        if _ids:
+            sync_catalogue_records.apply_async((_ids, ), countdown=CATALOGUE_SYNC_DELAY)
+
+    transaction.on_commit(_enqueue)
+
+
+def update_catalogue_records(resources, batch_size=None):
+    """
+    Renders the catalogue records of the resources, given as instances or ids,
+    and stores them with one transaction per batch.
+
+    The resources whose record cannot be rendered are logged and skipped.
+    """
+    batch_size = batch_size or CATALOGUE_SYNC_BATCH_SIZE
+    catalogue = get_catalogue()
+    for batch in chunked(resources, batch_size):
+        _ids = [_r for _r in batch if not isinstance(_r, ResourceBase)]
+        instances = [_r for _r in batch if isinstance(_r, ResourceBase)]
+        if _ids:
+            instances += list(ResourceBase.objects.filter(id__in=_ids).prefetch_related(*RECORD_PREFETCH))
 
-    if not hasattr(record, 'links'):
-        msg = ('Metadata record for %s should contain links.' % instance.title)
-        raise Exception(msg)
+        records = []
+        for instance in instances:
+            try:
+                values = _render_catalogue_record(catalogue, instance)
+            except ValueError:
+                # e.g. lxml refuses the control characters of a bad title or abstract
+                LOGGER.exception('Could not render the catalogue record of resource %s', instance.id)
+                continue
+            if values:
+                records.append((instance.id, values))
+
+        with transaction.atomic():
+            for _id, values in records:
+                ResourceBase.objects.filter(id=_id).update(**values)
+
+
+def _render_catalogue_record(catalogue, instance):
+    """
+    Updates the metadata links of the resource and returns the values of its
+    catalogue record.
+    """
+    if catalogue.catalogue.local:
+        # the record is served from the resource itself, the links do not
+        # depend on its current content
+        metadata_links = catalogue.catalogue.urls_for_uuid(instance.uuid)
+    else:
+        try:
+            catalogue.create_record(instance)
+            record = catalogue.get_record(instance.uuid)
+        except EnvironmentError as err:
+            msg = 'Could not connect to catalogue to save information for layer "%s"' % instance.name
+            if err.errno == errno.ECONNREFUSED:
+                LOGGER.warn(msg, err)
+                return
+            else:
+                raise err
+
+        if not record:
+            msg = ('Metadata record for %s does not exist,'
+                   ' check the catalogue signals.' % instance.title)
+            LOGGER.exception(msg)
+            return
+
+        if not hasattr(record, 'links'):
+            msg = ('Metadata record for %s should contain links.' % instance.title)
+            raise Exception(msg)
+        metadata_links = record.links['metadata']
 
     # Create the different metadata links with the available formats
-    for mime, name, metadata_url in record.links['metadata']:
+    for mime, name, metadata_url in metadata_links:
         try:
             Link.objects.get_or_create(
                 resource=instance.resourcebase_ptr,
@@ -93,22 +170,22 @@ def catalogue_post_save(instance, sender, **kwargs):
     # generate an XML document (GeoNode's default is ISO)
     if instance.metadata_uploaded and instance.metadata_uploaded_preserve:
         md_doc = etree.tostring(dlxml.fromstring(instance.metadata_xml))
+        try:
+            csw_anytext = catalogue.catalogue.csw_gen_anytext(md_doc)
+        except Exception as e:
+            LOGGER.exception(e)
+            csw_anytext = ''
     else:
-        md_doc = catalogue.catalogue.csw_gen_xml(instance, settings.CATALOG_METADATA_TEMPLATE)
-    try:
-        csw_anytext = catalogue.catalogue.csw_gen_anytext(md_doc)
-    except Exception as e:
-        LOGGER.exception(e)
-        csw_anytext = ''
-
-    resources.update(
+        md_doc, csw_anytext = catalogue.catalogue.csw_gen_record(instance, settings.CATALOG_METADATA_TEMPLATE)
+
+    return dict(
         metadata_xml=md_doc,
         csw_wkt_geometry=instance.geographic_bounding_box,
         csw_anytext=csw_anytext)
 
 
 if 'geonode.catalogue' in settings.INSTALLED_APPS:
-    signals.post_save.connect(catalogue_post_save, sender=Layer)
+    signals.post_save.connect(catalogue_post_save_deferred, sender=Layer)
     signals.pre_delete.connect(catalogue_pre_delete, sender=Layer)
-    signals.post_save.connect(catalogue_post_save, sender=Document)
+    signals.post_save.connect(catalogue_post_save_deferred, sender=Document)
     signals.pre_delete.connect(catalogue_pre_delete, sender=Document)
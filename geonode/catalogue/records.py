@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2018 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""
+Fast ISO 19139 serializer for the catalogue records.
+
+Builds the same document as the 'catalogue/full_metadata.xml' template with
+lxml, and computes the CSW anytext from the generated text nodes instead of
+parsing the document again.
+"""
+import uuid
+
+from lxml import etree
+from django.conf import settings
+from django.contrib.staticfiles.templatetags import staticfiles
+from django.db.models import Prefetch
+from django.utils import dateformat
+from django.utils.timezone import template_localtime
+
+from geonode.base.models import ContactRole
+from geonode.utils import add_url_params
+
+DEFAULT_METADATA_TEMPLATE = 'catalogue/full_metadata.xml'
+
+NAMESPACES = {
+    'gmd': 'http://www.isotc211.org/2005/gmd',
+    'gml': 'http://www.opengis.net/gml',
+    'gmx': 'http://www.isotc211.org/2005/gmx',
+    'xlink': 'http://www.w3.org/1999/xlink',
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+    'gco': 'http://www.isotc211.org/2005/gco',
+}
+
+CODELISTS = 'http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml'
+
+DOWNLOAD_LINK_TYPES = ('image', 'data', 'original')
+OWS_LINK_TYPES = ('OGC:WMS', 'OGC:WFS', 'OGC:WCS')
+
+# Relations read by the serializer, to be prefetched in bulk mode
+RECORD_PREFETCH = (
+    'owner',
+    'license',
+    'category',
+    'restriction_code_type',
+    'spatial_representation_type',
+    'keywords',
+    'regions',
+    'link_set',
+    Prefetch('contactrole_set', queryset=ContactRole.objects.select_related('contact')),
+)
+
+
+def _qname(tag):
+    prefix, name = tag.split(':')
+    return '{%s}%s' % (NAMESPACES[prefix], name)
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def _date(value, fmt):
+    if not value:
+        return ''
+    return dateformat.format(template_localtime(value), fmt)
+
+
+def _element(parent, tag, text=None, **attrib):
+    element = etree.SubElement(parent, _qname(tag), {_qname(k) if ':' in k else k: v for k, v in attrib.items()})
+    if text is not None:
+        element.text = text
+    return element
+
+
+def _path(parent, *tags):
+    for tag in tags:
+        parent = _element(parent, tag)
+    return parent
+
+
+def _string(parent, tag, value):
+    """An element wrapping a CharacterString"""
+    element = _element(parent, tag)
+    _element(element, 'gco:CharacterString', _text(value))
+    return element
+
+
+def _optional_string(parent, tag, value):
+    """An element wrapping a CharacterString, nilled when the value is empty"""
+    if value:
+        return _string(parent, tag, value)
+    return _element(parent, tag, **{'gco:nilReason': 'missing'})
+
+
+def _code(parent, tag, value):
+    return _element(parent, tag, _text(value), **{
+        'codeSpace': 'ISOTC211/19115',
+        'codeList': '%s#%s' % (CODELISTS, tag.split(':')[1]),
+        'codeListValue': _text(value)})
+
+
+def _online_resource(parent, url, protocol, description, name=None):
+    resource = _element(parent, 'gmd:CI_OnlineResource')
+    _element(_element(resource, 'gmd:linkage'), 'gmd:URL', url)
+    _string(resource, 'gmd:protocol', protocol)
+    if name is not None:
+        _string(resource, 'gmd:name', name)
+    _string(resource, 'gmd:description', description)
+    return resource
+
+
+def _contact(parent, tag, profile, role, site_url):
+    party = _path(parent, tag, 'gmd:CI_ResponsibleParty')
+    # Profiles have no 'name' attribute, the template always nils it
+    _optional_string(party, 'gmd:individualName', None)
+    _optional_string(party, 'gmd:organisationName', getattr(profile, 'organization', None))
+    _optional_string(party, 'gmd:positionName', getattr(profile, 'position', None))
+    contact = _path(party, 'gmd:contactInfo', 'gmd:CI_Contact')
+    phone = _path(contact, 'gmd:phone', 'gmd:CI_Telephone')
+    _optional_string(phone, 'gmd:voice', getattr(profile, 'voice', None))
+    _optional_string(phone, 'gmd:facsimile', getattr(profile, 'fax', None))
+    address = _path(contact, 'gmd:address', 'gmd:CI_Address')
+    _optional_string(address, 'gmd:deliveryPoint', getattr(profile, 'delivery', None))
+    _optional_string(address, 'gmd:city', getattr(profile, 'city', None))
+    _optional_string(address, 'gmd:administrativeArea', getattr(profile, 'area', None))
+    _optional_string(address, 'gmd:postalCode', getattr(profile, 'zipcode', None))
+    _optional_string(address, 'gmd:country', getattr(profile, 'country', None))
+    _optional_string(address, 'gmd:electronicMailAddress', getattr(profile, 'email', None))
+    if profile:
+        _online_resource(_element(contact, 'gmd:onlineResource'),
+                         '%s%s' % (site_url, profile.get_absolute_url()),
+                         'WWW:LINK-1.0-http--link',
+                         'GeoNode profile page')
+    _code(_element(party, 'gmd:role'), 'gmd:CI_RoleCode', role)
+
+
+def _contacts(resource):
+    contacts = {}
+    for contact_role in resource.contactrole_set.all():
+        contacts.setdefault(contact_role.role, contact_role.contact)
+    return contacts
+
+
+def _thumbnail_url(resource, links):
+    for name in ('Thumbnail', 'Remote Thumbnail'):
+        thumbnails = [link for link in links if link.name == name]
+        if thumbnails:
+            return add_url_params(thumbnails[0].url, {'v': str(uuid.uuid4())[:8]})
+    return resource.thumbnail_url or staticfiles.static(settings.MISSING_THUMBNAIL)
+
+
+def iso_record(resource, site_url=None, licenses_metadata=None):
+    """
+    Returns the ISO metadata document of the resource and its CSW anytext.
+
+    Related objects are read through '.all()', so that a queryset prefetched
+    with RECORD_PREFETCH serializes without further queries.
+    """
+    if site_url is None:
+        site_url = settings.SITEURL.rstrip('/') if settings.SITEURL.startswith('http') else settings.SITEURL
+    if licenses_metadata is None:
+        licenses_metadata = getattr(settings, 'LICENSES', dict()).get('METADATA', 'never')
+
+    links = list(resource.link_set.all())
+    contacts = _contacts(resource)
+    store_type = getattr(resource, 'storeType', None)
+
+    root = etree.Element(_qname('gmd:MD_Metadata'), nsmap=NAMESPACES)
+    root.set(_qname('xsi:schemaLocation'),
+             'http://www.isotc211.org/2005/gmd http://www.isotc211.org/2005/gmd/gmd.xsd')
+    _string(root, 'gmd:fileIdentifier', resource.uuid)
+    _string(root, 'gmd:language', resource.language)
+    _code(_element(root, 'gmd:characterSet'), 'gmd:MD_CharacterSetCode', 'utf8')
+    _code(_element(root, 'gmd:hierarchyLevel'), 'gmd:MD_ScopeCode', 'dataset')
+    _contact(root, 'gmd:contact', contacts.get('pointOfContact'), 'pointOfContact', site_url)
+    _contact(root, 'gmd:contact', contacts.get('author'), 'author', site_url)
+
+    _element(_element(root, 'gmd:dateStamp'), 'gco:DateTime', _date(resource.csw_insert_date, r'Y-m-d\TH:i:s\Z'))
+    _string(root, 'gmd:metadataStandardName', 'ISO 19115:2003 - Geographic information - Metadata')
+    _string(root, 'gmd:metadataStandardVersion', 'ISO 19115:2003')
+    _element(root, 'gmd:spatialRepresentationInfo')
+    identifier = _path(root, 'gmd:referenceSystemInfo', 'gmd:MD_ReferenceSystem',
+                       'gmd:referenceSystemIdentifier', 'gmd:RS_Identifier')
+    _string(identifier, 'gmd:code', '4326')
+    _string(identifier, 'gmd:codeSpace', 'EPSG')
+    _string(identifier, 'gmd:version', '6.11')
+
+    identification = _path(root, 'gmd:identificationInfo', 'gmd:MD_DataIdentification')
+    citation = _path(identification, 'gmd:citation', 'gmd:CI_Citation')
+    if resource.alternate:
+        _string(citation, 'gmd:name', resource.alternate)
+    _string(citation, 'gmd:title', resource.title)
+    ci_date = _path(citation, 'gmd:date', 'gmd:CI_Date')
+    _element(_element(ci_date, 'gmd:date'), 'gco:DateTime', _date(resource.date, r'Y-m-d\TH:i:s\Z'))
+    _code(_element(ci_date, 'gmd:dateType'), 'gmd:CI_DateTypeCode', _text(resource.date_type))
+    _optional_string(citation, 'gmd:edition', resource.edition)
+    if resource.doi:
+        code = _path(citation, 'gmd:identifier', 'gmd:MD_Identifier', 'gmd:code')
+        _element(code, 'gmx:Anchor', 'doi:%s' % resource.doi, **{
+            'xlink:actuate': 'onRequest',
+            'xlink:href': 'https://dx.doi.org/%s' % resource.doi,
+            'xlink:title': 'DOI'})
+    _code(_element(citation, 'gmd:presentationForm'), 'gmd:CI_PresentationFormCode', 'mapDigital')
+    _string(identification, 'gmd:abstract', resource.raw_abstract)
+    _optional_string(identification, 'gmd:purpose', resource.raw_purpose)
+    _code(_element(identification, 'gmd:status'), 'gmd:MD_ProgressCode', 'completed')
+    _contact(identification, 'gmd:pointOfContact', resource.owner, 'originator', site_url)
+
+    if resource.maintenance_frequency:
+        frequency = _path(identification, 'gmd:resourceMaintenance', 'gmd:MD_MaintenanceInformation',
+                          'gmd:maintenanceAndUpdateFrequency')
+        _code(frequency, 'gmd:MD_MaintenanceFrequencyCode', resource.maintenance_frequency)
+    graphic = _path(identification, 'gmd:graphicOverview', 'gmd:MD_BrowseGraphic')
+    _string(graphic, 'gmd:fileName', _thumbnail_url(resource, links))
+    _string(graphic, 'gmd:fileDescription', "Thumbnail for '%s'" % resource.title)
+    _string(graphic, 'gmd:fileType', 'image/png')
+    resource_format = _path(identification, 'gmd:resourceFormat', 'gmd:MD_Format')
+    _string(resource_format, 'gmd:name', 'GeoTIFF' if store_type == 'coverageStore' else 'ESRI Shapefile')
+    _string(resource_format, 'gmd:version', '1.0')
+
+    keywords = [kw.name for kw in resource.keywords.all()]
+    if keywords:
+        md_keywords = _path(identification, 'gmd:descriptiveKeywords', 'gmd:MD_Keywords')
+        for kw in keywords:
+            _string(md_keywords, 'gmd:keyword', kw)
+        _code(_element(md_keywords, 'gmd:type'), 'gmd:MD_KeywordTypeCode', 'theme')
+    for region in resource.regions.all():
+        md_keywords = _path(identification, 'gmd:descriptiveKeywords', 'gmd:MD_Keywords')
+        _string(md_keywords, 'gmd:keyword', region.name)
+        _code(_element(md_keywords, 'gmd:type'), 'gmd:MD_KeywordTypeCode', 'place')
+
+    if resource.license and licenses_metadata in ('light', 'verbose'):
+        constraints = _path(identification, 'gmd:resourceConstraints', 'gmd:MD_LegalConstraints')
+        _code(_element(constraints, 'gmd:useConstraints'), 'gmd:MD_RestrictionCode', 'license')
+        if licenses_metadata == 'light':
+            _string(constraints, 'gmd:otherConstraints', resource.license_light)
+            if resource.doi:
+                _string(constraints, 'gmd:otherConstraints', 'DOI: %s' % resource.doi)
+        else:
+            _string(constraints, 'gmd:otherConstraints', resource.license_verbose)
+    constraints = _path(identification, 'gmd:resourceConstraints', 'gmd:MD_LegalConstraints')
+    restriction = getattr(resource.restriction_code_type, 'identifier', '')
+    _code(_element(constraints, 'gmd:useConstraints'), 'gmd:MD_RestrictionCode', restriction)
+    _string(constraints, 'gmd:otherConstraints', resource.raw_constraints_other)
+    representation = getattr(resource.spatial_representation_type, 'identifier', '')
+    _code(_element(identification, 'gmd:spatialRepresentationType'),
+          'gmd:MD_SpatialRepresentationTypeCode', representation)
+    _string(identification, 'gmd:language', resource.language)
+    _code(_element(identification, 'gmd:characterSet'), 'gmd:MD_CharacterSetCode', 'utf8')
+    if resource.category:
+        _element(_element(identification, 'gmd:topicCategory'), 'gmd:MD_TopicCategoryCode',
+                 _text(resource.category.identifier))
+    else:
+        _element(identification, 'gmd:topicCategory', **{'gco:nilReason': 'missing'})
+
+    bbox = _path(identification, 'gmd:extent', 'gmd:EX_Extent', 'gmd:geographicElement',
+                 'gmd:EX_GeographicBoundingBox')
+    ll_bbox = resource.ll_bbox
+    for tag, value in zip(('gmd:westBoundLongitude', 'gmd:eastBoundLongitude',
+                           'gmd:southBoundLatitude', 'gmd:northBoundLatitude'), ll_bbox):
+        _element(_element(bbox, tag), 'gco:Decimal', _text(value))
+    if resource.temporal_extent_start and resource.temporal_extent_end:
+        extent = _path(identification, 'gmd:extent', 'gmd:EX_Extent', 'gmd:temporalElement',
+                       'gmd:EX_TemporalExtent', 'gmd:extent')
+        period = _element(extent, 'gml:TimePeriod', **{'gml:id': 'T_01'})
+        _element(period, 'gml:beginPosition', _date(resource.temporal_extent_start, 'c'))
+        _element(period, 'gml:endPosition', _date(resource.temporal_extent_end, 'c'))
+    _string(identification, 'gmd:supplementalInformation', resource.raw_supplemental_information)
+
+    content_info = _element(root, 'gmd:contentInfo')
+    if store_type == 'coverageStore':
+        coverage = _element(content_info, 'gmd:MD_CoverageDescription')
+        _element(coverage, 'gmd:attributeDescription', **{'gco:nilReason': 'inapplicable'})
+        _element(_element(coverage, 'gmd:contentType'), 'gmd:MD_CoverageContentTypeCode', 'image',
+                 codeList=CODELISTS, codeListValue='image')
+    elif store_type == 'dataStore':
+        _element(_element(content_info, 'gmd:includedWithDataset'), 'gco:Boolean', '0')
+        _element(_element(content_info, 'gmd:MD_FeatureCatalogueDescription'), 'gmd:featureCatalogueCitation', **{
+            'uuidref': _text(resource.uuid),
+            'xlink:href': '%s%s/feature_catalogue' % (site_url, resource.get_absolute_url())})
+
+    transfer = _path(root, 'gmd:distributionInfo', 'gmd:MD_Distribution', 'gmd:transferOptions',
+                     'gmd:MD_DigitalTransferOptions')
+    _online_resource(_element(transfer, 'gmd:onLine'),
+                     '%s%s' % (site_url, resource.get_absolute_url()),
+                     'WWW:LINK-1.0-http--link',
+                     "Online link to the '%s' description on GeoNode" % resource.title)
+    name = _text(getattr(resource, 'name', ''))
+    for link in links:
+        if link.link_type in DOWNLOAD_LINK_TYPES:
+            _online_resource(_element(transfer, 'gmd:onLine'),
+                             link.url,
+                             'WWW:DOWNLOAD-1.0-http--download',
+                             '%s (%s Format)' % (resource.title, link.name),
+                             name='%s.%s' % (name, link.extension))
+    for link in links:
+        if link.link_type in OWS_LINK_TYPES:
+            _online_resource(_element(transfer, 'gmd:onLine'),
+                             link.url,
+                             link.link_type,
+                             '%s Service - Provides Layer: %s' % (_text(getattr(resource, 'workspace', '')),
+                                                                  resource.title),
+                             name=_text(resource.alternate))
+
+    quality = _path(root, 'gmd:dataQualityInfo', 'gmd:DQ_DataQuality')
+    _code(_path(quality, 'gmd:scope', 'gmd:DQ_Scope', 'gmd:level'), 'gmd:MD_ScopeCode', 'dataset')
+    lineage = _path(quality, 'gmd:lineage', 'gmd:LI_Lineage')
+    _optional_string(lineage, 'gmd:statement', resource.raw_data_quality_statement)
+
+    md_doc = etree.tostring(root, encoding='unicode')
+    anytext = ' '.join(value for value in (text.strip() for text in root.itertext()) if value)
+    return md_doc, anytext
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2017 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""celery tasks for geonode.catalogue."""
+from celery.utils.log import get_task_logger
+from django.core.cache import cache
+
+from geonode.celery_app import app
+from geonode.tasks.tasks import FaultTolerantTask
+from geonode.catalogue.models import (
+    CATALOGUE_SYNC_KEY,
+    update_catalogue_records)
+
+logger = get_task_logger(__name__)
+
+
+@app.task(
+    bind=True,
+    base=FaultTolerantTask,
+    name='geonode.catalogue.tasks.sync_catalogue_records',
+    queue='update',
+    expires=600,
+    acks_late=False,
+    autoretry_for=(Exception, ),
+    retry_kwargs={'max_retries': 3, 'countdown': 10},
+    retry_backoff=True,
+    retry_backoff_max=700,
+    retry_jitter=True)
+def sync_catalogue_records(self, resource_ids):
+    """
+    Updates the catalogue records of the given resources.
+    """
+    # Saves happening from now on must queue a new update
+    cache.delete_many([CATALOGUE_SYNC_KEY % _id for _id in resource_ids])
+    logger.debug(f"Updating the catalogue records of {len(resource_ids)} resources")
+    update_catalogue_records(resource_ids)
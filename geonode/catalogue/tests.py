@@ -31,3 +31,81 @@ class CatalogueTest(GeoNodeBaseTestSupport):
 
         c = get_catalogue()
         self.assertIsNotNone(c)
+
+    def test_csw_authorized_filter_is_a_subquery(self):
+        """Tests the CSW authorization filter does not inline resource ids."""
+        from django.contrib.auth import get_user_model
+        from geonode.catalogue.views import get_authorized_filter, get_groups_filter
+
+        admin = get_user_model().objects.filter(is_superuser=True).first()
+        if admin:
+            self.assertIsNone(get_authorized_filter(admin))
+
+        user = get_user_model().objects.get(username='AnonymousUser')
+        authorized_filter = get_authorized_filter(user)
+        self.assertTrue(authorized_filter.startswith("id IN (SELECT"))
+        self.assertNotIn('%', authorized_filter)
+        self.assertIn("group_id IS NULL", get_groups_filter(user))
+
+    def test_csw_engine_does_not_reuse_the_repository(self):
+        """Tests the pooled CSW server builds the repository with the filter of each request."""
+        from geonode.catalogue.backends.pycsw_local import get_csw_engine
+
+        csw = get_csw_engine(repo_filter='id IN (1)')
+        csw.load_repository()
+        self.assertEqual(csw.repository.filter, 'id IN (1)')
+
+        csw = get_csw_engine()
+        self.assertFalse(hasattr(csw, 'repository'))
+        csw.load_repository()
+        self.assertEqual(csw.repository.filter, csw.default_filter)
+
+    def test_fast_iso_record_matches_template(self):
+        """Tests the lxml serializer renders the same record as the ISO template."""
+        from defusedxml import lxml as dlxml
+        from lxml import etree
+        from geonode.layers.models import Layer
+        from geonode.catalogue.records import DEFAULT_METADATA_TEMPLATE, NAMESPACES, iso_record
+
+        def _normalized(md_doc):
+            root = dlxml.fromstring(md_doc.encode('utf-8') if isinstance(md_doc, str) else md_doc)
+            for element in root.iter():
+                element.text = (element.text or '').strip() or None
+                element.tail = None
+            # the thumbnail URL carries a random cache buster
+            for element in root.iterfind('.//gmd:fileName/gco:CharacterString', NAMESPACES):
+                element.text = element.text.split('?v=')[0].split('&v=')[0]
+            return etree.tostring(root, method='c14n')
+
+        catalogue = get_catalogue().catalogue
+        layer = Layer.objects.first()
+        for store_type in ('dataStore', 'coverageStore'):
+            layer.storeType = store_type
+            md_doc, anytext = iso_record(layer)
+            self.assertEqual(
+                _normalized(md_doc),
+                _normalized(catalogue.csw_gen_xml(layer, DEFAULT_METADATA_TEMPLATE)))
+        self.assertIn(layer.title, anytext)
+        self.assertIn('GeoTIFF', anytext)
+        self.assertIn('GeoNode profile page', anytext)
+
+    def test_update_catalogue_records_skips_bad_records(self):
+        """Tests a record that cannot be rendered does not abort the batch."""
+        from unittest import mock
+        from geonode.base.models import ResourceBase
+        from geonode.catalogue import models as catalogue_models
+
+        resources = list(ResourceBase.objects.order_by('id')[:2])
+        self.assertEqual(len(resources), 2)
+        bad, good = resources
+
+        def _render(catalogue, instance):
+            if instance.id == bad.id:
+                raise ValueError('All strings must be XML compatible')
+            return dict(metadata_xml='<record/>', csw_anytext='good')
+
+        with mock.patch.object(catalogue_models, '_render_catalogue_record', side_effect=_render):
+            catalogue_models.update_catalogue_records(resources)
+
+        self.assertEqual(ResourceBase.objects.get(id=good.id).csw_anytext, 'good')
+        self.assertNotEqual(ResourceBase.objects.get(id=bad.id).csw_anytext, 'good')
@@ -22,13 +22,13 @@ import logging
 import xml.etree.ElementTree as ET
 from defusedxml import lxml as dlxml
 from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.contrib.auth import get_user_model
 from django.views.decorators.csrf import csrf_exempt
-from pycsw import server
 from guardian.shortcuts import get_objects_for_user
-from geonode.catalogue.backends.pycsw_local import CONFIGURATION
+from geonode.catalogue.backends.pycsw_local import CONFIGURATION, get_csw_engine, true_value, false_value
 from geonode.base.models import ResourceBase
 from geonode.layers.models import Layer
 from geonode.base.auth import get_or_create_token
@@ -37,6 +37,10 @@ from geonode.groups.models import GroupProfile
 from django.db import connection
 from django.core.exceptions import ObjectDoesNotExist
 
+# The authorization filter is a subquery and does not embed the visible ids,
+# so it only needs to be rebuilt when the user itself changes.
+CSW_FILTER_CACHE_TIMEOUT = getattr(settings, 'CSW_FILTER_CACHE_TIMEOUT', 300)
+
 
 @csrf_exempt
 def csw_global_dispatch(request):
@@ -47,8 +51,6 @@ def csw_global_dispatch(request):
     if settings.CATALOGUE['default']['ENGINE'] != 'geonode.catalogue.backends.pycsw_local':
         return HttpResponseRedirect(settings.CATALOGUE['default']['URL'])
 
-    mdict = dict(settings.PYCSW['CONFIGURATION'], **CONFIGURATION)
-
     access_token = None
     if request and request.user:
         access_token = get_or_create_token(request.user)
@@ -69,132 +71,141 @@ def csw_global_dispatch(request):
                 'REQUEST_URI': absolute_uri,
                 'QUERY_STRING': query_string})
 
-    # Save original filter before doing anything
-    mdict_filter = mdict['repository']['filter']
+    repo_filter = CONFIGURATION['repository']['filter']
 
-    try:
-        # Filter out Layers not accessible to the User
-        authorized_ids = []
-        if request.user:
-            profiles = get_user_model().objects.filter(username=str(request.user))
-        else:
-            profiles = get_user_model().objects.filter(username="AnonymousUser")
-        if profiles:
-            authorized = list(
-                get_objects_for_user(
-                    profiles[0],
-                    'base.view_resourcebase').values('id'))
-            layers = ResourceBase.objects.filter(
-                id__in=[d['id'] for d in authorized])
-            if layers:
-                authorized_ids = [d['id'] for d in authorized]
-
-        if len(authorized_ids) > 0:
-            authorized_layers = "(" + (", ".join(str(e)
-                                                 for e in authorized_ids)) + ")"
-            authorized_layers_filter = "id IN " + authorized_layers
-            mdict['repository']['filter'] += " AND " + authorized_layers_filter
-            if request.user and request.user.is_authenticated:
-                mdict['repository']['filter'] = "({}) OR ({})".format(mdict['repository']['filter'],
-                                                                      authorized_layers_filter)
-        else:
-            authorized_layers_filter = "id = -9999"
-            mdict['repository']['filter'] += " AND " + authorized_layers_filter
-
-        # Filter out Documents and Maps
-        if 'ALTERNATES_ONLY' in settings.CATALOGUE['default'] and settings.CATALOGUE['default']['ALTERNATES_ONLY']:
-            mdict['repository']['filter'] += " AND alternate IS NOT NULL"
-
-        # Filter out Layers belonging to specific Groups
-        is_admin = False
-        if request.user:
-            is_admin = request.user.is_superuser if request.user else False
-
-        if not is_admin and settings.GROUP_PRIVATE_RESOURCES:
-            groups_ids = []
-            if request.user and request.user.is_authenticated:
-                for group in request.user.groups.all():
-                    groups_ids.append(group.id)
-                group_list_all = []
-                try:
-                    group_list_all = request.user.group_list_all().values('group')
-                except Exception:
-                    pass
-                for group in group_list_all:
-                    if isinstance(group, dict):
-                        if 'group' in group:
-                            groups_ids.append(group['group'])
-                    else:
-                        groups_ids.append(group.id)
-
-            public_groups = GroupProfile.objects.exclude(
-                access="private").values('group')
-            for group in public_groups:
-                if isinstance(group, dict):
-                    if 'group' in group:
-                        groups_ids.append(group['group'])
-                else:
-                    groups_ids.append(group.id)
-
-            if len(groups_ids) > 0:
-                groups = "(" + (", ".join(str(e) for e in groups_ids)) + ")"
-                groups_filter = "(group_id IS NULL OR group_id IN " + groups + ")"
-                mdict['repository']['filter'] += " AND " + groups_filter
-            else:
-                groups_filter = "group_id IS NULL"
-                mdict['repository']['filter'] += " AND " + groups_filter
-
-        csw = server.Csw(mdict, env, version='2.0.2')
-
-        content = csw.dispatch_wsgi()
-
-        # pycsw 2.0 has an API break:
-        # pycsw < 2.0: content = xml_response
-        # pycsw >= 2.0: content = [http_status_code, content]
-        # deal with the API break
-
-        if isinstance(content, list):  # pycsw 2.0+
-            content = content[1]
-
-        spaces = {'csw': 'http://www.opengis.net/cat/csw/2.0.2',
-                  'dc': 'http://purl.org/dc/elements/1.1/',
-                  'dct': 'http://purl.org/dc/terms/',
-                  'gmd': 'http://www.isotc211.org/2005/gmd',
-                  'gml': 'http://www.opengis.net/gml',
-                  'ows': 'http://www.opengis.net/ows',
-                  'xs': 'http://www.w3.org/2001/XMLSchema',
-                  'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-                  'ogc': 'http://www.opengis.net/ogc',
-                  'gco': 'http://www.isotc211.org/2005/gco',
-                  'gmi': 'http://www.isotc211.org/2005/gmi'}
-
-        for prefix, uri in spaces.items():
-            ET.register_namespace(prefix, uri)
-
-        if access_token and not access_token.is_expired():
-            tree = dlxml.fromstring(content)
-            for online_resource in tree.findall(
-                    '*//gmd:CI_OnlineResource', spaces):
-                try:
-                    linkage = online_resource.find('gmd:linkage', spaces)
-                    for url in linkage.findall('gmd:URL', spaces):
-                        if url.text:
-                            if '?' not in url.text:
-                                url.text += "?"
-                            else:
-                                url.text += "&"
-                            url.text += ("access_token=%s" % (access_token.token))
-                            url.set('updated', 'yes')
-                except Exception:
-                    pass
-            content = ET.tostring(tree, encoding='utf8', method='xml')
-    finally:
-        # Restore original filter before doing anything
-        mdict['repository']['filter'] = mdict_filter
+    # Filter out Layers not accessible to the User
+    authorized_layers_filter = get_authorized_filter(request.user)
+    if authorized_layers_filter:
+        repo_filter += " AND " + authorized_layers_filter
+        if request.user and request.user.is_authenticated:
+            repo_filter = "({}) OR ({})".format(repo_filter, authorized_layers_filter)
+
+    # Filter out Documents and Maps
+    if 'ALTERNATES_ONLY' in settings.CATALOGUE['default'] and settings.CATALOGUE['default']['ALTERNATES_ONLY']:
+        repo_filter += " AND alternate IS NOT NULL"
+
+    # Filter out Layers belonging to specific Groups
+    is_admin = False
+    if request.user:
+        is_admin = request.user.is_superuser if request.user else False
+
+    if not is_admin and settings.GROUP_PRIVATE_RESOURCES:
+        repo_filter += " AND " + get_groups_filter(request.user)
+
+    csw = get_csw_engine(env, repo_filter)
+
+    content = csw.dispatch_wsgi()
+
+    # pycsw 2.0 has an API break:
+    # pycsw < 2.0: content = xml_response
+    # pycsw >= 2.0: content = [http_status_code, content]
+    # deal with the API break
+
+    if isinstance(content, list):  # pycsw 2.0+
+        content = content[1]
+
+    spaces = {'csw': 'http://www.opengis.net/cat/csw/2.0.2',
+              'dc': 'http://purl.org/dc/elements/1.1/',
+              'dct': 'http://purl.org/dc/terms/',
+              'gmd': 'http://www.isotc211.org/2005/gmd',
+              'gml': 'http://www.opengis.net/gml',
+              'ows': 'http://www.opengis.net/ows',
+              'xs': 'http://www.w3.org/2001/XMLSchema',
+              'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+              'ogc': 'http://www.opengis.net/ogc',
+              'gco': 'http://www.isotc211.org/2005/gco',
+              'gmi': 'http://www.isotc211.org/2005/gmi'}
+
+    for prefix, uri in spaces.items():
+        ET.register_namespace(prefix, uri)
+
+    if access_token and not access_token.is_expired():
+        tree = dlxml.fromstring(content)
+        for online_resource in tree.findall(
+                '*//gmd:CI_OnlineResource', spaces):
+            try:
+                linkage = online_resource.find('gmd:linkage', spaces)
+                for url in linkage.findall('gmd:URL', spaces):
+                    if url.text:
+                        if '?' not in url.text:
+                            url.text += "?"
+                        else:
+                            url.text += "&"
+                        url.text += ("access_token=%s" % (access_token.token))
+                        url.set('updated', 'yes')
+            except Exception:
+                pass
+        content = ET.tostring(tree, encoding='utf8', method='xml')
 
     return HttpResponse(content, content_type=csw.contenttype)
 
 
+def _sql_literal(value):
+    """Render a query parameter as an SQL literal.
+
+    pycsw reads the repository filter through a ConfigParser, so the filter
+    can neither carry bound parameters nor contain '%' characters.
+    """
+    if isinstance(value, bool):
+        return true_value if value else false_value
+    if isinstance(value, int):
+        return str(value)
+    value = str(value)
+    if '%' in value:
+        raise ValueError("Unsupported value in CSW repository filter: %r" % value)
+    return "'%s'" % value.replace("'", "''")
+
+
+def _compile_subquery(queryset):
+    """Compile a ``values()`` queryset into a literal SQL subquery"""
+    sql, params = queryset.query.sql_with_params()
+    return "(" + sql % tuple(_sql_literal(p) for p in params) + ")"
+
+
+def get_authorized_filter(user):
+    """
+    Returns the pycsw repository filter restricting the records to the ones
+    the user can view, or None if no restriction applies.
+
+    The filter is expressed as a subquery against the guardian tables, so that
+    its size does not depend on the number of resources the user can see.
+    """
+    username = str(user) if user else "AnonymousUser"
+    cache_key = 'csw_authorized_filter:%s' % username
+    authorized_filter = cache.get(cache_key)
+    if authorized_filter is None:
+        profile = get_user_model().objects.filter(username=username).first()
+        if not profile:
+            authorized_filter = "id = -9999"
+        elif profile.is_superuser:
+            authorized_filter = ""
+        else:
+            authorized = get_objects_for_user(
+                profile,
+                'base.view_resourcebase',
+                klass=ResourceBase.objects.all()).values('id')
+            authorized_filter = "id IN " + _compile_subquery(authorized)
+        cache.set(cache_key, authorized_filter, CSW_FILTER_CACHE_TIMEOUT)
+    return authorized_filter or None
+
+
+def get_groups_filter(user):
+    """
+    Returns the pycsw repository filter hiding the records which belong to
+    private groups the user is not a member of.
+    """
+    groups = [_compile_subquery(
+        GroupProfile.objects.exclude(access="private").values('group'))]
+    if user and user.is_authenticated:
+        groups.append(_compile_subquery(user.groups.values('id')))
+        try:
+            groups.append(_compile_subquery(user.group_list_all().values('group')))
+        except Exception:
+            pass
+    return "(group_id IS NULL OR {})".format(
+        " OR ".join("group_id IN {}".format(g) for g in groups))
+
+
 @csrf_exempt
 def opensearch_dispatch(request):
     """OpenSearch wrapper"""
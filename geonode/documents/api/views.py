@@ -69,7 +69,7 @@ class DocumentViewSet(DynamicModelViewSet):
             if not request.user.is_superuser and \
             not request.user.has_perm('view_resourcebase', resource.get_self_resource()):
                 exclude.append(resource.id)
-        resources = resources.exclude(id__in=exclude)
+        resources = ResourceBaseSerializer.setup_eager_loading(resources.exclude(id__in=exclude))
         paginator = GeoNodeApiPagination()
         paginator.page_size = request.GET.get('page_size', 10)
         result_page = paginator.paginate_queryset(resources, request)
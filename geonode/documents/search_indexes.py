@@ -23,10 +23,11 @@ from dialogos.models import Comment
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Avg
 from haystack import indexes
+from geonode.base.search_indexes import ResourceBaseACLIndex
 from geonode.documents.models import Document
 
 
-class DocumentIndex(indexes.SearchIndex, indexes.Indexable):
+class DocumentIndex(ResourceBaseACLIndex, indexes.Indexable):
     id = indexes.IntegerField(model_attr='id')
     abstract = indexes.CharField(model_attr="abstract", boost=1.5)
     category__gn_description = indexes.CharField(model_attr="category__gn_description", null=True)
@@ -83,6 +84,11 @@ class DocumentIndex(indexes.SearchIndex, indexes.Indexable):
     def get_model(self):
         return Document
 
+    def index_queryset(self, using=None):
+        # owner, category, keywords and regions are read by every document
+        return self.get_model().objects.select_related(
+            'owner', 'category').prefetch_related('keywords', 'regions')
+
     def prepare_type(self, obj):
         return "document"
 
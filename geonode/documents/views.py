@@ -23,7 +23,7 @@ import logging
 import traceback
 from itertools import chain
 
-from guardian.shortcuts import get_perms, get_objects_for_user
+from guardian.shortcuts import get_objects_for_user
 
 from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponse, HttpResponseRedirect, Http404
@@ -35,7 +35,6 @@ from django.urls import reverse
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
 from django_downloadview.response import DownloadResponse
 from django.views.generic.edit import UpdateView, CreateView
-from django.db.models import F
 from django.forms.utils import ErrorList
 
 from geonode.base.utils import ManageResourceOwnerPermissions
@@ -45,6 +44,7 @@ from geonode.security.views import _perms_info_json
 from geonode.people.forms import ProfileForm
 from geonode.base.auth import get_or_create_token
 from geonode.base.bbox_utils import BBOXHelper
+from geonode.base.counters import count_view
 from geonode.base.forms import CategoryForm, TKeywordForm
 from geonode.base.models import (
     Thesaurus,
@@ -57,7 +57,7 @@ from geonode.groups.models import GroupProfile
 from geonode.base.views import batch_modify
 from geonode.monitoring import register_event
 from geonode.monitoring.models import EventType
-from geonode.security.utils import get_visible_resources
+from geonode.security.utils import get_perms, get_visible_resources
 
 from dal import autocomplete
 
@@ -109,10 +109,7 @@ def document_detail(request, docid):
 
     # Update count for popularity ranking,
     # but do not includes admins or resource owners
-    if request.user != document.owner and not request.user.is_superuser:
-        Document.objects.filter(
-            id=document.id).update(
-            popular_count=F('popular_count') + 1)
+    count_view(document, request.user)
 
     metadata = document.link_set.metadata().filter(
         name__in=settings.DOWNLOAD_FORMATS_METADATA)
@@ -24,7 +24,6 @@ import traceback
 from itertools import chain
 
 from django.conf import settings
-from django.db.models import F
 from django.urls import reverse
 from django.shortcuts import render
 from django.forms.utils import ErrorList
@@ -34,11 +33,12 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.views.decorators.clickjacking import xframe_options_sameorigin
 
-from guardian.shortcuts import get_perms
 
 from geonode.groups.models import GroupProfile
 from geonode.base.auth import get_or_create_token
+from geonode.base.counters import count_view
 from geonode.security.views import _perms_info_json
+from geonode.security.utils import get_perms
 from geonode.geoapps.models import GeoApp, GeoAppData
 from geonode.decorators import check_keyword_write_perms
 from geonode.monitoring import register_event
@@ -129,10 +129,7 @@ def geoapp_detail(request, geoappid, template='apps/app_detail.html'):
 
     # Update count for popularity ranking,
     # but do not includes admins or resource owners
-    if request.user != geoapp_obj.owner and not request.user.is_superuser:
-        GeoApp.objects.filter(
-            id=geoapp_obj.id).update(
-            popular_count=F('popular_count') + 1)
+    count_view(geoapp_obj, request.user)
 
     _data = GeoAppData.objects.filter(resource__id=geoappid).first()
     _config = _data.blob if _data else {}
@@ -25,6 +25,7 @@ import uuid
 # import base64
 import json
 import errno
+import hashlib
 import logging
 import datetime
 import requests
@@ -42,7 +43,8 @@ from PIL import Image
 from io import BytesIO
 from resizeimage import resizeimage
 from itertools import cycle
-from collections import namedtuple, defaultdict
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from os.path import basename, splitext, isfile
 from threading import local
 from urllib.parse import urlparse, urlencode, urlsplit, urljoin
@@ -51,7 +53,9 @@ from bs4 import BeautifulSoup
 from dialogos.models import Comment
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
 from django.db.models.signals import pre_delete
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -71,6 +75,7 @@ from geonode import GeoNodeException
 from geonode.base.auth import get_or_create_token
 from geonode.utils import (
     _v,
+    chunked,
     http_client,
     bbox_to_projection,
     bounds_to_zoom_level)
@@ -86,6 +91,8 @@ logger = logging.getLogger(__name__)
 
 temp_style_name_regex = r'[a-zA-Z0-9]{8}-[a-zA-Z0-9]{4}-[a-zA-Z0-9]{4}-[a-zA-Z0-9]{4}-[a-zA-Z0-9]{12}_ms_.*'
 
+LAYER_ATTRIBUTE_VALUES_CACHE_TIMEOUT = getattr(settings, 'LAYER_ATTRIBUTE_VALUES_CACHE_TIMEOUT', 60 * 60 * 24)
+
 if not hasattr(settings, 'OGC_SERVER'):
     msg = (
         'Please configure OGC_SERVER when enabling geonode.geoserver.'
@@ -1063,26 +1070,20 @@ def set_attributes_from_geoserver(layer, overwrite=False):
             tb = traceback.format_exc()
             logger.debug(tb)
             attribute_map = []
-    # Get attribute statistics & package for call to really_set_attributes()
-    attribute_stats = defaultdict(dict)
-    # Add new layer attributes if they don't already exist
-    for attribute in attribute_map:
-        field, ftype = attribute
-        if field is not None:
-            if Attribute.objects.filter(layer=layer, attribute=field).exists():
-                continue
-            elif is_layer_attribute_aggregable(
-                    layer.storeType,
-                    field,
-                    ftype):
-                logger.debug("Generating layer attribute statistics")
-                result = get_attribute_statistics(layer.alternate or layer.typename, field)
-            else:
-                result = None
-            attribute_stats[layer.name][field] = result
-    set_attributes(
-        layer, attribute_map, overwrite=overwrite, attribute_stats=attribute_stats
-    )
+    # Statistics are only derived for the attributes which don't exist yet
+    existing_fields = set() if overwrite else set(
+        Attribute.objects.filter(layer=layer).values_list('attribute', flat=True))
+    stale_fields = [
+        field for field, ftype in attribute_map
+        if field is not None and field not in existing_fields and
+        is_layer_attribute_aggregable(layer.storeType, field, ftype)]
+    set_attributes(layer, attribute_map, overwrite=overwrite)
+
+    # Compute the statistics of every stale attribute in a single pass, out of the request/save cycle
+    if stale_fields and (ogc_server_settings.WPS_ENABLED or get_layer_datastore_connection(layer) is not None):
+        from geonode.geoserver.tasks import geoserver_update_layer_attribute_statistics
+        transaction.on_commit(
+            lambda: geoserver_update_layer_attribute_statistics.apply_async((layer.id, stale_fields)))
 
 
 def set_styles(layer, gs_catalog):
@@ -1267,6 +1268,90 @@ def get_attribute_statistics(layer_name, field):
         logger.exception('Error generating layer aggregate statistics')
 
 
+def get_layer_attribute_statistics(layer, fields):
+    """
+    Generate statistics (range, mean, median, standard deviation)
+    for several layer attributes at once.
+
+    When the layer is stored in the PostGIS datastore all the fields are aggregated
+    by a single query, otherwise the WPS requests are run concurrently.
+    Returns a dictionary of the form {<field_name>: <statistics>}.
+    """
+    connection = get_layer_datastore_connection(layer)
+    if connection is not None:
+        return _datastore_attribute_statistics(connection, layer.name, fields)
+
+    if not ogc_server_settings.WPS_ENABLED or not fields:
+        return {}
+    typename = layer.alternate or layer.typename
+    with ThreadPoolExecutor(max_workers=min(len(fields), 4)) as executor:
+        results = executor.map(lambda field: get_attribute_statistics(typename, field), fields)
+        return {field: result for field, result in zip(fields, results) if result}
+
+
+def _datastore_attribute_statistics(connection, table, fields):
+    qn = connection.ops.quote_name
+    aggregates = (
+        ('Count', 'COUNT({})'),
+        ('Min', 'MIN({})'),
+        ('Max', 'MAX({})'),
+        ('Average', 'AVG({})'),
+        ('Median', 'PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY {}::double precision)'),
+        ('StandardDeviation', 'STDDEV_POP({})'),
+        ('Sum', 'SUM({})'),
+    )
+    result = {}
+    # Keep each query below the PostgreSQL limit of columns per select
+    for _fields in chunked(fields, 200):
+        columns = [
+            aggregate.format(qn(field)) for field in _fields for name, aggregate in aggregates]
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT {} FROM {}'.format(', '.join(columns), qn(table)))
+            row = iter(cursor.fetchone())
+        for field in _fields:
+            stats = {name: next(row) for name, aggregate in aggregates}
+            result[field] = {
+                name: str(value) if value is not None else 'NA' for name, value in stats.items()}
+            result[field]['Count'] = stats['Count'] or 0
+            result[field]['unique_values'] = 'NA'
+    return result
+
+
+def update_layer_attribute_statistics(layer, fields=None):
+    """
+    Refresh the statistics of the layer aggregable attributes (all of them if fields is None)
+    and store them with a single bulk update.
+    """
+    attributes = [
+        la for la in Attribute.objects.filter(layer=layer)
+        if (fields is None or la.attribute in fields) and
+        is_layer_attribute_aggregable(layer.storeType, la.attribute, la.attribute_type)]
+    if not attributes:
+        return []
+
+    logger.debug("Generating layer attribute statistics")
+    attribute_stats = get_layer_attribute_statistics(layer, [la.attribute for la in attributes])
+    now = datetime.datetime.now(timezone.get_current_timezone())
+    updated = []
+    for la in attributes:
+        result = attribute_stats.get(la.attribute)
+        if result:
+            la.count = result['Count']
+            la.min = result['Min']
+            la.max = result['Max']
+            la.average = result['Average']
+            la.median = result['Median']
+            la.stddev = result['StandardDeviation']
+            la.sum = result['Sum']
+            la.unique_values = result['unique_values']
+            la.last_stats_updated = now
+            updated.append(la)
+    Attribute.objects.bulk_update(
+        updated,
+        ['count', 'min', 'max', 'average', 'median', 'stddev', 'sum', 'unique_values', 'last_stats_updated'])
+    return updated
+
+
 def get_wcs_record(instance, retry=True):
     wcs = WebCoverageService(ogc_server_settings.LOCATION + 'wcs', '1.0.0')
     key = instance.workspace + ':' + instance.name
@@ -1760,6 +1845,92 @@ def wps_execute_layer_attribute_statistics(layer_name, field):
     return result
 
 
+def wps_execute_layer_attribute_unique_values(layer_name, field):
+    """Derive the unique values of a layer attribute from WPS endpoint"""
+
+    url = urljoin(ogc_server_settings.LOCATION, 'ows')
+
+    request = render_to_string('layers/wps_execute_gs_unique.xml', {
+                               'layer_name': layer_name,
+                               'field': field
+                               })
+    u = urlsplit(url)
+
+    headers = {
+        'User-Agent': 'OWSLib (https://geopython.github.io/OWSLib)',
+        'Content-type': 'text/xml',
+        'Accept': 'application/json',
+        'Accept-Language': 'en-US',
+        'Accept-Encoding': 'gzip,deflate',
+        'Host': u.netloc,
+    }
+
+    response, content = http_client.request(
+        url,
+        method='POST',
+        data=request,
+        headers=headers,
+        user=_user,
+        timeout=60,
+        retries=1)
+
+    features = json.loads(content).get('features', [])
+    values = [f['properties'].get('value') for f in features]
+    return sorted(v for v in values if v is not None)
+
+
+def get_layer_datastore_connection(layer):
+    """
+    Returns the database connection of the PostGIS datastore holding the layer data,
+    or None if the layer has not been imported into the datastore.
+    """
+    db = ogc_server_settings.datastore_db
+    if (layer.storeType == 'dataStore' and db and 'postgis' in db['ENGINE'] and
+            layer.store == db['NAME']):
+        return connections[ogc_server_settings.DATASTORE]
+    return None
+
+
+def get_layer_attribute_values(layer, field, limit=100, offset=0):
+    """
+    Returns a page of the distinct values of a layer attribute, ordered by value,
+    as a list of (value, count) tuples.
+
+    The values are computed by the PostGIS datastore when the layer is stored there,
+    otherwise through the WPS gs:Unique process (in which case the count is None).
+    Results are cached until the layer is updated.
+    """
+    if '"' in field:
+        raise ValueError("Invalid attribute name '{}'".format(field))
+
+    version = layer.last_updated.isoformat() if layer.last_updated else ''
+    cache_key = 'layer_attribute_values:{}'.format(hashlib.md5('{}:{}:{}:{}:{}'.format(
+        layer.id, version, field, limit, offset).encode('utf-8')).hexdigest())
+    values = cache.get(cache_key)
+    if values is not None:
+        return values
+
+    connection = get_layer_datastore_connection(layer)
+    if connection is not None:
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT {field}, COUNT(*) FROM {table} WHERE {field} IS NOT NULL '
+                'GROUP BY {field} ORDER BY {field} LIMIT %s OFFSET %s'.format(
+                    field=qn(field), table=qn(layer.name)),
+                [limit, offset])
+            values = [tuple(row) for row in cursor.fetchall()]
+    elif ogc_server_settings.WPS_ENABLED:
+        unique_values = wps_execute_layer_attribute_unique_values(
+            layer.alternate or layer.typename, field)
+        values = [(v, None) for v in unique_values[offset:offset + limit]]
+    else:
+        return []
+
+    cache.set(cache_key, values, LAYER_ATTRIBUTE_VALUES_CACHE_TIMEOUT)
+    return values
+
+
 def _stylefilterparams_geowebcache_layer(layer_name):
     headers = {
         "Content-Type": "text/xml"
@@ -30,6 +30,7 @@ from django.contrib.staticfiles.templatetags import staticfiles
 # use different name to avoid module clash
 from geonode.utils import json_serializer_producer
 from geonode.decorators import on_ogc_backend
+from geonode.base.post_commit import queue_resource_work
 from geonode.geoserver.helpers import (
     gs_catalog,
     ogc_server_settings,
@@ -77,12 +78,15 @@ def geoserver_post_save(instance, sender, created, **kwargs):
     # this is attached to various models, (ResourceBase, Document)
     # so we should select what will be handled here
     if isinstance(instance, Layer):
-        instance_dict = model_to_dict(instance)
-        payload = json_serializer_producer(instance_dict)
-        try:
-            producer.geoserver_upload_layer(payload)
-        except Exception as e:
-            logger.error(e)
+        def _upload_layer(instance):
+            instance_dict = model_to_dict(instance)
+            payload = json_serializer_producer(instance_dict)
+            try:
+                producer.geoserver_upload_layer(payload)
+            except Exception as e:
+                logger.error(e)
+
+        queue_resource_work('geoserver_upload_layer', instance.id, _upload_layer, instance)
         if getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
             instance.set_dirty_state()
 
@@ -100,8 +104,9 @@ def geoserver_post_save_local(instance, *args, **kwargs):
         * Metadata Links,
         * Point of Contact name and url
     """
-    geoserver_post_save_layers.apply_async(
-        (instance.id, args, kwargs))
+    queue_resource_work(
+        'geoserver_post_save_layers', instance.id,
+        geoserver_post_save_layers.apply_async, (instance.id, args, kwargs))
 
 
 @on_ogc_backend(BACKEND_PACKAGE)
@@ -25,7 +25,6 @@ import geoserver
 from django.conf import settings
 from django.db import IntegrityError, transaction
 from django.contrib.auth import get_user_model
-from django.core.management import call_command
 from django.contrib.staticfiles.templatetags import staticfiles
 
 from celery.utils.log import get_task_logger
@@ -43,7 +42,8 @@ from geonode.layers.metadata import set_metadata
 from geonode.base.models import (
     ResourceBase,
     TopicCategory,
-    SpatialRepresentationType)
+    SpatialRepresentationType,
+    get_bbox_extents)
 from geonode.utils import set_resource_default_links
 from geonode.geoserver.upload import geoserver_upload
 from geonode.catalogue.models import catalogue_post_save
@@ -60,6 +60,7 @@ from .helpers import (
     create_gs_thumbnail,
     is_monochromatic_image,
     set_attributes_from_geoserver,
+    update_layer_attribute_statistics,
     _invalidate_geowebcache_layer,
     _stylefilterparams_geowebcache_layer)
 
@@ -587,6 +588,8 @@ def geoserver_post_save_layers(
                     'bbox_polygon': instance.bbox_polygon,
                     'srid': 'EPSG:4326'
                 }
+                # update() skips save(), which keeps the stored bbox extents in sync
+                to_update.update(get_bbox_extents(to_update['bbox_polygon'], to_update['srid']))
 
                 if is_monochromatic_image(instance.thumbnail_url):
                     to_update['thumbnail_url'] = staticfiles.static(settings.MISSING_THUMBNAIL)
@@ -658,7 +661,8 @@ def geoserver_post_save_layers(
 
             # Updating HAYSTACK Indexes if needed
             if settings.HAYSTACK_SEARCH:
-                call_command('update_index')
+                from geonode.haystack_signals import queue_index_update
+                queue_index_update(instance)
 
 
 @app.task(
@@ -694,6 +698,35 @@ def geoserver_create_thumbnail(self, instance_id, overwrite=True, check_bbox=Tru
                 geoserver_create_thumbnail.retry(exc=e)
 
 
+@app.task(
+    bind=True,
+    base=FaultTolerantTask,
+    name='geonode.geoserver.tasks.geoserver_update_layer_attribute_statistics',
+    queue='geoserver.catalog',
+    expires=3600,
+    acks_late=False,
+    autoretry_for=(Exception, ),
+    retry_kwargs={'max_retries': 3, 'countdown': 10},
+    retry_backoff=True,
+    retry_backoff_max=700,
+    retry_jitter=True)
+def geoserver_update_layer_attribute_statistics(self, instance_id, fields=None):
+    """
+    Runs update_layer_attribute_statistics.
+    """
+    try:
+        instance = Layer.objects.get(id=instance_id)
+    except Layer.DoesNotExist:
+        logger.debug(f"Layer id {instance_id} does not exist anymore!")
+        return
+
+    lock_id = f'{self.request.id}'
+    with AcquireLock(lock_id) as lock:
+        if lock.acquire() is True:
+            updated = update_layer_attribute_statistics(instance, fields=fields)
+            logger.debug(f"... Updated the statistics of {len(updated)} attributes for Layer {instance.title}")
+
+
 @app.task(
     bind=True,
     base=FaultTolerantTask,
@@ -24,18 +24,19 @@ import re
 import json
 import gisdata
 from urllib.parse import urljoin
+from unittest.mock import patch
 
 from django.conf import settings
 
 from geonode import geoserver
 from geonode.decorators import on_ogc_backend
 
-from geonode.layers.models import Layer
+from geonode.layers.models import Layer, Attribute
 from geonode.layers.utils import file_upload
 from geonode.layers.populate_layers_data import create_layer_data
 
 from geonode.geoserver.views import _response_callback
-from geonode.geoserver.helpers import _compute_number_of_tiles
+from geonode.geoserver.helpers import _compute_number_of_tiles, update_layer_attribute_statistics
 
 import logging
 logger = logging.getLogger(__name__)
@@ -216,3 +217,27 @@ xlink:href="{settings.GEOSERVER_LOCATION}ows?service=WMS&amp;request=GetLegendGr
         self.assertEqual(first_row[2].x, 34947)
         self.assertEqual(first_row[2].y, first_row[0].y)
         self.assertEqual(first_row[2].z, first_row[0].z)
+
+    @on_ogc_backend(geoserver.BACKEND_PACKAGE)
+    @patch('geonode.geoserver.helpers.get_layer_attribute_statistics')
+    def test_update_layer_attribute_statistics(self, get_layer_attribute_statistics):
+        layer = Layer.objects.all()[0]
+        layer.storeType = 'dataStore'
+        Attribute.objects.create(layer=layer, attribute='population', attribute_type='xsd:int')
+        Attribute.objects.create(layer=layer, attribute='area', attribute_type='xsd:double')
+        get_layer_attribute_statistics.return_value = {
+            'population': {
+                'Count': 3, 'Min': '1', 'Max': '5', 'Average': '3.0', 'Median': '3',
+                'StandardDeviation': '1.63', 'Sum': '9', 'unique_values': 'NA'}
+        }
+
+        updated = update_layer_attribute_statistics(layer, fields=['population'])
+
+        # Only the requested aggregable attributes are computed, in a single call
+        get_layer_attribute_statistics.assert_called_once_with(layer, ['population'])
+        self.assertEqual([la.attribute for la in updated], ['population'])
+        population = Attribute.objects.get(layer=layer, attribute='population')
+        self.assertEqual(population.count, 3)
+        self.assertEqual(population.max, '5')
+        self.assertEqual(population.median, '3')
+        self.assertEqual(Attribute.objects.get(layer=layer, attribute='area').max, 'NA')
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""
+Queued Haystack signal processor.
+
+`RealtimeSignalProcessor` reindexes every indexed object as soon as it is
+saved, one search engine round trip per save. `QueuedSignalProcessor` only
+buffers the ids of the saved and deleted objects; they are deduplicated and
+sent, once the transaction or the `deferred_resource_work` scope ends, to
+the `update_search_index` task which updates the index in bulk.
+"""
+
+import logging
+import threading
+
+from django.apps import apps
+from django.db.models import signals
+
+from haystack import connections, connection_router
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+from haystack.utils import get_identifier
+
+from geonode.base.post_commit import queue_resource_work
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class _IndexBatch(object):
+    """The objects to (re)index, {model label: set of pks}, and the identifiers to remove"""
+
+    def __init__(self):
+        self.updates = {}
+        self.removals = set()
+
+    def __bool__(self):
+        return bool(self.removals) or any(self.updates.values())
+
+    def add(self, instance, removed=False):
+        pks = self.updates.setdefault(instance._meta.label, set())
+        identifier = get_identifier(instance)
+        if removed:
+            pks.discard(instance.pk)
+            self.removals.add(identifier)
+        else:
+            pks.add(instance.pk)
+            self.removals.discard(identifier)
+
+
+def _flush_index_batch():
+    batch, _state.batch = getattr(_state, 'batch', None), None
+    if batch:
+        from geonode.tasks.tasks import update_search_index
+        update_search_index.apply_async(args=(
+            {label: sorted(pks) for label, pks in batch.updates.items() if pks},
+            sorted(batch.removals)))
+
+
+def queue_index_update(instance, removed=False):
+    """Buffers the (re)indexing, or the removal from the index, of `instance`."""
+    if getattr(_state, 'batch', None) is None:
+        _state.batch = _IndexBatch()
+    _state.batch.add(instance, removed=removed)
+    queue_resource_work('search_index', None, _flush_index_batch)
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Queues the index updates of the indexed models, see `queue_index_update`.
+    """
+
+    def _indexed_models(self):
+        models = set()
+        for alias in self.connections.connections_info:
+            models.update(self.connections[alias].get_unified_index().get_indexed_models())
+        return models
+
+    def setup(self):
+        for model in self._indexed_models():
+            signals.post_save.connect(self.handle_save, sender=model)
+            signals.post_delete.connect(self.handle_delete, sender=model)
+
+    def teardown(self):
+        for model in self._indexed_models():
+            signals.post_save.disconnect(self.handle_save, sender=model)
+            signals.post_delete.disconnect(self.handle_delete, sender=model)
+
+    def handle_save(self, sender, instance, **kwargs):
+        queue_index_update(instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        queue_index_update(instance, removed=True)
+
+
+def update_index(updates=None, removals=None, batch_size=None, using=None):
+    """
+    Updates the search index in bulk.
+
+    updates - {model label: [pks]} of the objects to (re)index; the ones not
+              found anymore are removed from the index
+    removals - the identifiers of the objects to remove from the index
+    batch_size - the objects sent per bulk request, defaults to the backend one
+    using - the connection to update, defaults to all the writable ones
+    """
+    for alias in ([using] if using else connection_router.for_write()):
+        backend = connections[alias].get_backend()
+        unified_index = connections[alias].get_unified_index()
+        size = batch_size or backend.batch_size
+        for label, pks in (updates or {}).items():
+            model = apps.get_model(label)
+            try:
+                index = unified_index.get_index(model)
+            except NotHandled:
+                continue
+            pks = list(pks)
+            for start in range(0, len(pks), size):
+                chunk = pks[start:start + size]
+                objs = list(index.build_queryset(using=alias).filter(pk__in=chunk))
+                if objs and hasattr(index, 'prefetch_acls'):
+                    index.prefetch_acls(objs)
+                if objs:
+                    backend.update(index, objs)
+                for pk in set(chunk) - set(obj.pk for obj in objs):
+                    backend.remove(f"{model._meta.app_label}.{model._meta.model_name}.{pk}")
+        for identifier in removals or []:
+            backend.remove(identifier)
+
+
+def reconcile_search_acls(batch_size=None):
+    """
+    Reindexes the resources whose indexed visibility rules differ from the
+    database ones, e.g. after their permissions changed without a save.
+
+    Returns the number of reindexed resources.
+    """
+    from haystack.query import SearchQuerySet
+    from geonode.base.search_indexes import ResourceBaseACLIndex, get_acl_fingerprint
+    from geonode.security.utils import get_view_acls
+
+    reindexed = 0
+    for alias in connection_router.for_write():
+        unified_index = connections[alias].get_unified_index()
+        size = batch_size or connections[alias].get_backend().batch_size
+        for model in unified_index.get_indexed_models():
+            index = unified_index.get_index(model)
+            if not isinstance(index, ResourceBaseACLIndex):
+                continue
+            rows = list(index.build_queryset(using=alias).prefetch_related(None).order_by('pk').values_list(
+                'pk', 'owner_id', 'group_id', 'is_approved', 'is_published', 'dirty_state'))
+            for start in range(0, len(rows), size):
+                chunk = rows[start:start + size]
+                pks = [row[0] for row in chunk]
+                acls = get_view_acls(pks)
+                indexed = {
+                    int(result.pk): result.acl_hash
+                    for result in SearchQuerySet(using=alias).models(model).filter(id__in=pks)[:len(pks)]}
+                outdated = [
+                    row[0] for row in chunk
+                    if indexed.get(row[0]) != get_acl_fingerprint(
+                        *row[1:], acls[row[0]]['users'], acls[row[0]]['groups'])]
+                if outdated:
+                    update_index({model._meta.label: outdated}, batch_size=size, using=alias)
+                    reindexed += len(outdated)
+    return reindexed
@@ -33,11 +33,14 @@ class Command(BaseCommand):
         - resources (-r, --resources)
         - permissions (-p, --permissions)
         - delete (-d, --delete)
+        - start after (-s, --start-after)
     At least one user or one group is required.
     If no resources are typed all the layers will be considered.
     At least one permission must be typed.
     Multiple inputs can be typed with white space separator.
     To unset permissions use the '--delete (-d)' option.
+    To resume an interrupted run use the '--start-after (-s)' option
+    with the last layer id it reported.
     To assign permissions to everyone (anonymous users), you will need to
     add the following options: '-u AnonymousUser -g anonymous'
     """
@@ -97,6 +100,15 @@ class Command(BaseCommand):
             default=False,
             help='Delete permission if it exists.'
         )
+        parser.add_argument(
+            '-s',
+            '--start-after',
+            dest='start_after',
+            type=int,
+            default=None,
+            help='Resume an interrupted run skipping the layers with id lower or equal '
+                 'to the last id it reported.'
+        )
 
     def handle(self, *args, **options):
         # Retrieving the arguments
@@ -111,5 +123,6 @@ class Command(BaseCommand):
             users_usernames,
             groups_names,
             delete_flag,
-            verbose=True
+            verbose=True,
+            start_after=options.get('start_after')
         )
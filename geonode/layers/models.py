@@ -215,7 +215,11 @@ class Layer(ResourceBase):
 
     @property
     def processed(self):
-        self.upload_session = UploadSession.objects.filter(resource=self).first()
+        if 'uploadsession_set' in getattr(self, '_prefetched_objects_cache', {}):
+            # prefetched ordered by pk, e.g. by the API list views
+            self.upload_session = next(iter(self.uploadsession_set.all()), None)
+        else:
+            self.upload_session = UploadSession.objects.filter(resource=self).first()
         if self.upload_session:
             return self.upload_session.processed
         else:
@@ -279,13 +283,19 @@ class Layer(ResourceBase):
     @property
     def gtype(self):
         # return attribute type without 'gml:' and 'PropertyType'
-        if self.attribute_set and self.attribute_set.count():
-            _attrs = self.attribute_set
+        if 'attribute_set' in getattr(self, '_prefetched_objects_cache', {}):
+            _geom_attrs = sorted(
+                (_att for _att in self.attribute_set.all() if _att.attribute == 'the_geom'),
+                key=lambda _att: _att.pk)
+            _geom_attr = _geom_attrs[0] if _geom_attrs else None
         else:
-            _attrs = Attribute.objects.filter(layer=self)
-        if _attrs.filter(attribute='the_geom').exists():
-            _att_type = _attrs.filter(attribute='the_geom').first().attribute_type
-            _gtype = re.match(r'\(\'gml:(.*?)\',', _att_type)
+            if self.attribute_set and self.attribute_set.count():
+                _attrs = self.attribute_set
+            else:
+                _attrs = Attribute.objects.filter(layer=self)
+            _geom_attr = _attrs.filter(attribute='the_geom').first()
+        if _geom_attr:
+            _gtype = re.match(r'\(\'gml:(.*?)\',', _geom_attr.attribute_type)
             return _gtype.group(1) if _gtype else None
         return None
 
@@ -378,21 +388,19 @@ class Layer(ResourceBase):
     def view_count_up(self, user, do_local=False):
         """ increase view counter, if user is not owner and not super
 
+        Views are aggregated in process and periodically flushed to the
+        database by geonode.base.counters, instead of being published
+        one by one.
+
         @param user which views layer
         @type User model
 
-        @param do_local - do local counter update even if pubsub is enabled
+        @param do_local - kept for backward compatibility, views are always
+            counted locally
         @type bool
         """
-        if user == self.owner or user.is_superuser:
-            return
-        if not do_local:
-            from geonode.messaging import producer
-            producer.viewing_layer(str(user), str(self.owner), self.id)
-
-        else:
-            Layer.objects.filter(id=self.id)\
-                         .update(popular_count=models.F('popular_count') + 1)
+        from geonode.base.counters import count_view
+        count_view(self, user)
 
 
 class LayerFile(models.Model):
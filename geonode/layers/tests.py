@@ -29,6 +29,8 @@ import zipfile
 import tempfile
 import contextlib
 
+from unittest.mock import patch
+
 from pinax.ratings.models import OverallRating
 
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -37,11 +39,13 @@ from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
 from django.contrib.auth.models import Group
 from django.contrib.gis.geos import Polygon
+from django.db import connection
 from django.db.models import Count
 from django.contrib.auth import get_user_model
 
 from django.conf import settings
-from django.test.utils import override_settings
+from django.test import RequestFactory
+from django.test.utils import override_settings, CaptureQueriesContext
 
 from guardian.shortcuts import get_anonymous_user
 from guardian.shortcuts import assign_perm, remove_perm
@@ -152,6 +156,24 @@ class LayersTest(GeoNodeBaseTestSupport):
         self.assertIsNotNone(_ll)
         self.assertEqual(_ll.name, _ll_1.name)
 
+    def test_resolve_layer_cached_in_request(self):
+        lyr = Layer.objects.first()
+        lyr.set_permissions({'users': {"bobby": ['base.view_resourcebase']}})
+        _request = RequestFactory().get(reverse('layer_detail', args=(lyr.alternate,)))
+        _request.user = get_user_model().objects.get(username="bobby")
+        _ll = _resolve_layer(_request, alternate=lyr.alternate)
+        self.assertEqual(_ll.id, lyr.id)
+        # the same request resolves the layer again without hitting the database
+        with self.assertNumQueries(0):
+            self.assertEqual(_resolve_layer(_request, alternate=lyr.alternate), _ll)
+
+        # a new request resolves it again
+        _request = RequestFactory().get(reverse('layer_detail', args=(lyr.alternate,)))
+        _request.user = get_user_model().objects.get(username="bobby")
+        with CaptureQueriesContext(connection) as ctx:
+            _resolve_layer(_request, alternate=lyr.alternate)
+        self.assertTrue(ctx.captured_queries)
+
     # Test layer upload endpoint
     def test_upload_layer(self):
         # Test redirection to login form when not logged in
@@ -240,6 +262,54 @@ class LayersTest(GeoNodeBaseTestSupport):
         response = self.client.get(url)
         self.assertNotEqual(response.status_code, 404)
 
+    @patch('geonode.layers.views.get_layer_attribute_values')
+    def test_layer_attribute_values(self, get_layer_attribute_values):
+        """ Test the paginated layer attribute distinct values
+        """
+        get_layer_attribute_values.return_value = [('Rome', 3), ('Paris', 1), ('Lima', 2)]
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+        layer = Layer.objects.all().first()
+
+        url = reverse('layer_attribute_values', args=(layer.alternate, 'bad_attribute'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+        url = reverse('layer_attribute_values', args=(layer.alternate, 'place_name'))
+        response = self.client.get(url, {'offset': 10, 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        get_layer_attribute_values.assert_called_with(layer, 'place_name', limit=3, offset=10)
+        out = json.loads(response.content)
+        self.assertTrue(out['has_more'])
+        self.assertEqual(out['values'], [{'value': 'Rome', 'count': 3}, {'value': 'Paris', 'count': 1}])
+
+        response = self.client.get(url, {'limit': 'all'})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('geonode.layers.views.get_layer_attribute_values')
+    def test_load_layer_data_attributes(self, get_layer_attribute_values):
+        """ Test the attributes whose values are loaded for the filters
+        """
+        get_layer_attribute_values.return_value = [('Rome', 3)]
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+        layer = Layer.objects.all().first()
+        layer.attribute_set.create(attribute='the_geom', attribute_type='gml:PointPropertyType')
+        attribute_names = set(layer.attribute_set.exclude(
+            attribute_type__startswith='gml:').values_list('attribute', flat=True))
+        self.assertNotIn('the_geom', attribute_names)
+        url = reverse('load_layer_data')
+
+        # all of the attributes without a list of them
+        response = self.client.post(url, {'json_data': json.dumps({
+            'layer_name': layer.alternate, 'filtered_attributes': ''})})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(json.loads(response.content)['feature_properties']), attribute_names)
+
+        # only the known ones otherwise
+        response = self.client.post(url, {'json_data': json.dumps({
+            'layer_name': layer.alternate, 'filtered_attributes': ['place_name', 'the_geom', 'bad_attribute']})})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['feature_properties'], {'place_name': ['Rome']})
+
     def test_layer_attribute_config(self):
         lyr = Layer.objects.all().first()
         attribute_config = lyr.attribute_config()
@@ -1336,6 +1406,36 @@ class SetLayersPermissions(GeoNodeBaseTestSupport):
             if self.user in perm_spec["users"]:
                 self.assertNotIn(perm, perm_spec["users"][self.user])
 
+    def test_assign_permissions_in_chunks(self):
+        layers = list(Layer.objects.order_by('id'))
+        self.assertTrue(len(layers) > 2)
+        calls = []
+
+        def _progress(processed, total, last_id):
+            calls.append((processed, total, last_id))
+
+        # Resume after the first layer, two layers per chunk
+        with self.settings(SECURITY_BULK_PERMISSIONS_CHUNK_SIZE=2):
+            result = utils.set_layers_permissions(
+                "download", None, [self.user.username], None, False,
+                start_after=layers[0].id, progress=_progress)
+        self.assertEqual(result['total'], len(layers) - 1)
+        self.assertEqual(result['processed'], len(layers) - 1)
+        self.assertEqual(result['last_id'], layers[-1].id)
+        self.assertEqual(len(calls), (len(layers) - 1 + 1) // 2)
+        self.assertEqual(calls[0], (2, len(layers) - 1, layers[2].id))
+        self.assertFalse(self.user.has_perm('download_resourcebase', layers[0].get_self_resource()))
+        for layer in layers[1:]:
+            self.assertTrue(self.user.has_perm('view_resourcebase', layer.get_self_resource()))
+            self.assertTrue(self.user.has_perm('download_resourcebase', layer.get_self_resource()))
+
+        # Granting again is a no-op, revoking removes the rows
+        utils.set_layers_permissions("download", None, [self.user.username], None, False)
+        utils.set_layers_permissions("download", None, [self.user.username], None, True)
+        self.user = get_user_model().objects.get(id=self.user.id)
+        for layer in layers:
+            self.assertFalse(self.user.has_perm('download_resourcebase', layer.get_self_resource()))
+
 
 class LayersUploaderTests(GeoNodeBaseTestSupport):
 
@@ -67,6 +67,8 @@ urlpatterns = [
         views.layer_sld_edit, name='layer_sld_edit'),
     url(r'^(?P<layername>[^/]*)/feature_catalogue$',
         views.layer_feature_catalogue, name='layer_feature_catalogue'),
+    url(r'^(?P<layername>[^/]*)/attribute_values/(?P<attribute>[^/]*)$',
+        views.layer_attribute_values, name='layer_attribute_values'),
     url(r'^metadata/batch/$',
         views.layer_batch_metadata, name='layer_batch_metadata'),
     url(r'^permissions/batch/$',
@@ -60,9 +60,10 @@ from geonode.people.utils import get_valid_user
 from geonode.layers.models import UploadSession, LayerFile
 from geonode.base.thumb_utils import thumb_exists
 from geonode.base.models import Link, SpatialRepresentationType,  \
-    TopicCategory, Region, License, ResourceBase
+    TopicCategory, Region, License, ResourceBase, get_bbox_extents
 from geonode.layers.models import shp_exts, csv_exts, vec_exts, cov_exts, Layer
 from geonode.layers.metadata import set_metadata
+from geonode.security.utils import bulk_set_resources_permissions
 from geonode.upload.utils import _fixup_base_file
 from geonode.utils import (http_client,
                            check_ogc_backend,
@@ -706,6 +707,8 @@ def file_upload(filename,
         defaults['title'] = defaults.get('title', None) or layer.title
         defaults['abstract'] = defaults.get('abstract', None) or layer.abstract
         defaults['bbox_polygon'] = defaults.get('bbox_polygon', None) or layer.bbox_polygon
+        # update() skips save(), which keeps the stored bbox extents in sync
+        defaults.update(get_bbox_extents(defaults['bbox_polygon'], defaults.get('srid', layer.srid)))
         defaults['is_approved'] = defaults.get(
             'is_approved', is_approved) or layer.is_approved
         defaults['is_published'] = defaults.get(
@@ -1233,7 +1236,13 @@ def surrogate_escape_string(input_string, source_character_set):
 
 def set_layers_permissions(permissions_name, resources_names=None,
                            users_usernames=None, groups_names=None,
-                           delete_flag=None, verbose=False):
+                           delete_flag=None, verbose=False,
+                           start_after=None, progress=None):
+    """Set/Unset the permissions of users and groups on many layers at once.
+
+    The layers are processed in resumable chunks, see
+    geonode.security.utils.bulk_set_resources_permissions.
+    """
     # Processing information
     if not resources_names:
         # If resources is None we consider all the existing layer
@@ -1288,30 +1297,22 @@ def set_layers_permissions(permissions_name, resources_names=None,
                     )
                 else:
                     # USERS
-                    users = []
-                    if users_usernames:
-                        User = get_user_model()
-                        for username in users_usernames:
-                            try:
-                                user = User.objects.get(username=username)
-                                users.append(user)
-                            except User.DoesNotExist:
-                                logger.warning(
-                                    'The user {} does not exists. '
-                                    'It has been skipped.'.format(username)
-                                )
+                    User = get_user_model()
+                    usernames = [str(_u) for _u in users_usernames or []]
+                    users = list(User.objects.filter(username__in=usernames))
+                    for username in set(usernames) - {_u.username for _u in users}:
+                        logger.warning(
+                            'The user {} does not exists. '
+                            'It has been skipped.'.format(username)
+                        )
                     # GROUPS
-                    groups = []
-                    if groups_names:
-                        for group_name in groups_names:
-                            try:
-                                group = Group.objects.get(name=group_name)
-                                groups.append(group)
-                            except Group.DoesNotExist:
-                                logger.warning(
-                                    'The group {} does not exists. '
-                                    'It has been skipped.'.format(group_name)
-                                )
+                    group_names = [str(_g) for _g in groups_names or []]
+                    groups = list(Group.objects.filter(name__in=group_names))
+                    for group_name in set(group_names) - {_g.name for _g in groups}:
+                        logger.warning(
+                            'The group {} does not exists. '
+                            'It has been skipped.'.format(group_name)
+                        )
                     if not users and not groups:
                         logger.error(
                             'Neither users nor groups corresponding to the typed names have been found. '
@@ -1319,102 +1320,24 @@ def set_layers_permissions(permissions_name, resources_names=None,
                         )
                     else:
                         # RESOURCES
-                        for resource in resources:
-                            # Existing permissions on the resource
-                            perm_spec = resource.get_all_level_info()
+                        def _progress(processed, total, last_id):
                             if verbose:
-                                logger.info(
-                                    f"Initial permissions info for the resource {resource.title}: {perm_spec}"
-                                )
-                                print(
-                                    f"Initial permissions info for the resource {resource.title}: {perm_spec}"
-                                )
-                            for u in users:
-                                _user = u
-                                # Add permissions
-                                if not delete_flag:
-                                    # Check the permission already exists
-                                    if _user not in perm_spec["users"] and _user.username not in perm_spec["users"]:
-                                        perm_spec["users"][_user] = permissions
-                                    else:
-                                        if _user.username in perm_spec["users"]:
-                                            u_perms_list = perm_spec["users"][_user.username]
-                                            del(perm_spec["users"][_user.username])
-                                            perm_spec["users"][_user] = u_perms_list
-
-                                        try:
-                                            u_perms_list = perm_spec["users"][_user]
-                                            base_set = set(u_perms_list)
-                                            target_set = set(permissions)
-                                            perm_spec["users"][_user] = list(base_set | target_set)
-                                        except KeyError:
-                                            perm_spec["users"][_user] = permissions
-
-                                # Delete permissions
-                                else:
-                                    # Skip resource owner
-                                    if _user != resource.owner:
-                                        if _user in perm_spec["users"]:
-                                            u_perms_set = set()
-                                            for up in perm_spec["users"][_user]:
-                                                if up not in permissions:
-                                                    u_perms_set.add(up)
-                                            perm_spec["users"][_user] = list(u_perms_set)
-                                        else:
-                                            logger.warning(
-                                                "The user %s does not have "
-                                                "any permission on the layer %s. "
-                                                "It has been skipped." % (_user.username, resource.title)
-                                            )
-                                    else:
-                                        logger.warning(
-                                            "Warning! - The user %s is the layer %s owner, "
-                                            "so its permissions can't be changed. "
-                                            "It has been skipped." % (_user.username, resource.title)
-                                        )
-                            for g in groups:
-                                _group = g
-                                # Add permissions
-                                if not delete_flag:
-                                    # Check the permission already exists
-                                    if _group not in perm_spec["groups"] and _group.name not in perm_spec["groups"]:
-                                        perm_spec["groups"][_group] = permissions
-                                    else:
-                                        if _group.name in perm_spec["groups"]:
-                                            g_perms_list = perm_spec["groups"][_group.name]
-                                            del(perm_spec["groups"][_group.name])
-                                            perm_spec["groups"][_group] = g_perms_list
-
-                                        try:
-                                            g_perms_list = perm_spec["groups"][_group]
-                                            base_set = set(g_perms_list)
-                                            target_set = set(permissions)
-                                            perm_spec["groups"][_group] = list(base_set | target_set)
-                                        except KeyError:
-                                            perm_spec["groups"][_group] = permissions
-
-                                # Delete permissions
-                                else:
-                                    if g in perm_spec["groups"]:
-                                        g_perms_set = set()
-                                        for gp in perm_spec["groups"][g]:
-                                            if gp not in permissions:
-                                                g_perms_set.add(gp)
-                                        perm_spec["groups"][g] = list(g_perms_set)
-                                    else:
-                                        logger.warning(
-                                            "The group %s does not have any permission on the layer %s. "
-                                            "It has been skipped." % (g.name, resource.title)
-                                        )
-                            # Set final permissions
-                            resource.set_permissions(perm_spec)
-                            if verbose:
-                                logger.info(
-                                    f"Final permissions info for the resource {resource.title}: {perm_spec}"
-                                )
-                                print(
-                                    f"Final permissions info for the resource {resource.title}: {perm_spec}"
-                                )
+                                msg = f"Permissions updated on {processed} of {total} resources (last id {last_id})"
+                                logger.info(msg)
+                                print(msg)
+                            if progress:
+                                progress(processed, total, last_id)
+
+                        result = bulk_set_resources_permissions(
+                            resources,
+                            permissions,
+                            users=users,
+                            groups=groups,
+                            delete=delete_flag,
+                            start_after=start_after,
+                            progress=_progress
+                        )
                         if verbose:
                             logger.info("Permissions successfully updated!")
                             print("Permissions successfully updated!")
+                        return result
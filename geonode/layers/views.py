@@ -26,6 +26,7 @@ import base64
 import traceback
 from types import TracebackType
 import decimal
+import datetime
 import pickle
 import six
 from django.db.models import Q
@@ -38,9 +39,8 @@ from django.template.response import TemplateResponse
 from requests import Request
 from itertools import chain
 from six import string_types
-from owslib.wfs import WebFeatureService
 
-from guardian.shortcuts import get_perms, get_objects_for_user
+from guardian.shortcuts import get_objects_for_user
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
@@ -58,13 +58,13 @@ from django.utils.html import escape
 from django.template.defaultfilters import slugify
 from django.forms.models import inlineformset_factory
 from django.db import IntegrityError, transaction
-from django.db.models import F
 from django.forms.utils import ErrorList
 
 from geonode.base.auth import get_or_create_token
 from geonode.base.forms import CategoryForm, TKeywordForm, BatchPermissionsForm
 from geonode.base.views import batch_modify
 from geonode.base.models import (
+    ResourceBase,
     Thesaurus,
     TopicCategory)
 from geonode.base.enumerations import CHARSETS
@@ -94,10 +94,11 @@ from geonode.security.views import _perms_info_json
 from geonode.people.forms import ProfileForm, PocForm
 from geonode.documents.models import get_related_documents
 from geonode import geoserver, qgis_server
-from geonode.security.utils import get_visible_resources
+from geonode.security.utils import get_perms, get_visible_resources, prefetch_perms
 
 from geonode.utils import (
     resolve_object,
+    get_request_cache,
     default_map_config,
     check_ogc_backend,
     llbbox_to_mercator,
@@ -107,6 +108,7 @@ from geonode.utils import (
     GXPMap)
 
 from geonode.geoserver.helpers import (ogc_server_settings,
+                                       get_layer_attribute_values,
                                        set_layer_style)
 from geonode.base.utils import ManageResourceOwnerPermissions
 from geonode.tasks.tasks import set_permissions
@@ -154,10 +156,9 @@ def log_snippet(log_file):
         return f.read()
 
 
-def _resolve_layer(request, alternate, permission='base.view_resourcebase',
-                   msg=_PERMISSION_MSG_GENERIC, **kwargs):
+def _resolve_layer_query(alternate):
     """
-    Resolve the layer by the provided typename (which may include service name) and check the optional permission.
+    Returns the query matching the layer with the provided typename (which may include service name).
     """
     service_typename = alternate.split(":", 1)
     if Service.objects.filter(name=service_typename[0]).exists():
@@ -168,41 +169,44 @@ def _resolve_layer(request, alternate, permission='base.view_resourcebase',
             query['store'] = service_typename[0]
         else:
             query['storeType'] = 'remoteStore'
-        return resolve_object(
-            request,
-            Layer,
-            query,
-            permission=permission,
-            permission_msg=msg,
-            **kwargs)
-    else:
-        if len(service_typename) > 1 and ':' in service_typename[1]:
-            if service_typename[0]:
-                query = {
-                    'store': service_typename[0],
-                    'alternate': service_typename[1]
-                }
-            else:
-                query = {
-                    'alternate': service_typename[1]
-                }
-        else:
-            query = {'alternate': alternate}
-        test_query = Layer.objects.filter(**query)
-        if test_query.count() > 1 and test_query.exclude(storeType='remoteStore').count() == 1:
+        return query
+
+    if len(service_typename) > 1 and ':' in service_typename[1]:
+        if service_typename[0]:
             query = {
-                'id': test_query.exclude(storeType='remoteStore').last().id
+                'store': service_typename[0],
+                'alternate': service_typename[1]
             }
-        elif test_query.count() > 1:
+        else:
             query = {
-                'id': test_query.last().id
+                'alternate': service_typename[1]
             }
-        return resolve_object(request,
-                              Layer,
-                              query,
-                              permission=permission,
-                              permission_msg=msg,
-                              **kwargs)
+    else:
+        query = {'alternate': alternate}
+    candidates = list(Layer.objects.filter(**query).order_by('id').values_list('id', 'storeType'))
+    if len(candidates) > 1:
+        # on a name clash prefer the only local layer, otherwise the latest one
+        local_ids = [_id for _id, _store_type in candidates if _store_type != 'remoteStore']
+        query = {
+            'id': local_ids[0] if len(local_ids) == 1 else candidates[-1][0]
+        }
+    return query
+
+
+def _resolve_layer(request, alternate, permission='base.view_resourcebase',
+                   msg=_PERMISSION_MSG_GENERIC, **kwargs):
+    """
+    Resolve the layer by the provided typename (which may include service name) and check the optional permission.
+    """
+    queries = get_request_cache(request, '_resolve_layer')
+    if alternate not in queries:
+        queries[alternate] = _resolve_layer_query(alternate)
+    return resolve_object(request,
+                          Layer,
+                          queries[alternate],
+                          permission=permission,
+                          permission_msg=msg,
+                          **kwargs)
 
 
 # Basic Layer Views #
@@ -760,70 +764,113 @@ def layer_detail(request, layername, template='layers/layer_detail.html'):
             context_dict['groups'] = [group for group in request.user.group_list_all()]
 
     register_event(request, 'view', layer)
-    context_dict['map_layers'] = [map_layer for map_layer in layer.maps() if
+    map_layers = layer.maps().select_related('map__resourcebase_ptr')
+    prefetch_perms(request.user, [map_layer.map for map_layer in map_layers], model=ResourceBase)
+    context_dict['map_layers'] = [map_layer for map_layer in map_layers if
                                   request.user.has_perm('view_resourcebase', map_layer.map.get_self_resource())]
     return TemplateResponse(
         request, template, context=context_dict)
 
 
+def _attribute_value_to_json(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
 # Loads the data using the OWS lib when the "Do you want to filter it"
 # button is clicked.
 def load_layer_data(request, template='layers/layer_detail.html'):
     context_dict = {}
     data_dict = json.loads(request.POST.get('json_data'))
     layername = data_dict['layer_name']
-    filtered_attributes = ''
+    filtered_attributes = None
     if not isinstance(data_dict['filtered_attributes'], string_types):
         filtered_attributes = [x for x in data_dict['filtered_attributes'] if '/load_layer_data' not in x]
-    name = layername if ':' not in layername else layername.split(':')[1]
-    location = "{location}{service}".format(** {
-        'location': settings.OGC_SERVER['default']['LOCATION'],
-        'service': 'wms',
-    })
-    access_token = None
-    if request and 'access_token' in request.session:
-        access_token = request.session['access_token']
-    if access_token and 'access_token' not in location:
-        location = '%s?access_token=%s' % (location, access_token)
+    try:
+        layer = _resolve_layer(request, layername, 'base.view_resourcebase')
+    except PermissionDenied:
+        return HttpResponse(json.dumps(context_dict),
+                            content_type="application/json",
+                            status=403)
+    except Exception:
+        layer = None
+    if not layer:
+        raise Http404(_("Not found"))
 
+    # Without a list of attributes all of them are returned, but the geometry
+    # which, like in the WFS properties, is not a filter
+    attribute_names = list(
+        layer.attribute_set.exclude(attribute_type__startswith='gml:').order_by(
+            'display_order').values_list('attribute', flat=True))
+    if filtered_attributes is None:
+        filtered_attributes = attribute_names
+    else:
+        filtered_attributes = [x for x in filtered_attributes if x in attribute_names]
+
+    # Only the distinct values of each attribute are needed to fill the filter
+    # dropdowns, so let the datastore compute them instead of downloading every feature.
+    limit = getattr(settings, 'LAYER_ATTRIBUTE_VALUES_LIMIT', 1000)
     try:
-        wfs = WebFeatureService(
-            location,
-            version='1.1.0')
-        response = wfs.getfeature(
-            typename=name,
-            propertyname=filtered_attributes,
-            outputFormat='application/json')
-        x = response.read()
-        x = json.loads(x)
-        features_response = json.dumps(x)
-        decoded = json.loads(features_response)
-        decoded_features = decoded['features']
         properties = {}
-        for key in decoded_features[0]['properties']:
+        for key in filtered_attributes:
             properties[key] = []
-
-        # loop the dictionary based on the values on the list and add the properties
-        # in the dictionary (if doesn't exist) together with the value
-        from collections.abc import Iterable
-        for i in range(len(decoded_features)):
-            for key, value in decoded_features[i]['properties'].items():
+            for value, count in get_layer_attribute_values(layer, key, limit=limit):
+                value = _attribute_value_to_json(value)
                 if value != '' and isinstance(value, (string_types, int, float)) and (
-                        (isinstance(value, Iterable) and '/load_layer_data' not in value) or value):
+                        (isinstance(value, string_types) and '/load_layer_data' not in value) or value):
                     properties[key].append(value)
-
-        for key in properties:
-            properties[key] = list(set(properties[key]))
-            properties[key].sort()
-
         context_dict["feature_properties"] = properties
     except Exception:
         traceback.print_exc()
-        logger.error("Possible error with OWSLib.")
+        logger.error("Could not retrieve the layer attribute values.")
     return HttpResponse(json.dumps(context_dict),
                         content_type="application/json")
 
 
+@require_http_methods(["GET"])
+def layer_attribute_values(request, layername, attribute):
+    """
+    Returns a page of the distinct values of a layer attribute, along with their count.
+
+    The page is selected through the 'offset' and 'limit' query parameters.
+    """
+    try:
+        layer = _resolve_layer(request, layername, 'base.view_resourcebase')
+    except PermissionDenied:
+        return HttpResponse(_("Not allowed"), status=403)
+    except Exception:
+        raise Http404(_("Not found"))
+    if not layer or not layer.attribute_set.filter(attribute=attribute).exists():
+        raise Http404(_("Not found"))
+
+    max_limit = getattr(settings, 'LAYER_ATTRIBUTE_VALUES_LIMIT', 1000)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', 100)), 1), max_limit)
+    except ValueError:
+        return HttpResponse(
+            json.dumps({'success': False, 'errors': 'offset and limit must be integers'}),
+            content_type='application/json',
+            status=400)
+
+    # Fetch one more value to know if there is a next page
+    values = get_layer_attribute_values(layer, attribute, limit=limit + 1, offset=offset)
+    out = {
+        'attribute': attribute,
+        'offset': offset,
+        'limit': limit,
+        'has_more': len(values) > limit,
+        'values': [
+            {'value': _attribute_value_to_json(value), 'count': count}
+            for value, count in values[:limit]
+        ]
+    }
+    return HttpResponse(json.dumps(out), content_type='application/json')
+
+
 def layer_feature_catalogue(
         request,
         layername,
@@ -945,9 +992,7 @@ def layer_metadata(
 
     # Update count for popularity ranking,
     # but do not includes admins or resource owners
-    if request.user != layer.owner and not request.user.is_superuser:
-        Layer.objects.filter(
-            id=layer.id).update(popular_count=F('popular_count') + 1)
+    layer.view_count_up(request.user)
 
     # center/zoom don't matter; the viewer will center on the layer bounds
     map_obj = GXPMap(
@@ -103,8 +103,7 @@ class Map(ResourceBase, GXPMapBase):
 
     @property
     def layers(self):
-        layers = MapLayer.objects.filter(map=self.id)
-        return [layer for layer in layers]
+        return list(self.layer_set.all())
 
     @property
     def local_layers(self):
@@ -240,13 +239,6 @@ class Map(ResourceBase, GXPMapBase):
 
         return template_name
 
-    def keyword_list(self):
-        keywords_qs = self.keywords.all()
-        if keywords_qs:
-            return [kw.name for kw in keywords_qs]
-        else:
-            return []
-
     def get_absolute_url(self):
         return reverse('map_detail', None, [str(self.id)])
 
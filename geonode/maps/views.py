@@ -24,8 +24,6 @@ import traceback
 from urllib.parse import quote, urlsplit
 from itertools import chain
 
-from guardian.shortcuts import get_perms
-
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
 from django.urls import reverse
@@ -41,7 +39,6 @@ from django.views.decorators.http import require_http_methods
 
 import json
 from django.utils.html import strip_tags
-from django.db.models import F
 from django.views.decorators.clickjacking import (
     xframe_options_exempt,
     xframe_options_sameorigin)
@@ -61,13 +58,16 @@ from geonode.utils import (
     check_ogc_backend)
 from geonode.maps.forms import MapForm
 from geonode.security.views import _perms_info_json
+from geonode.security.utils import get_perms, prefetch_perms
 from geonode.base.forms import CategoryForm, TKeywordForm
 from geonode.base.models import (
+    ResourceBase,
     Thesaurus,
     TopicCategory)
 from geonode import geoserver, qgis_server
 from geonode.groups.models import GroupProfile
 from geonode.base.auth import get_or_create_token
+from geonode.base.counters import count_view
 from geonode.documents.models import get_related_documents
 from geonode.people.forms import ProfileForm
 from geonode.base.views import batch_modify
@@ -145,11 +145,10 @@ def map_detail(request, mapid, template='maps/map_detail.html'):
 
     # Update count for popularity ranking,
     # but do not includes admins or resource owners
-    if request.user != map_obj.owner and not request.user.is_superuser:
-        Map.objects.filter(
-            id=map_obj.id).update(
-            popular_count=F('popular_count') + 1)
+    count_view(map_obj, request.user)
 
+    # the permissions of the map layers are checked one by one by the config
+    prefetch_perms(request.user, map_obj.local_layers, model=ResourceBase)
     config = map_obj.viewer_json(request)
 
     register_event(request, EventType.EVENT_VIEW, map_obj.title)
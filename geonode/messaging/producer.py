@@ -18,18 +18,16 @@
 #
 #########################################################################
 
+import time
 import logging
+import threading
 import traceback
 
+from collections import deque
 from decorator import decorator
-from kombu import BrokerConnection
+from django.conf import settings
 from kombu.common import maybe_declare
-from .queues import (
-    queue_email_events,
-    queue_geoserver_events,
-    queue_notifications_events,
-    queue_layer_viewers
-)
+from .queues import QUEUES
 
 from . import (url,
                producers,
@@ -41,6 +39,35 @@ from .consumer import Consumer
 logger = logging.getLogger(__name__)
 
 LOCAL_STARTED = False
+QUEUES_DECLARED = False
+
+# When enabled, messages are handed to a background thread instead of being
+# published within the caller; they are kept in a local outbox while the broker is not reachable.
+BROKER_FIRE_AND_FORGET = getattr(settings, 'BROKER_FIRE_AND_FORGET', False)
+BROKER_OUTBOX_SIZE = getattr(settings, 'BROKER_OUTBOX_SIZE', 1000)
+BROKER_OUTBOX_RETRY_INTERVAL = getattr(settings, 'BROKER_OUTBOX_RETRY_INTERVAL', 5)
+
+_stats_lock = threading.Lock()
+_stats = {
+    'published': 0,
+    'failed': 0,
+    'publish_time': 0.0,
+    'last_publish_time': None,
+}
+
+
+def is_local_memory():
+    """
+    Returns True if messages are exchanged through the in-process memory:// transport.
+
+    The transport type is resolved from the shared connection, without opening a new one.
+    """
+    driver_type = getattr(connection.transport, 'driver_type', None)
+    if not driver_type:
+        msg = "Exception while getting connection to {}".format(url)
+        logger.error(msg)
+        raise Exception(msg)
+    return driver_type == 'memory'
 
 
 @decorator
@@ -56,8 +83,7 @@ def sync_if_local_memory(func, *args, **kwargs):
     try:
         return func(*args, **kwargs)
     finally:
-        connection = BrokerConnection(url, connect_timeout=broker_socket_timeout)
-        if getattr(connection.connection, 'driver_name', None) == 'memory':
+        if is_local_memory():
             # hack explained:
             # when using memory://, first run usually contains only message for
             # specific queue. Subsequent runs will deliver the same message
@@ -76,71 +102,165 @@ def sync_if_local_memory(func, *args, **kwargs):
                 msg = "Exception while publishing message: {}".format(tb)
                 logger.error(msg)
                 raise Exception(msg)
-        elif not getattr(connection.connection, 'driver_name', None):
-            msg = "Exception while getting connection to {}".format(url)
-            logger.error(msg)
-            raise Exception(msg)
 
 
-@sync_if_local_memory
-def send_email_producer(layer_uuid, user_id):
+def declare_queues(channel):
+    """
+    Declares the GeoNode queues, once per process and again after a connection error.
+    """
+    global QUEUES_DECLARED
+    if not QUEUES_DECLARED:
+        for queue in QUEUES:
+            maybe_declare(queue, channel)
+        QUEUES_DECLARED = True
+
+
+def _publish(payload, routing_key):
+    start = time.time()
+    try:
+        with producers[connection].acquire(block=True, timeout=broker_socket_timeout) as producer:
+            declare_queues(producer.channel)
+            producer.publish(
+                payload,
+                exchange='geonode',
+                serializer=task_serializer,
+                routing_key=routing_key,
+                timeout=broker_socket_timeout
+            )
+    except Exception as e:
+        if isinstance(e, connection.connection_errors + connection.channel_errors):
+            # the broker may have been restarted without the queues
+            global QUEUES_DECLARED
+            QUEUES_DECLARED = False
+        with _stats_lock:
+            _stats['failed'] += 1
+        raise
+    elapsed = time.time() - start
+    with _stats_lock:
+        _stats['published'] += 1
+        _stats['publish_time'] += elapsed
+        _stats['last_publish_time'] = elapsed
+
+
+class Outbox(object):
+    """
+    Local queue of the messages waiting to be published by a background thread.
+    """
+
+    def __init__(self, maxlen=None, retry_interval=None):
+        self.messages = deque(maxlen=maxlen or BROKER_OUTBOX_SIZE)
+        self.retry_interval = retry_interval or BROKER_OUTBOX_RETRY_INTERVAL
+        self._event = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.messages)
+
+    def put(self, payload, routing_key):
+        if len(self.messages) == self.messages.maxlen:
+            logger.warning("The messaging outbox is full, dropping the oldest message.")
+        self.messages.append((payload, routing_key))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='geonode-messaging-outbox')
+                self._thread.daemon = True
+                self._thread.start()
+        self._event.set()
+
+    def stop(self):
+        """
+        Stops the background thread, the pending messages are kept in the outbox.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopped.set()
+            self._event.set()
+            thread.join()
+            self._stopped.clear()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._event.wait()
+            self._event.clear()
+            while self.messages and not self._stopped.is_set():
+                # Messages leave the outbox only once they have been published
+                payload, routing_key = self.messages[0]
+                try:
+                    _publish(payload, routing_key)
+                except Exception as e:
+                    logger.error("Could not publish message {}: {}".format(routing_key, e))
+                    self._stopped.wait(self.retry_interval)
+                else:
+                    self.messages.popleft()
+
+
+outbox = Outbox()
+
+
+def publish(payload, routing_key, fire_and_forget=None):
+    """
+    Publishes a message to the geonode exchange through the process producers pool.
+
+    In fire and forget mode the message is only queued in the local outbox.
+    Not available with the memory:// transport, which is consumed synchronously.
+    """
+    if fire_and_forget is None:
+        fire_and_forget = BROKER_FIRE_AND_FORGET
+    if fire_and_forget and not is_local_memory():
+        outbox.put(payload, routing_key)
+    else:
+        _publish(payload, routing_key)
+
+
+def queue_depths():
+    """
+    Returns the number of messages waiting in each GeoNode queue.
+    """
+    depths = {}
     with producers[connection].acquire(block=True, timeout=broker_socket_timeout) as producer:
-        maybe_declare(queue_email_events, producer.channel)
-        payload = {
-            "layer_uuid": layer_uuid,
-            "user_id": user_id
+        declare_queues(producer.channel)
+        for queue in QUEUES:
+            try:
+                depths[queue.name] = queue(producer.channel).queue_declare(passive=True).message_count
+            except Exception as e:
+                logger.debug(e)
+                depths[queue.name] = None
+    return depths
+
+
+def stats():
+    """
+    Returns the publish latency (in seconds) and the size of the local outbox.
+    """
+    with _stats_lock:
+        _published = _stats['published']
+        return {
+            'published': _published,
+            'failed': _stats['failed'],
+            'average_publish_time': _stats['publish_time'] / _published if _published else None,
+            'last_publish_time': _stats['last_publish_time'],
+            'outbox': len(outbox),
         }
-        producer.publish(
-            payload,
-            exchange='geonode',
-            serializer=task_serializer,
-            routing_key='email',
-            timeout=broker_socket_timeout
-        )
-        producer.release()
 
 
 @sync_if_local_memory
-def geoserver_upload_layer(payload):
-    with producers[connection].acquire(block=True, timeout=broker_socket_timeout) as producer:
-        maybe_declare(queue_geoserver_events, producer.channel)
-        producer.publish(
-            payload,
-            exchange='geonode',
-            serializer=task_serializer,
-            routing_key='geonode.geoserver',
-            timeout=broker_socket_timeout
-        )
-        producer.release()
+def send_email_producer(layer_uuid, user_id):
+    payload = {
+        "layer_uuid": layer_uuid,
+        "user_id": user_id
+    }
+    publish(payload, 'email')
 
 
 @sync_if_local_memory
-def notifications_send(payload, created=None):
-    with producers[connection].acquire(block=True, timeout=broker_socket_timeout) as producer:
-        maybe_declare(queue_notifications_events, producer.channel)
-        payload['created'] = created
-        producer.publish(
-            payload,
-            exchange='geonode',
-            serializer=task_serializer,
-            routing_key='notifications',
-            timeout=broker_socket_timeout
-        )
-        producer.release()
+def geoserver_upload_layer(payload):
+    publish(payload, 'geonode.geoserver')
 
 
 @sync_if_local_memory
-def viewing_layer(user, owner, layer_id):
-    with producers[connection].acquire(block=True, timeout=broker_socket_timeout) as producer:
-        maybe_declare(queue_layer_viewers, producer.channel)
-        payload = {"viewer": user,
-                   "owner_layer": owner,
-                   "layer_id": layer_id}
-        producer.publish(
-            payload,
-            exchange='geonode',
-            serializer=task_serializer,
-            routing_key='geonode.viewer',
-            timeout=broker_socket_timeout
-        )
-        producer.release()
+def notifications_send(payload, created=None):
+    payload['created'] = created
+    publish(payload, 'notifications')
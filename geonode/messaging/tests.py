@@ -20,7 +20,9 @@
 
 from geonode.tests.base import GeoNodeBaseTestSupport
 
-from geonode.messaging import connection
+from unittest.mock import patch
+
+from geonode.messaging import connection, producer
 from geonode.messaging.consumer import Consumer
 
 
@@ -36,6 +38,11 @@ class MessagingTest(GeoNodeBaseTestSupport):
 
         self.adm_un = "admin"
         self.adm_pw = "admin"
+        self.outbox = producer.Outbox(maxlen=2, retry_interval=60)
+
+    def tearDown(self):
+        self.outbox.stop()
+        super(MessagingTest, self).tearDown()
 
     def test_consumer(self):
         with connection:
@@ -44,3 +51,26 @@ class MessagingTest(GeoNodeBaseTestSupport):
                 self.assertTrue(worker is not None)
             except Exception:
                 self.fail("could not create a Consumer.")
+
+    def test_producer_outbox(self):
+        outbox = self.outbox
+        with patch('geonode.messaging.producer.outbox', outbox), \
+                patch('geonode.messaging.producer.is_local_memory', return_value=False), \
+                patch('geonode.messaging.producer._publish', side_effect=Exception("broker down")):
+            # Fire and forget never raises, the messages are kept until the broker comes back
+            producer.publish({"layer_id": 1}, 'geonode.viewer', fire_and_forget=True)
+            producer.publish({"layer_id": 2}, 'geonode.viewer', fire_and_forget=True)
+            producer.publish({"layer_id": 3}, 'geonode.viewer', fire_and_forget=True)
+            self.assertEqual(producer.stats()['outbox'], 2)
+            self.assertEqual(outbox.messages[-1], ({"layer_id": 3}, 'geonode.viewer'))
+
+            with self.assertRaises(Exception):
+                producer.publish({"layer_id": 4}, 'geonode.viewer', fire_and_forget=False)
+
+    def test_queues_are_declared_again_after_a_connection_error(self):
+        producer.QUEUES_DECLARED = True
+        with patch('geonode.messaging.producer.producers') as producers:
+            producers[connection].acquire.side_effect = connection.connection_errors[0]("broker restarted")
+            with self.assertRaises(connection.connection_errors):
+                producer._publish({"layer_id": 1}, 'geonode.viewer')
+        self.assertFalse(producer.QUEUES_DECLARED)
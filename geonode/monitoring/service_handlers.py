@@ -23,6 +23,7 @@ import pytz
 from datetime import datetime, timedelta
 
 import requests
+from geonode.base.counters import view_counter
 from geonode.monitoring.utils import GeoServerMonitorClient
 from geonode.monitoring.probes import get_probe
 from geonode.monitoring.models import RequestEvent, ExceptionEvent
@@ -87,6 +88,8 @@ class GeoNodeServiceExpose(BaseServiceExpose):
         for e in ExceptionEvent.objects.filter(created__gte=since, service__service_type__name=self.NAME):
             exceptions.append(e.expose())
         data['exceptions'] = exceptions
+        # the views of the resources waiting to be flushed by this process
+        data['popular_count'] = view_counter.stats()
         return data
 
 
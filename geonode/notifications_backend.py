@@ -21,7 +21,7 @@ import logging
 
 from django.conf import settings
 from django.core.mail import send_mail, get_connection, EmailMessage
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string, select_template
 from django.utils.translation import ugettext
 
 from pinax.notifications.backends.base import BaseBackend
@@ -32,13 +32,58 @@ logger = logging.getLogger(__name__)
 class EmailBackend(BaseBackend):
     spam_sensitivity = 2
 
+    # {notice type label: whether its messages depend on the recipient}
+    _per_recipient_templates = {}
+
     def can_send(self, user, notice_type, scoping):
         can_send = super(EmailBackend, self).can_send(user, notice_type, scoping)
         if can_send and user.email:
             return True
         return False
 
-    def deliver(self, recipient, sender, notice_type, extra_context):
+    def can_send_batch(self, users, notice_type):
+        """
+        The users to whom the notice can be sent; the notice settings of all of
+        them are loaded with a single query.
+        """
+        from pinax.notifications.models import NoticeSetting
+
+        settings_send = dict(NoticeSetting.objects.filter(
+            user__in=[_u for _u in users if _u.email],
+            notice_type=notice_type,
+            medium=self.medium_id,
+            scoping_content_type__isnull=True,
+            scoping_object_id__isnull=True).values_list('user_id', 'send'))
+        recipients = []
+        for user in users:
+            if not user.email:
+                continue
+            if user.id in settings_send:
+                if settings_send[user.id]:
+                    recipients.append(user)
+            # missing settings are created with the defaults
+            elif self.can_send(user, notice_type, None):
+                recipients.append(user)
+        return recipients
+
+    def _uses_recipient(self, label):
+        if label not in self._per_recipient_templates:
+            try:
+                sources = [
+                    select_template((
+                        f"pinax/notifications/{label}/{fmt}",
+                        f"pinax/notifications/{fmt}")).template.source
+                    for fmt in ("short.txt", "full.txt")]
+                sources += [
+                    get_template(_name).template.source
+                    for _name in ("pinax/notifications/email_subject.txt", "pinax/notifications/email_body.txt")]
+                self._per_recipient_templates[label] = any('recipient' in _source for _source in sources)
+            except Exception as e:
+                logger.debug(e)
+                self._per_recipient_templates[label] = True
+        return self._per_recipient_templates[label]
+
+    def _render(self, recipient, sender, notice_type, extra_context):
         context = self.default_context()
         context.update({
             "recipient": recipient,
@@ -61,7 +106,9 @@ class EmailBackend(BaseBackend):
             "message": messages["full.txt"]
         })
         body = render_to_string("pinax/notifications/email_body.txt", context)
+        return subject, body
 
+    def _email(self, recipient, subject, body):
         email = EmailMessage(
             subject=subject,
             body=body,
@@ -69,6 +116,11 @@ class EmailBackend(BaseBackend):
             to=[recipient.email, ],
             reply_to=[settings.DEFAULT_FROM_EMAIL, ])
         email.content_subtype = "html"
+        return email
+
+    def deliver(self, recipient, sender, notice_type, extra_context):
+        subject, body = self._render(recipient, sender, notice_type, extra_context)
+        email = self._email(recipient, subject, body)
 
         # TODO: require this to be passed in extra_context
         connection = get_connection()
@@ -83,3 +135,36 @@ class EmailBackend(BaseBackend):
         finally:
             # We need to manually close the connection.
             connection.close()
+
+    def deliver_batch(self, recipients, sender, notice_type, extra_context):
+        """
+        Delivers the notice to many recipients through a single connection.
+        The messages are rendered once, unless the templates of the notice
+        refer to the recipient.
+        """
+        per_recipient = self._uses_recipient(notice_type.label)
+        emails = []
+        rendered = None
+        for recipient in recipients:
+            if per_recipient or rendered is None:
+                rendered = self._render(recipient, sender, notice_type, extra_context)
+            emails.append(self._email(recipient, *rendered))
+
+        # The emails are sent one by one over the open connection, so that a
+        # failure only affects its own recipient
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            # send_messages() tries again to connect for each email
+            logger.exception(e)
+        try:
+            for email in emails:
+                try:
+                    connection.send_messages([email])
+                except Exception as e:
+                    logger.error(f"Could not send the notification to {email.to}: {e}")
+                    # reconnect for the next ones
+                    connection.close()
+        finally:
+            connection.close()
@@ -24,6 +24,7 @@ from importlib import import_module
 
 from django.apps import AppConfig
 from django.conf import settings
+from django.db import transaction
 from django.db.models import signals, Q
 from django.contrib.auth import get_user_model
 
@@ -70,7 +71,8 @@ def call_celery(func):
     def wrap(*args, **kwargs):
         ret = func(*args, **kwargs)
         if settings.PINAX_NOTIFICATIONS_QUEUE_ALL:
-            send_queued_notifications.apply_async()
+            # the queued batch is visible to the workers only after the commit
+            transaction.on_commit(send_queued_notifications.apply_async)
         return ret
 
     return wrap
@@ -109,8 +111,113 @@ def queue_notification(*args, **kwargs):
         return notifications.models.queue(*args, **kwargs)
 
 
+def send_notifications_batch(users, label, extra_context=None, sender=None):
+    """
+    Sends a notification to many users at once.
+
+    Same as notifications.models.send_now, but the users are loaded with one
+    query and each backend gets all the recipients of a language at once:
+    the ones implementing `can_send_batch` and `deliver_batch` can then look
+    up the notice settings and render and send the messages in bulk.
+    """
+    if not has_notifications:
+        return 0
+    from django.utils.translation import get_language, activate
+    backends = import_module(f"{M}.conf").settings.PINAX_NOTIFICATIONS_BACKENDS
+
+    notice_type = notifications.models.NoticeType.objects.get(label=label)
+    users = get_user_model().objects.filter(id__in=[getattr(_u, 'pk', _u) for _u in users])
+    by_language = {}
+    for user in users:
+        try:
+            language = notifications.models.get_notification_language(user)
+        except notifications.models.LanguageStoreNotAvailable:
+            language = None
+        by_language.setdefault(language, []).append(user)
+
+    sent = 0
+    current_language = get_language()
+    try:
+        for language, recipients in by_language.items():
+            if language is not None:
+                activate(language)
+            for backend in backends.values():
+                if hasattr(backend, 'can_send_batch'):
+                    _recipients = backend.can_send_batch(recipients, notice_type)
+                else:
+                    _recipients = [_u for _u in recipients if backend.can_send(_u, notice_type, scoping=None)]
+                if not _recipients:
+                    continue
+                if hasattr(backend, 'deliver_batch'):
+                    backend.deliver_batch(_recipients, sender, notice_type, extra_context or {})
+                else:
+                    for recipient in _recipients:
+                        backend.deliver(recipient, sender, notice_type, extra_context or {})
+                sent += len(_recipients)
+    finally:
+        activate(current_language)
+    return sent
+
+
+def send_queued_notifications_batches():
+    """
+    Sends the notifications queued by queue_notification, one batch of
+    recipients per queued notice. Several workers can run it at once.
+    """
+    if not has_notifications:
+        return 0
+    import pickle
+    import base64
+    NoticeQueueBatch = notifications.models.NoticeQueueBatch
+
+    sent = 0
+    while True:
+        with transaction.atomic():
+            queued_batch = NoticeQueueBatch.objects.select_for_update(skip_locked=True).order_by('pk').first()
+            if queued_batch is None:
+                break
+            notices = {}
+            for user, label, extra_context, sender in pickle.loads(base64.b64decode(queued_batch.pickled_data)):
+                # the notices queued together share their label, context and sender
+                key = (label, id(extra_context), id(sender))
+                notices.setdefault(key, (label, extra_context, sender, []))[3].append(user)
+            for label, extra_context, sender, users in notices.values():
+                try:
+                    sent += send_notifications_batch(users, label, extra_context, sender)
+                except Exception as e:
+                    logger.exception(e)
+                    logger.error(f"Could not send the '{label}' notifications to {len(users)} users")
+            queued_batch.delete()
+    return sent
+
+
+def get_resource_viewers(resource):
+    """
+    A filter on the users matching the ones allowed to view the resource:
+    the superusers and the active users holding 'view_resourcebase' directly
+    or through one of their groups.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from guardian.models import UserObjectPermission, GroupObjectPermission
+
+    viewers = Q(is_superuser=True)
+    if resource.pk:
+        perm_filter = dict(
+            permission__codename='view_resourcebase',
+            content_type=ContentType.objects.get_by_natural_key('base', 'resourcebase'),
+            object_pk=str(resource.pk))
+        users = UserObjectPermission.objects.filter(**perm_filter).values('user')
+        groups = GroupObjectPermission.objects.filter(**perm_filter).values('group')
+        members = get_user_model().groups.through.objects.filter(group__in=groups).values('user')
+        viewers |= Q(is_active=True) & (Q(id__in=users) | Q(id__in=members))
+    return viewers
+
+
 def get_notification_recipients(notice_type_label, exclude_user=None, resource=None):
     """ Get notification recipients
+
+    The users subscribed to the notice type and, for a resource, allowed to
+    view it, resolved with a single query.
     """
     if not has_notifications:
         return []
@@ -119,25 +226,21 @@ def get_notification_recipients(notice_type_label, exclude_user=None, resource=N
         .values('user')
 
     profiles = get_user_model().objects.filter(id__in=recipients_ids)
-    exclude_users_ids = []
     if exclude_user:
-        exclude_users_ids.append(exclude_user.id)
+        profiles = profiles.exclude(id=exclude_user.id)
     if resource and resource.title:
-        for user in profiles:
-            try:
-                if not user.is_superuser and \
-                not user.has_perm('view_resourcebase', resource.get_self_resource()):
-                    exclude_users_ids.append(user.id)
-                if user.pk == resource.owner.pk and \
-                not notice_type_label.split("_")[-1] in ("updated", "rated", "comment", "approved", "published"):
-                    exclude_users_ids.append(user.id)
-            except Exception:
-                # fallback which wont send mails
-                tb = traceback.format_exc()
-                logger.error(tb)
-                logger.exception("Could not send notifications.")
-                return []
-    return profiles.exclude(id__in=exclude_users_ids)
+        try:
+            profiles = profiles.filter(get_resource_viewers(resource))
+            if resource.owner_id and \
+            not notice_type_label.split("_")[-1] in ("updated", "rated", "comment", "approved", "published"):
+                profiles = profiles.exclude(id=resource.owner_id)
+        except Exception:
+            # fallback which wont send mails
+            tb = traceback.format_exc()
+            logger.error(tb)
+            logger.exception("Could not send notifications.")
+            return []
+    return profiles
 
 
 def get_comment_notification_recipients(notice_type_label, instance_owner, exclude_user=None, resource=None):
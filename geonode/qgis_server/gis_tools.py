@@ -23,7 +23,7 @@ import traceback
 from urllib.parse import urlencode
 from urllib.request import urlretrieve
 from os.path import splitext
-from math import atan, degrees, sinh, pi
+from math import atan, cos, degrees, log, radians, sinh, tan, pi
 from defusedxml import lxml as dlxml
 
 from django.conf import settings as geonode_config
@@ -162,3 +162,27 @@ def num2deg(x_tile, y_tile, zoom):
     lat_rad = atan(sinh(pi * (1 - 2 * y_tile / n)))
     lat_deg = degrees(lat_rad)
     return lat_deg, lon_deg
+
+
+def deg2num(lat_deg, lon_deg, zoom):
+    """Conversion of lat/lon coordinates to X,Y for a zoom level
+    See http://wiki.openstreetmap.org/wiki/Slippy_map_tilenames
+
+    :param lat_deg: The latitude, clamped to the Web Mercator bounds.
+    :type lat_deg: float
+
+    :param lon_deg: The longitude.
+    :type lon_deg: float
+
+    :param zoom: The zoom level, usually between 0 and 20.
+    :type zoom: integer
+
+    :return: Tuple (x_tile, y_tile).
+    :rtype: tuple
+    """
+    n = 2 ** zoom
+    lat_deg = max(min(lat_deg, 85.0511), -85.0511)
+    lat_rad = radians(lat_deg)
+    x_tile = int((lon_deg + 180.0) / 360.0 * n)
+    y_tile = int((1.0 - log(tan(lat_rad) + 1 / cos(lat_rad)) / pi) / 2.0 * n)
+    return min(max(x_tile, 0), n - 1), min(max(y_tile, 0), n - 1)
@@ -23,6 +23,8 @@ import os
 import re
 import shutil
 import json
+import tempfile
+from io import BytesIO
 from urllib.parse import unquote, urljoin
 
 import requests
@@ -33,6 +35,7 @@ from django.contrib.gis.geos import GEOSGeometry, Point
 from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse
 from defusedxml import lxml as dlxml
+from PIL import Image
 from requests import Request
 
 from geonode.compat import ensure_string
@@ -56,6 +59,8 @@ elif check_ogc_backend(qgis_server.BACKEND_PACKAGE):
 
 logger = logging.getLogger("geonode.qgis_server.helpers")
 
+TILE_SIZE = 256
+
 
 def validate_django_settings():
     """Check that settings file configured correctly for qgis_server backend.
@@ -223,6 +228,44 @@ def tile_url(layer, z, x, y, style=None, internal=True):
     :return: Tile url
     :rtype: str
     """
+    return metatile_url(layer, z, x, y, style=style, internal=internal)
+
+
+def metatile_url(layer, z, x, y, columns=1, rows=1, style=None,
+                 internal=True):
+    """Construct a GetMap request to QGIS Server for a block of tiles.
+
+    The block starts at the tile x, y and spans columns x rows tiles, so
+    that a single QGIS Server render can be sliced into several tiles.
+
+    :param layer: Layer to use
+    :type layer: Layer
+
+    :param z: TMS coordinate, zoom parameter
+    :type z: int, str
+
+    :param x: TMS coordinate of the top left tile, longitude parameter
+    :type x: int, str
+
+    :param y: TMS coordinate of the top left tile, latitude parameter
+    :type y: int, str
+
+    :param columns: Number of tiles of the block along the x axis
+    :type columns: int
+
+    :param rows: Number of tiles of the block along the y axis
+    :type rows: int
+
+    :param style: Layer style to choose
+    :type style: str
+
+    :param internal: Flag to switch between public url and internal url.
+        Public url will be served by Django Geonode (proxified).
+    :type internal: bool
+
+    :return: GetMap url
+    :rtype: str
+    """
     try:
         qgis_layer = QGISServerLayer.objects.get(layer=layer)
     except QGISServerLayer.DoesNotExist:
@@ -237,7 +280,7 @@ def tile_url(layer, z, x, y, style=None, internal=True):
 
     # Call the WMS
     top, left = num2deg(x, y, z)
-    bottom, right = num2deg(x + 1, y + 1, z)
+    bottom, right = num2deg(x + columns, y + rows, z)
 
     transform = CoordTransform(SpatialReference(4326), SpatialReference(3857))
     top_left_corner = Point(left, top, srid=4326)
@@ -265,8 +308,8 @@ def tile_url(layer, z, x, y, style=None, internal=True):
         'REQUEST': 'GetMap',
         'BBOX': bbox,
         'CRS': 'EPSG:3857',
-        'WIDTH': '256',
-        'HEIGHT': '256',
+        'WIDTH': str(TILE_SIZE * columns),
+        'HEIGHT': str(TILE_SIZE * rows),
         'MAP': qgis_layer.qgis_project_path,
         'LAYERS': layer.name,
         'STYLE': style,
@@ -282,6 +325,88 @@ def tile_url(layer, z, x, y, style=None, internal=True):
     return url
 
 
+def render_metatile(layer, z, x, y, style, size=None, overwrite=True):
+    """Render the metatile containing a tile and slice it into the cache.
+
+    A single GetMap of size x size tiles is requested to QGIS Server, which
+    pays the project load and label placement only once, and then cut into
+    256px tiles written atomically in the tile_path cache layout.
+
+    :param layer: Layer to use
+    :type layer: Layer
+
+    :param z: TMS coordinate, zoom parameter
+    :type z: int
+
+    :param x: TMS coordinate of any tile of the metatile
+    :type x: int
+
+    :param y: TMS coordinate of any tile of the metatile
+    :type y: int
+
+    :param style: Layer style name, used for the cache path
+    :type style: str
+
+    :param size: Number of tiles per side of the metatile. Defaults to the
+        metatile_size option of QGIS_SERVER_CONFIG.
+    :type size: int
+
+    :param overwrite: Set False to skip the render if every tile of the
+        metatile is already cached.
+    :type overwrite: bool
+
+    :return: List of the written tile paths
+    :rtype: list
+    """
+    qgis_layer = QGISServerLayer.objects.get(layer=layer)
+    if not size:
+        size = settings.QGIS_SERVER_CONFIG.get('metatile_size', 4)
+    tiles_count = 2 ** int(z)
+    size = max(1, min(int(size), tiles_count))
+    x0 = int(x) // size * size
+    y0 = int(y) // size * size
+    columns = min(size, tiles_count - x0)
+    rows = min(size, tiles_count - y0)
+
+    tile_path = settings.QGIS_SERVER_CONFIG['tile_path']
+    tiles = [
+        (i, j, tile_path % (qgis_layer.qgis_layer_name, style, z, x0 + i, y0 + j))
+        for i in range(columns) for j in range(rows)]
+    if not overwrite and all(os.path.exists(t[2]) for t in tiles):
+        return []
+
+    url = metatile_url(
+        layer, z, x0, y0, columns=columns, rows=rows, style=style)
+    response = requests.get(url)
+    if response.status_code != 200 or 'image/png' not in response.headers.get(
+            'Content-Type', ''):
+        raise Exception(
+            'Failed to fetch metatile {url}: {content}'.format(
+                url=url, content=ensure_string(response.content)))
+    image = Image.open(BytesIO(response.content))
+    image.load()
+
+    written = []
+    for i, j, tile_filename in tiles:
+        tile_dir = os.path.dirname(tile_filename)
+        os.makedirs(tile_dir, exist_ok=True)
+        tile = image.crop((
+            i * TILE_SIZE, j * TILE_SIZE,
+            (i + 1) * TILE_SIZE, (j + 1) * TILE_SIZE))
+        fd, temp_file = tempfile.mkstemp(
+            dir=tile_dir, prefix='.{}.'.format(os.path.basename(tile_filename)))
+        try:
+            with os.fdopen(fd, 'wb') as out_file:
+                tile.save(out_file, 'PNG')
+            os.chmod(temp_file, 0o644)
+            os.replace(temp_file, tile_filename)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        written.append(tile_filename)
+    return written
+
+
 def map_thumbnail_url(instance, bbox=None, internal=True):
     """Construct QGIS Server Url to fetch remote map thumbnail.
 
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2016 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+from django.core.management.base import BaseCommand, CommandError
+
+from geonode.layers.models import Layer
+from geonode.qgis_server.gis_tools import deg2num
+from geonode.qgis_server.helpers import (
+    render_metatile,
+    style_list,
+    transform_layer_bbox)
+from geonode.qgis_server.models import QGISServerLayer
+
+logger = logging.getLogger(__name__)
+
+
+def _metatiles(bbox, min_zoom, max_zoom, size):
+    """Yield the (z, x, y) origins of the metatiles covering a 4326 bbox."""
+    x_min, y_min, x_max, y_max = bbox
+    for z in range(min_zoom, max_zoom + 1):
+        step = min(size, 2 ** z)
+        left, top = deg2num(y_max, x_min, z)
+        right, bottom = deg2num(y_min, x_max, z)
+        for x in range(left // step * step, right + 1, step):
+            for y in range(top // step * step, bottom + 1, step):
+                yield z, x, y
+
+
+def _render(layer, z, x, y, style, size, overwrite):
+    try:
+        return render_metatile(
+            layer, z, x, y, style, size=size, overwrite=overwrite)
+    finally:
+        connections.close_all()
+
+
+def _folder_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                size += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return size
+
+
+class Command(BaseCommand):
+    help = ("Pre-render the QGIS Server tiles of one or more layers over "
+            "their bounding box, for a range of zoom levels.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'layers',
+            nargs='+',
+            help='Names of the layers to seed.')
+        parser.add_argument(
+            '--min-zoom',
+            dest='min_zoom',
+            type=int,
+            default=0,
+            help='First zoom level to seed (default: 0).')
+        parser.add_argument(
+            '--max-zoom',
+            dest='max_zoom',
+            type=int,
+            default=12,
+            help='Last zoom level to seed (default: 12).')
+        parser.add_argument(
+            '-s',
+            '--style',
+            dest='style',
+            default=None,
+            help='Style to render (default: the layer default style).')
+        parser.add_argument(
+            '-m',
+            '--metatile-size',
+            dest='metatile_size',
+            type=int,
+            default=None,
+            help='Number of tiles per side of each rendered metatile '
+                 '(default: the metatile_size option of QGIS_SERVER_CONFIG, or 4).')
+        parser.add_argument(
+            '-w',
+            '--workers',
+            dest='workers',
+            type=int,
+            default=4,
+            help='Number of concurrent renders (default: 4).')
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            dest='overwrite',
+            default=False,
+            help='Render again the tiles which are already cached.')
+
+    def handle(self, *args, **options):
+        min_zoom = max(options['min_zoom'], 0)
+        max_zoom = options['max_zoom']
+        if max_zoom < min_zoom:
+            raise CommandError('--max-zoom must be greater than --min-zoom')
+        size = max(options['metatile_size'] or settings.QGIS_SERVER_CONFIG.get(
+            'metatile_size', 4), 1)
+        workers = max(options['workers'], 1)
+
+        for name in options['layers']:
+            try:
+                layer = Layer.objects.get(name=name)
+                qgis_layer = QGISServerLayer.objects.get(layer=layer)
+            except (Layer.DoesNotExist, QGISServerLayer.DoesNotExist):
+                raise CommandError(
+                    'Layer {} has no associated qgis_layer'.format(name))
+
+            style = options['style']
+            if not style:
+                if not qgis_layer.default_style:
+                    try:
+                        style_list(layer, internal=False)
+                    except Exception:
+                        logger.warning("Failed to fetch styles")
+                    qgis_layer.refresh_from_db()
+                if qgis_layer.default_style:
+                    style = qgis_layer.default_style.name
+
+            bbox = transform_layer_bbox(layer, 4326)
+            metatiles = list(_metatiles(bbox, min_zoom, max_zoom, size))
+            self.stdout.write(
+                'Seeding {} metatiles of layer {} (style {}), zoom {}-{}'.format(
+                    len(metatiles), name, style, min_zoom, max_zoom))
+
+            tiles = 0
+            failed = 0
+            start = time.time()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(
+                        _render, layer, z, x, y, style, size,
+                        options['overwrite'])
+                    for z, x, y in metatiles]
+                for done, future in enumerate(as_completed(futures), 1):
+                    try:
+                        tiles += len(future.result())
+                    except Exception as e:
+                        failed += 1
+                        logger.error(e)
+                    if done % 10 == 0 or done == len(futures):
+                        elapsed = time.time() - start
+                        self.stdout.write(
+                            '{}/{} metatiles, {} tiles, {:.1f} tiles/s'.format(
+                                done, len(futures), tiles,
+                                tiles / elapsed if elapsed else 0))
+
+            layer_cache = os.path.join(
+                settings.QGIS_SERVER_CONFIG['tiles_directory'],
+                qgis_layer.qgis_layer_name)
+            self.stdout.write(
+                'Layer {}: {} tiles rendered, {} metatiles failed in {:.1f}s; '
+                'cache size {:.1f} MB'.format(
+                    name, tiles, failed, time.time() - start,
+                    _folder_size(layer_cache) / (1024.0 * 1024.0)))
@@ -18,9 +18,12 @@
 #
 #########################################################################
 
+import os
 import logging
 import shutil
 import socket
+import tempfile
+from imghdr import what as image_format
 
 import requests
 from django.apps import apps
@@ -116,7 +119,7 @@ def create_qgis_server_thumbnail(model_path, object_id, overwrite=False, bbox=No
     name='geonode.qgis_server.tasks.update.cache_request',
     queue='update')
 @on_ogc_backend(qgis_server.BACKEND_PACKAGE)
-def cache_request(self, url, cache_file):
+def cache_request(self, url, cache_file, image_type=None):
     """Cache a given url request to a file.
 
     On some rare occasions, QGIS Server url request is taking too long to
@@ -135,6 +138,11 @@ def cache_request(self, url, cache_file):
     :param cache_file: The target file path to save the cache
     :type cache_file: str
 
+    :param image_type: The expected image format of the response (e.g. png).
+        When set, the content is validated once here, before being moved
+        into place, so readers of the cache never need to check it again.
+    :type image_type: str
+
     :return: True if succeeded
     :rtype: bool
     """
@@ -153,9 +161,25 @@ def cache_request(self, url, cache_file):
             content=ensure_string(response.content))
         raise HTTPError(msg)
 
-    with open(cache_file, 'wb') as out_file:
-        shutil.copyfileobj(response.raw, out_file)
-
-    del response
+    # Write to a temporary file first, so that concurrent readers never
+    # see a partially written cache file.
+    fd, temp_file = tempfile.mkstemp(
+        dir=os.path.dirname(cache_file),
+        prefix='.{}.'.format(os.path.basename(cache_file)))
+    try:
+        with os.fdopen(fd, 'wb') as out_file:
+            shutil.copyfileobj(response.raw, out_file)
+        del response
+
+        if image_type and image_format(temp_file) != image_type:
+            logger.error('{url} is not a valid {image_type}.'.format(
+                url=url, image_type=image_type))
+            return False
+
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, cache_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
     return True
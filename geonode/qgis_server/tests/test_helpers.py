@@ -47,7 +47,7 @@ from geonode.qgis_server.helpers import get_model_path, \
     validate_django_settings, transform_layer_bbox, \
     qgis_server_endpoint, tile_url_format, tile_url, \
     style_get_url, style_add_url, style_list, style_set_default_url, \
-    style_remove_url
+    style_remove_url, metatile_url, render_metatile
 
 
 class HelperTest(GeoNodeBaseTestSupport):
@@ -146,6 +146,36 @@ class HelperTest(GeoNodeBaseTestSupport):
 
         uploaded.delete()
 
+    @on_ogc_backend(qgis_server.BACKEND_PACKAGE)
+    def test_render_metatile(self):
+        """Test to slice a metatile into the tiles cache."""
+        filename = os.path.join(gisdata.GOOD_DATA, 'raster/test_grid.tif')
+        uploaded = file_upload(filename)
+
+        qgis_metatile_url = metatile_url(
+            uploaded, 11, 1576, 1054, columns=2, rows=2, internal=True)
+        query_string = parse_qs(urlparse(qgis_metatile_url).query)
+        self.assertEqual(query_string['WIDTH'][0], '512')
+        self.assertEqual(query_string['HEIGHT'][0], '512')
+
+        qgis_layer = QGISServerLayer.objects.get(layer=uploaded)
+        tiles = render_metatile(uploaded, 11, 1577, 1055, 'default', size=2)
+        self.assertEqual(len(tiles), 4)
+        self.assertIn(
+            settings.QGIS_SERVER_CONFIG['tile_path'] % (
+                qgis_layer.qgis_layer_name, 'default', 11, 1576, 1054),
+            tiles)
+        for tile in tiles:
+            self.assertEqual(what(tile), 'png')
+
+        # Cached tiles are not rendered again
+        self.assertEqual(
+            render_metatile(
+                uploaded, 11, 1576, 1054, 'default', size=2, overwrite=False),
+            [])
+
+        uploaded.delete()
+
     @on_ogc_backend(qgis_server.BACKEND_PACKAGE)
     def test_style_management_url(self):
         """Test QGIS Server style management url construction."""
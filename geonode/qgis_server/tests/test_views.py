@@ -28,12 +28,14 @@ import zipfile
 from imghdr import what
 
 import requests
+from unittest import mock
 from defusedxml import lxml as dlxml
 
 import gisdata
 from django.conf import settings
 from django.contrib.staticfiles.templatetags import staticfiles
 from django.core.files.storage import default_storage as storage
+from django.test import SimpleTestCase
 from django.urls import reverse
 
 from geonode import qgis_server
@@ -118,7 +120,14 @@ class QGISServerViewsTest(GeoNodeBaseTestSupport):
             reverse('qgis_server:tile', kwargs=coordinates))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get('Content-Type'), 'image/png')
-        self.assertEqual(what('', h=ensure_string(response.content)), 'png')
+        content = b''.join(response.streaming_content)
+        self.assertEqual(what('', h=content), 'png')
+
+        # Cached tile, not modified
+        response = self.client.get(
+            reverse('qgis_server:tile', kwargs=coordinates),
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
 
         # Tile 404
         response = self.client.get(
@@ -427,6 +436,29 @@ class QGISServerViewsTest(GeoNodeBaseTestSupport):
         layer2.delete()
 
 
+class TileRenderTest(SimpleTestCase):
+
+    @on_ogc_backend(qgis_server.BACKEND_PACKAGE)
+    @mock.patch('geonode.qgis_server.views.cache')
+    @mock.patch('geonode.qgis_server.views.cache_request')
+    def test_render_tile_timeout(self, cache_request, cache):
+        """Test a render timing out is reported and releases the tile."""
+        from celery.exceptions import TimeoutError as CeleryTimeoutError
+        from geonode.qgis_server import views
+
+        cache.add.return_value = True
+        cache_request.apply_async.return_value.get.side_effect = CeleryTimeoutError()
+        tile_filename = os.path.join(settings.MEDIA_ROOT, 'missing_tile.png')
+        with self.assertRaises(CeleryTimeoutError):
+            views._render_tile('http://qgis-server/tile', tile_filename)
+        self.assertNotIn(tile_filename, views.TILE_RENDERS)
+        cache.delete.assert_called_once()
+
+        cache_request.apply_async.return_value.get.side_effect = None
+        cache_request.apply_async.return_value.get.return_value = True
+        self.assertTrue(views._render_tile('http://qgis-server/tile', tile_filename))
+
+
 class QGISServerStyleManagerTest(GeoNodeBaseTestSupport):
 
     fixtures = ['initial_data.json', 'people_data.json']
@@ -25,20 +25,28 @@ import json
 import logging
 import zipfile
 
+import time
 import shutil
+import hashlib
 import datetime
 import requests
+import threading
 from imghdr import what as image_format
 
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+
 from django.conf import settings
 from django.urls import reverse
 from django.forms.models import model_to_dict
-from django.http import HttpResponse, Http404
+from django.core.cache import cache
+from django.http import HttpResponse, Http404, FileResponse
 from django.http.response import (
     HttpResponseBadRequest,
     HttpResponseServerError)
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.utils.translation import ugettext as _
 
 from geonode.compat import ensure_string
@@ -62,6 +70,11 @@ logger = logging.getLogger('geonode.qgis_server.views')
 
 QGIS_SERVER_CONFIG = settings.QGIS_SERVER_CONFIG if hasattr(settings, 'QGIS_SERVER_CONFIG') else None
 
+# The renders of the tiles in progress in this process, {tile filename: Event},
+# to coalesce the requests of the same tile
+TILE_RENDERS = {}
+TILE_RENDERS_LOCK = threading.Lock()
+
 
 def download_zip(request, layername):
     """Download a zip file containing every files we have about the layer.
@@ -322,25 +335,98 @@ def tile(request, layername, z, x, y, style=None):
     if not os.path.exists(tile_filename):
 
         if not os.path.exists(os.path.dirname(tile_filename)):
-            os.makedirs(os.path.dirname(tile_filename))
+            os.makedirs(os.path.dirname(tile_filename), exist_ok=True)
         # Use internal url
         url = tile_url(layer, z, x, y, style=style, internal=True)
-        result = cache_request.apply_async((url, tile_filename))
 
-        # Attempt to run task synchronously
-        if not result.get():
+        try:
+            rendered = _render_tile(url, tile_filename)
+        except CeleryTimeoutError:
+            return HttpResponse('Timed out rendering the tile.', status=504)
+        if not rendered:
             # If not succeded, provides error message.
             return HttpResponseServerError('Failed to fetch tile.')
 
-    if image_format(tile_filename) != 'png':
-        logger.error('%s is not valid PNG.' % tile_filename)
-        os.remove(tile_filename)
-
-    if not os.path.exists(tile_filename):
+    # Tiles are validated by cache_request before being moved into place,
+    # so we can stream the cached file as is.
+    try:
+        stat = os.stat(tile_filename)
+    except OSError:
         return HttpResponse('The tile could not be found.', status=409)
 
-    with open(tile_filename, 'rb') as f:
-        return HttpResponse(f.read(), content_type='image/png')
+    etag = '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(
+            open(tile_filename, 'rb'), content_type='image/png')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _render_tile(url, tile_filename):
+    """Render a tile in the cache, coalescing concurrent requests.
+
+    Only one render per tile is dispatched at a time: requests for the same
+    tile in this process wait for its render to end, while requests served by
+    other processes wait for the render lock stored in the cache to be released.
+    The lock of the renders in progress is only held to check and update them.
+
+    :param url: The internal QGIS Server url of the tile.
+    :type url: str
+
+    :param tile_filename: The path of the tile in the cache.
+    :type tile_filename: str
+
+    :return: True if the tile is available in the cache.
+    :rtype: bool
+
+    :raises celery.exceptions.TimeoutError: When the render times out.
+    """
+    timeout = QGIS_SERVER_CONFIG.get('tile_render_timeout', 60)
+    with TILE_RENDERS_LOCK:
+        if os.path.exists(tile_filename):
+            return True
+        render = TILE_RENDERS.get(tile_filename)
+        if render is None:
+            render = TILE_RENDERS[tile_filename] = threading.Event()
+            rendering = True
+        else:
+            rendering = False
+
+    if not rendering:
+        # Another thread is already rendering this tile.
+        render.wait(timeout)
+        return os.path.exists(tile_filename)
+
+    try:
+        return _dispatch_tile_render(url, tile_filename, timeout)
+    finally:
+        with TILE_RENDERS_LOCK:
+            del TILE_RENDERS[tile_filename]
+        render.set()
+
+
+def _dispatch_tile_render(url, tile_filename, timeout):
+    """Render a tile unless another process is already rendering it."""
+    lock_key = 'qgis_server_tile:{}'.format(
+        hashlib.md5(tile_filename.encode('utf-8')).hexdigest())
+    if cache.add(lock_key, True, timeout):
+        try:
+            result = cache_request.apply_async(
+                (url, tile_filename), {'image_type': 'png'})
+            # Attempt to run task synchronously
+            return result.get(timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+
+    # Another process is already rendering this tile.
+    deadline = time.time() + timeout
+    while cache.get(lock_key) and time.time() < deadline:
+        time.sleep(0.05)
+    return os.path.exists(tile_filename)
 
 
 def layer_ogc_request(request, layername):
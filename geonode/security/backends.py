@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+from guardian.backends import ObjectPermissionBackend as GuardianObjectPermissionBackend, check_support
+from guardian.ctypes import get_content_type
+from guardian.exceptions import WrongAppError
+
+from .utils import get_permissions_checker
+
+
+class ObjectPermissionBackend(GuardianObjectPermissionBackend):
+    """
+    Guardian object permissions backend sharing the permissions checkers
+    inside `geonode.security.utils.object_permissions_cache`.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        support, user_obj = check_support(user_obj, obj)
+        if not support:
+            return False
+
+        if '.' in perm:
+            app_label, _ = perm.split('.', 1)
+            if app_label != obj._meta.app_label:
+                ctype = get_content_type(obj)
+                if app_label != ctype.app_label:
+                    raise WrongAppError(
+                        f"Passed perm has app label of '{app_label}' while given obj has app label "
+                        f"'{obj._meta.app_label}' and given obj content_type has app label '{ctype.app_label}'")
+
+        return get_permissions_checker(user_obj).has_perm(perm, obj)
+
+    def get_all_permissions(self, user_obj, obj=None):
+        support, user_obj = check_support(user_obj, obj)
+        if not support:
+            return set()
+        return get_permissions_checker(user_obj).get_perms(obj)
@@ -29,6 +29,7 @@ from django.utils.deprecation import MiddlewareMixin
 from geonode import geoserver
 from geonode.utils import check_ogc_backend
 from geonode.base.auth import get_token_object_from_session
+from geonode.security.utils import object_permissions_cache
 
 from guardian.shortcuts import get_anonymous_user
 
@@ -120,3 +121,19 @@ class SessionControlMiddleware(MiddlewareMixin):
                     '{login_path}?next={request_path}'.format(
                         login_path=self.redirect_to,
                         request_path=request.path))
+
+
+class ObjectPermissionsCacheMiddleware:
+    """
+    Shares the object permissions checks among the views and the templates of
+    the GET and HEAD requests, see `geonode.security.utils.object_permissions_cache`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        with object_permissions_cache():
+            return self.get_response(request)
@@ -20,13 +20,18 @@
 import logging
 import traceback
 
+from collections import defaultdict
+
 from django.conf import settings
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import signals
 
 from geonode.groups.conf import settings as groups_settings
 
+from guardian.models import UserObjectPermission, GroupObjectPermission
 from guardian.shortcuts import (
     assign_perm,
     get_groups_with_perms
@@ -35,11 +40,15 @@ from guardian.shortcuts import (
 from geonode.groups.models import GroupProfile
 
 from .utils import (
+    geofence_principal,
+    get_owner_permissions,
     get_users_with_perms,
     set_owner_permissions,
     remove_object_permissions,
     purge_geofence_layer_rules,
-    sync_geofence_with_guardian
+    sync_geofence_with_guardian,
+    bulk_set_object_permissions,
+    clear_object_permissions_cache
 )
 
 logger = logging.getLogger("geonode.security.models")
@@ -62,6 +71,24 @@ LAYER_ADMIN_PERMISSIONS = [
     'change_layer_style'
 ]
 
+# permissions granted on the layer itself rather than on its resource base
+LAYER_ONLY_PERMISSIONS = (
+    'change_layer_data',
+    'change_layer_style',
+    'add_layer',
+    'change_layer',
+    'delete_layer',
+)
+
+# permissions synchronized to GeoFence for the owner of a layer
+GEOFENCE_OWNER_PERMISSIONS = [
+    "view_resourcebase",
+    "change_layer_data",
+    "change_layer_style",
+    "change_resourcebase",
+    "change_resourcebase_permissions",
+    "download_resourcebase"]
+
 
 class PermissionLevelError(Exception):
     pass
@@ -257,92 +284,71 @@ class PermissionLevelMixin(object):
                 ...
                 ]
         }
+
+        Only the difference with the current permissions is written, and only the
+        users and groups whose permissions changed get their GeoFence rules updated.
         """
-        remove_object_permissions(self)
+        users = perm_spec.get('users') or {}
+        groups = perm_spec.get('groups') or {}
+
+        _users = {_u.username: _u for _u in get_user_model().objects.filter(
+            username__in=[_u for _u in users if _u != "AnonymousUser"])}
+        _group_names = list(groups) + (['anonymous'] if "AnonymousUser" in users else [])
+        _groups = {_g.name: _g for _g in Group.objects.filter(name__in=_group_names)}
+        for _username in users:
+            if _username != "AnonymousUser" and _username not in _users:
+                raise get_user_model().DoesNotExist("User {} does not exist".format(_username))
+        for _group_name in _group_names:
+            if _group_name not in _groups:
+                raise Group.DoesNotExist("Group {} does not exist".format(_group_name))
 
         # default permissions for resource owner
-        set_owner_permissions(self)
-
-        # Anonymous User group
-        if 'users' in perm_spec and "AnonymousUser" in perm_spec['users']:
-            anonymous_group = Group.objects.get(name='anonymous')
-            for perm in perm_spec['users']['AnonymousUser']:
-                if self.polymorphic_ctype.name == 'layer' and perm in ('change_layer_data', 'change_layer_style',
-                                                                       'add_layer', 'change_layer', 'delete_layer',):
-                    assign_perm(perm, anonymous_group, self.layer)
-                else:
-                    assign_perm(perm, anonymous_group, self.get_self_resource())
-
-        # Owner
-        if settings.OGC_SERVER['default'].get("GEOFENCE_SECURITY_ENABLED", False):
-            if self.polymorphic_ctype.name == 'layer':
-                if not created:
-                    purge_geofence_layer_rules(self.get_self_resource())
-                perms = [
-                    "view_resourcebase",
-                    "change_layer_data",
-                    "change_layer_style",
-                    "change_resourcebase",
-                    "change_resourcebase_permissions",
-                    "download_resourcebase"]
-                sync_geofence_with_guardian(self.layer, perms, user=self.owner)
-
+        user_perms = defaultdict(set)
+        user_perms[self.owner].update(get_owner_permissions(self))
         # All the other users
-        if 'users' in perm_spec and len(perm_spec['users']) > 0:
-            for user, perms in perm_spec['users'].items():
-                _user = get_user_model().objects.get(username=user)
-                if _user != self.owner and user != "AnonymousUser":
-                    for perm in perms:
-                        if self.polymorphic_ctype.name == 'layer' and perm in (
-                                'change_layer_data', 'change_layer_style',
-                                'add_layer', 'change_layer', 'delete_layer',):
-                            assign_perm(perm, _user, self.layer)
-                        else:
-                            assign_perm(perm, _user, self.get_self_resource())
-
-                    # Set the GeoFence Rules
-                    if settings.OGC_SERVER['default'].get("GEOFENCE_SECURITY_ENABLED", False):
-                        if self.polymorphic_ctype.name == 'layer':
-                            group_perms = None
-                            if 'groups' in perm_spec and len(perm_spec['groups']) > 0:
-                                group_perms = perm_spec['groups']
-                            sync_geofence_with_guardian(self.layer, perms, user=_user, group_perms=group_perms)
-
-        # All the other groups
-        if 'groups' in perm_spec and len(perm_spec['groups']) > 0:
-            for group, perms in perm_spec['groups'].items():
-                _group = Group.objects.get(name=group)
-                for perm in perms:
-                    if self.polymorphic_ctype.name == 'layer' and perm in (
-                            'change_layer_data', 'change_layer_style',
-                            'add_layer', 'change_layer', 'delete_layer',):
-                        assign_perm(perm, _group, self.layer)
-                    else:
-                        assign_perm(perm, _group, self.get_self_resource())
-
-                # Set the GeoFence Rules
-                if settings.OGC_SERVER['default'].get("GEOFENCE_SECURITY_ENABLED", False):
-                    if self.polymorphic_ctype.name == 'layer':
-                        if _group and _group.name and _group.name == 'anonymous':
-                            _group = None
-                        sync_geofence_with_guardian(self.layer, perms, group=_group)
-
-        # AnonymousUser
-        if 'users' in perm_spec and len(perm_spec['users']) > 0:
-            if "AnonymousUser" in perm_spec['users']:
-                perms = perm_spec['users']["AnonymousUser"]
-                for perm in perms:
-                    if self.polymorphic_ctype.name == 'layer' and perm in (
-                            'change_layer_data', 'change_layer_style',
-                            'add_layer', 'change_layer', 'delete_layer',):
-                        assign_perm(perm, _user, self.layer)
-                    else:
-                        assign_perm(perm, _user, self.get_self_resource())
-
-                # Set the GeoFence Rules (user = None)
-                if settings.OGC_SERVER['default'].get("GEOFENCE_SECURITY_ENABLED", False):
-                    if self.polymorphic_ctype.name == 'layer':
-                        sync_geofence_with_guardian(self.layer, perms)
+        for _username, perms in users.items():
+            if _username != "AnonymousUser" and _users[_username] != self.owner:
+                user_perms[_users[_username]].update(perms)
+        # All the other groups, AnonymousUser through the anonymous group
+        group_perms = defaultdict(set)
+        for _group_name, perms in groups.items():
+            group_perms[_groups[_group_name]].update(perms)
+        if "AnonymousUser" in users:
+            group_perms[_groups['anonymous']].update(users["AnonymousUser"])
+
+        with transaction.atomic():
+            changed_users, changed_groups = bulk_set_object_permissions(self, user_perms, group_perms)
+
+        if (changed_users or changed_groups) and getattr(settings, 'HAYSTACK_SEARCH', False):
+            # the view permissions are indexed, see geonode.base.search_indexes
+            from geonode.haystack_signals import queue_index_update
+            queue_index_update(self.get_real_instance())
+
+        if self.polymorphic_ctype.name != 'layer':
+            return
+        if not settings.OGC_SERVER['default'].get("GEOFENCE_SECURITY_ENABLED", False) or \
+                getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
+            # rules synchronized later by sync_resources_with_guardian
+            if changed_users or changed_groups:
+                self.set_dirty_state()
+            return
+
+        # Set the GeoFence Rules of the owner and of the changed users and groups only
+        if not created:
+            purge_geofence_layer_rules(
+                self.get_self_resource(),
+                principals={geofence_principal(user=_u) for _u in changed_users + [self.owner]} | {
+                    geofence_principal(group=None if _g.name == 'anonymous' else _g) for _g in changed_groups})
+        sync_geofence_with_guardian(self.layer, GEOFENCE_OWNER_PERMISSIONS, user=self.owner)
+        for _user in changed_users:
+            if _user != self.owner and user_perms.get(_user):
+                sync_geofence_with_guardian(
+                    self.layer, list(user_perms[_user]), user=_user, group_perms=groups or None)
+        for _group in changed_groups:
+            if group_perms.get(_group):
+                sync_geofence_with_guardian(
+                    self.layer, list(group_perms[_group]),
+                    group=None if _group.name == 'anonymous' else _group)
 
     def set_workflow_perms(self, approved=False, published=False):
         """
@@ -384,3 +390,13 @@ class PermissionLevelMixin(object):
             if settings.OGC_SERVER['default'].get("GEOFENCE_SECURITY_ENABLED", False):
                 if self.polymorphic_ctype.name == 'layer':
                     sync_geofence_with_guardian(self.layer, VIEW_PERMISSIONS)
+
+
+def object_permission_post_change(instance, sender, **kwargs):
+    clear_object_permissions_cache()
+
+
+signals.post_save.connect(object_permission_post_change, sender=UserObjectPermission)
+signals.post_delete.connect(object_permission_post_change, sender=UserObjectPermission)
+signals.post_save.connect(object_permission_post_change, sender=GroupObjectPermission)
+signals.post_delete.connect(object_permission_post_change, sender=GroupObjectPermission)
@@ -32,21 +32,29 @@ from tastypie.test import ResourceTestCaseMixin
 from django.conf import settings
 from django.http import HttpRequest
 from django.urls import reverse
+from django.db import connection
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.contrib.auth.models import AnonymousUser
 
 from guardian.shortcuts import (
     get_anonymous_user,
+    get_objects_for_user,
+    get_perms,
     assign_perm,
     remove_perm
 )
 from geonode import qgis_server, geoserver
 from geonode.base.models import (
+    ResourceBase,
     UserGeoLimit,
     GroupGeoLimit
 )
 from geonode.base.populate_test_data import all_public
 from geonode.people.utils import get_valid_user
 from geonode.layers.models import Layer
+from geonode.documents.models import Document
 from geonode.groups.models import Group, GroupProfile
 from geonode.compat import ensure_string
 from geonode.utils import check_ogc_backend
@@ -64,7 +72,13 @@ from .utils import (
     get_highest_priority,
     set_geofence_all,
     sync_geofence_with_guardian,
-    sync_resources_with_guardian
+    sync_resources_with_guardian,
+    object_permissions_cache,
+    prefetch_perms,
+    get_view_acls,
+    get_visible_resources,
+    get_visible_resources_sq,
+    get_perms as get_cached_perms
 )
 
 
@@ -75,6 +89,41 @@ def _log(msg, *args):
     logger.debug(msg, *args)
 
 
+def _search_document(resource):
+    """The visibility fields of a resource as indexed by ResourceBaseACLIndex"""
+    acls = get_view_acls([resource.id])[resource.id]
+    return {
+        'owner_id': resource.owner_id,
+        'group_id': resource.group_id,
+        'is_approved': resource.is_approved,
+        'is_published': resource.is_published,
+        'dirty_state': resource.dirty_state,
+        'acl_users': acls['users'],
+        'acl_groups': acls['groups'],
+    }
+
+
+def _match_sq(sq, document):
+    """Evaluates a haystack SQ on a search document, as the backend would"""
+    from haystack.query import SQ
+
+    matches = []
+    for child in sq.children:
+        if isinstance(child, SQ):
+            matches.append(_match_sq(child, document))
+            continue
+        expression, value = child
+        field, _sep, lookup = expression.partition('__')
+        indexed = document[field]
+        indexed = indexed if isinstance(indexed, (set, list)) else [indexed]
+        if lookup == 'in':
+            matches.append(any(_v in indexed for _v in value))
+        else:
+            matches.append(value in indexed)
+    matched = all(matches) if sq.connector == SQ.AND else any(matches)
+    return not matched if sq.negated else matched
+
+
 class StreamToLogger(object):
     """
     Fake file-like stream object that redirects writes to a logger instance.
@@ -411,6 +460,132 @@ class PermissionsTest(GeoNodeBaseTestSupport):
             content = content.decode('UTF-8')
         self.assertTrue(layer2.title in json.loads(content)['not_changed'])
 
+    @dump_func_name
+    def test_set_permissions_writes_changes_only(self):
+        """Test that set_permissions only touches the changed permission rows"""
+        document = Document.objects.first()
+        bobby = get_user_model().objects.get(username='bobby')
+        perm_spec = {
+            "users": {
+                "AnonymousUser": ["view_resourcebase"],
+                "bobby": ["view_resourcebase", "download_resourcebase"]},
+            "groups": {}}
+        document.set_permissions(perm_spec)
+        resource = document.get_self_resource()
+        self.assertTrue(bobby.has_perm('download_resourcebase', resource))
+        self.assertEqual(
+            set(get_perms(get_anonymous_user(), resource)),
+            {'view_resourcebase'})
+
+        def _writes(queries):
+            return [q['sql'] for q in queries
+                    if q['sql'].startswith(('INSERT', 'DELETE'))]
+
+        # Applying the same spec again does not write anything
+        with CaptureQueriesContext(connection) as ctx:
+            document.set_permissions(perm_spec)
+        self.assertEqual(_writes(ctx.captured_queries), [])
+
+        # Revoking one permission removes just that row
+        perm_spec['users']['bobby'] = ["view_resourcebase"]
+        with CaptureQueriesContext(connection) as ctx:
+            document.set_permissions(perm_spec)
+        self.assertEqual(len(_writes(ctx.captured_queries)), 1)
+        self.assertFalse(bobby.has_perm('download_resourcebase', resource))
+        self.assertTrue(bobby.has_perm('view_resourcebase', resource))
+
+    @dump_func_name
+    def test_get_view_acls(self):
+        """Test the users and groups allowed to view a resource, as indexed for the search"""
+        bobby = get_user_model().objects.get(username='bobby')
+        anonymous_group = Group.objects.get(name='anonymous')
+        document = Document.objects.exclude(owner=bobby).first()
+        document.set_permissions({
+            "users": {"AnonymousUser": ["view_resourcebase"], "bobby": ["download_resourcebase"]},
+            "groups": {}})
+        acls = get_view_acls([document.id])
+        self.assertEqual(acls[document.id]['users'], {document.owner.id})
+        self.assertEqual(acls[document.id]['groups'], {anonymous_group.id})
+
+        document.set_permissions({"users": {"bobby": ["view_resourcebase"]}, "groups": {}})
+        acls = get_view_acls([document.id])
+        self.assertEqual(acls[document.id]['users'], {document.owner.id, bobby.id})
+        self.assertEqual(acls[document.id]['groups'], set())
+
+    @dump_func_name
+    @override_settings(HAYSTACK_CONNECTIONS={
+        'default': {'ENGINE': 'haystack.backends.simple_backend.SimpleEngine'}})
+    def test_get_visible_resources_sq(self):
+        """Test that the search backend filter matches the resources visible through get_visible_resources"""
+        bobby = get_user_model().objects.get(username='bobby')
+        norman = get_user_model().objects.get(username='norman')
+        stranger = get_user_model().objects.create(username='stranger')
+        private_group = GroupProfile.objects.create(slug='sq_private_group', title='sq_private_group', access='private')
+        private_group.join(norman)
+
+        def _resource(title, perm_spec, **kwargs):
+            resource = ResourceBase.objects.create(owner=bobby, title=title)
+            resource.set_permissions(perm_spec)
+            ResourceBase.objects.filter(id=resource.id).update(**kwargs)
+            return ResourceBase.objects.get(id=resource.id)
+
+        public = {'users': {'AnonymousUser': ['view_resourcebase']}, 'groups': {}}
+        resources = [
+            _resource('public', public),
+            _resource('shared with norman', {'users': {'norman': ['view_resourcebase']}, 'groups': {}}),
+            _resource('private group', {
+                'users': {}, 'groups': {private_group.group.name: ['view_resourcebase']}},
+                group=private_group.group),
+            _resource('dirty', public, dirty_state=True),
+            _resource('unpublished', public, is_published=False, is_approved=False),
+            _resource('private group, public', public, group=private_group.group),
+        ]
+        documents = {_r.id: _search_document(_r) for _r in resources}
+        queryset = ResourceBase.objects.filter(id__in=documents)
+
+        for user in (AnonymousUser(), bobby, norman, stranger):
+            for flags in ((False, False, False), (True, True, True), (True, False, True)):
+                with self.subTest(user=str(user), flags=flags):
+                    expected = set(get_visible_resources(
+                        get_objects_for_user(user, 'base.view_resourcebase', klass=queryset),
+                        user,
+                        admin_approval_required=flags[0],
+                        unpublished_not_visible=flags[1],
+                        private_groups_not_visibile=flags[2]).values_list('id', flat=True))
+                    sq = get_visible_resources_sq(
+                        user,
+                        admin_approval_required=flags[0],
+                        unpublished_not_visible=flags[1],
+                        private_groups_not_visibile=flags[2])
+                    self.assertIsNotNone(sq)
+                    matched = {_id for _id, _document in documents.items() if _match_sq(sq, _document)}
+                    self.assertEqual(matched, expected)
+
+    @dump_func_name
+    def test_prefetch_object_permissions(self):
+        """Test that the permissions on a list of resources are loaded with one query"""
+        bobby = get_user_model().objects.get(username='bobby')
+        resources = [_d.get_self_resource() for _d in Document.objects.exclude(owner=bobby)[:3]]
+        self.assertTrue(len(resources) > 1)
+        for resource in resources:
+            resource.set_permissions({'users': {}, 'groups': {}})
+        assign_perm('view_resourcebase', bobby, resources[0])
+        ContentType.objects.get_for_model(ResourceBase)
+
+        with object_permissions_cache():
+            with self.assertNumQueries(1):
+                prefetch_perms(bobby, resources)
+            with self.assertNumQueries(0):
+                self.assertTrue(bobby.has_perm('base.view_resourcebase', resources[0]))
+                self.assertFalse(bobby.has_perm('base.view_resourcebase', resources[1]))
+                self.assertIn('view_resourcebase', get_cached_perms(bobby, resources[0]))
+
+            # Granting or revoking a permission clears the cache
+            assign_perm('view_resourcebase', bobby, resources[1])
+            self.assertTrue(bobby.has_perm('base.view_resourcebase', resources[1]))
+            remove_perm('view_resourcebase', bobby, resources[0])
+            self.assertFalse(bobby.has_perm('base.view_resourcebase', resources[0]))
+
     @on_ogc_backend(geoserver.BACKEND_PACKAGE)
     @dump_func_name
     def test_perm_specs_synchronization(self):
@@ -27,17 +27,22 @@ import json
 import logging
 import traceback
 import requests
+import threading
 
 from six import string_types
+from contextlib import contextmanager
 from requests.auth import HTTPBasicAuth
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.core.exceptions import PermissionDenied
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import Group, Permission
 from django.core.exceptions import ObjectDoesNotExist
-from guardian.utils import get_user_obj_perms_model
+from guardian.core import ObjectPermissionChecker
+from guardian.ctypes import get_content_type
+from guardian.utils import get_identity, get_user_obj_perms_model
 from guardian.shortcuts import assign_perm, get_anonymous_user
 
 from geonode.utils import get_layer_workspace
@@ -107,8 +112,12 @@ def get_visible_resources(queryset,
             filter_set = filter_set.exclude(Q(dirty_state=True))
 
         if admin_approval_required or unpublished_not_visible or private_groups_not_visibile:
+            from geonode.base.models import ResourceBase
+
             _allowed_resources = []
-            for _obj in filter_set.all():
+            _objs = list(filter_set.all())
+            prefetch_perms(user, _objs, model=ResourceBase)
+            for _obj in _objs:
                 try:
                     resource = _obj.get_self_resource()
                     if user.has_perm('base.view_resourcebase', resource) or \
@@ -121,37 +130,226 @@ def get_visible_resources(queryset,
     return filter_set
 
 
+def get_visible_resources_sq(user,
+                             admin_approval_required=False,
+                             unpublished_not_visible=False,
+                             private_groups_not_visibile=False):
+    """
+    Search backend version of `get_visible_resources`, which also checks the
+    view permission: returns the Haystack SQ matching the resources visible
+    to `user` through the ACL fields of the indexes (see
+    `geonode.base.search_indexes.ResourceBaseACLIndex`), None if everything is.
+    """
+    from haystack.query import SQ
+
+    if user and user.is_authenticated and user.is_superuser:
+        return None
+    authenticated = bool(user and user.is_authenticated)
+    if not authenticated:
+        user = get_anonymous_user()
+
+    anonymous_group_ids = list(Group.objects.filter(name='anonymous').values_list('id', flat=True))
+    group_list_all = []
+    if authenticated:
+        try:
+            group_list_all = list(user.group_list_all().values_list('group', flat=True))
+        except Exception:
+            pass
+    owned = SQ(owner_id=user.id)
+    if group_list_all:
+        owned = owned | SQ(group_id__in=group_list_all)
+
+    sqs = []
+    if not user.has_perm('base.view_resourcebase'):
+        group_ids = set(user.groups.values_list('id', flat=True)) | set(anonymous_group_ids)
+        sq = SQ(acl_users=user.id)
+        if group_ids:
+            sq = sq | SQ(acl_groups__in=sorted(group_ids))
+        sqs.append(sq)
+
+    if admin_approval_required and not authenticated:
+        public_groups = list(GroupProfile.objects.exclude(access="private").values_list('group', flat=True))
+        sq = SQ(is_published=True)
+        if public_groups + anonymous_group_ids:
+            sq = sq | SQ(group_id__in=public_groups + anonymous_group_ids)
+        sqs.append(sq & SQ(is_approved=True))
+
+    # Hide Unpublished Resources to Anonymous Users
+    if unpublished_not_visible and not authenticated:
+        sqs.append(SQ(is_published=True))
+
+    # Hide Resources Belonging to Private Groups
+    if private_groups_not_visibile:
+        private_groups = list(GroupProfile.objects.filter(access="private").values_list('group', flat=True))
+        if private_groups:
+            if authenticated:
+                sqs.append(~(SQ(group_id__in=private_groups) & ~owned))
+            else:
+                sqs.append(~SQ(group_id__in=private_groups))
+
+    # Hide Dirty State Resources
+    if authenticated:
+        sqs.append(~(SQ(dirty_state=True) & ~owned))
+    else:
+        sqs.append(SQ(dirty_state=False))
+
+    visible = sqs[0]
+    for sq in sqs[1:]:
+        visible = visible & sq
+    return visible
+
+
+def get_view_acls(resource_ids):
+    """
+    Returns the ids of the users and of the groups allowed to view each
+    resource: {resource id: {'users': set, 'groups': set}}
+    """
+    from guardian.models import UserObjectPermission, GroupObjectPermission
+    from geonode.base.models import ResourceBase
+
+    ctype = ContentType.objects.get_for_model(ResourceBase)
+    acls = {_id: {'users': set(), 'groups': set()} for _id in resource_ids}
+    for model, principal_field, key in ((UserObjectPermission, 'user_id', 'users'),
+                                        (GroupObjectPermission, 'group_id', 'groups')):
+        rows = model.objects.filter(
+            content_type=ctype,
+            object_pk__in=[str(_id) for _id in resource_ids],
+            permission__codename='view_resourcebase').values_list('object_pk', principal_field)
+        for object_pk, principal_id in rows:
+            acls[int(object_pk)][key].add(principal_id)
+    return acls
+
+
 def get_users_with_perms(obj):
     """
     Override of the Guardian get_users_with_perms
     """
     from .models import (VIEW_PERMISSIONS, ADMIN_PERMISSIONS, LAYER_ADMIN_PERMISSIONS)
     ctype = ContentType.objects.get_for_model(obj)
-    permissions = {}
     PERMISSIONS_TO_FETCH = VIEW_PERMISSIONS + ADMIN_PERMISSIONS + LAYER_ADMIN_PERMISSIONS
 
-    for perm in Permission.objects.filter(codename__in=PERMISSIONS_TO_FETCH, content_type_id=ctype.id):
-        permissions[perm.id] = perm.codename
-
     user_model = get_user_obj_perms_model(obj)
     users_with_perms = user_model.objects.filter(object_pk=obj.pk,
                                                  content_type_id=ctype.id,
-                                                 permission_id__in=permissions).values('user_id', 'permission_id')
+                                                 permission__content_type_id=ctype.id,
+                                                 permission__codename__in=PERMISSIONS_TO_FETCH
+                                                 ).values_list('user_id', 'permission__codename')
 
     users = {}
-    for item in users_with_perms:
-        if item['user_id'] in users:
-            users[item['user_id']].append(permissions[item['permission_id']])
-        else:
-            users[item['user_id']] = [permissions[item['permission_id']], ]
+    for user_id, codename in users_with_perms:
+        users.setdefault(user_id, []).append(codename)
 
     profiles = {}
-    for profile in get_user_model().objects.filter(id__in=list(users.keys())):
-        profiles[profile] = users[profile.id]
+    if users:
+        for profile in get_user_model().objects.filter(id__in=list(users.keys())):
+            profiles[profile] = users[profile.id]
 
     return profiles
 
 
+class ObjectPermissionsCache(ObjectPermissionChecker):
+    """
+    An `ObjectPermissionChecker` which can load the permissions of its user, or
+    group, on a list of objects with a single query, see `prefetch_perms`.
+    """
+
+    def prefetch_perms(self, objects, model=None):
+        """
+        Loads the user and group permissions on `objects` in one query.
+
+        `model` is the model the permissions are checked against, e.g.
+        `ResourceBase` for a list of layers; it defaults to the objects one.
+        """
+        from guardian.models import UserObjectPermission, GroupObjectPermission
+
+        if self.user and not self.user.is_active:
+            return
+        by_ctype = {}
+        for obj in objects:
+            ctype = get_content_type(model or obj)
+            by_ctype.setdefault(ctype, set()).add(str(obj.pk))
+        for ctype, pks in by_ctype.items():
+            pks -= set(_pk for _ctype_id, _pk in self._obj_perms_cache if _ctype_id == ctype.id)
+            if not pks:
+                continue
+            perms = {_pk: set() for _pk in pks}
+            if self.user and self.user.is_superuser:
+                codenames = list(Permission.objects.filter(content_type=ctype).values_list('codename', flat=True))
+                perms = {_pk: codenames for _pk in pks}
+            else:
+                group_filter = {'group__user': self.user} if self.user else {'group': self.group}
+                rows = GroupObjectPermission.objects.filter(
+                    content_type=ctype, object_pk__in=pks, **group_filter
+                ).values_list('object_pk', 'permission__codename').order_by()
+                if self.user:
+                    rows = UserObjectPermission.objects.filter(
+                        content_type=ctype, object_pk__in=pks, user=self.user
+                    ).values_list('object_pk', 'permission__codename').order_by().union(rows)
+                for _pk, codename in rows:
+                    perms[_pk].add(codename)
+            for _pk, codenames in perms.items():
+                self._obj_perms_cache[(ctype.id, _pk)] = list(codenames)
+
+
+_permissions_cache = threading.local()
+
+
+@contextmanager
+def object_permissions_cache():
+    """
+    Shares an `ObjectPermissionsCache` per user among all the object
+    permission checks run in the block (see `geonode.security.backends`),
+    e.g. during a request, see `ObjectPermissionsCacheMiddleware`.
+
+    The cache is cleared whenever an object permission is granted or revoked.
+    """
+    outermost = getattr(_permissions_cache, 'checkers', None) is None
+    if outermost:
+        _permissions_cache.checkers = {}
+    try:
+        yield
+    finally:
+        if outermost:
+            _permissions_cache.checkers = None
+
+
+def clear_object_permissions_cache(*args, **kwargs):
+    checkers = getattr(_permissions_cache, 'checkers', None)
+    if checkers:
+        checkers.clear()
+
+
+def get_permissions_checker(user_or_group):
+    """
+    Returns the `ObjectPermissionsCache` shared in the current
+    `object_permissions_cache` block, if any, or a new one.
+    """
+    checkers = getattr(_permissions_cache, 'checkers', None)
+    if checkers is None:
+        return ObjectPermissionsCache(user_or_group)
+    user, group = get_identity(user_or_group)
+    key = ('user', user.pk) if user else ('group', group.pk)
+    if key not in checkers:
+        checkers[key] = ObjectPermissionsCache(user_or_group)
+    return checkers[key]
+
+
+def prefetch_perms(user_or_group, objects, model=None):
+    """
+    Loads in one query the permissions of `user_or_group` on `objects`, so
+    that the following checks on them do not hit the database.
+    """
+    if getattr(_permissions_cache, 'checkers', None) is not None:
+        get_permissions_checker(user_or_group).prefetch_perms(objects, model=model)
+
+
+def get_perms(user_or_group, obj):
+    """
+    Cached version of the Guardian get_perms
+    """
+    return get_permissions_checker(user_or_group).get_perms(obj)
+
+
 @on_ogc_backend(geoserver.BACKEND_PACKAGE)
 def get_geofence_rules(page=0, entries=1, count=False):
     """Get the number of available GeoFence Cache Rules"""
@@ -259,9 +457,26 @@ def purge_geofence_all():
             logger.debug(tb)
 
 
+def geofence_principal(user=None, group=None):
+    """
+    The (userName, roleName) of the GeoFence rules of a user or a group, (None, None)
+    for the rules applying to anyone.
+    """
+    if user is not None:
+        return (user if isinstance(user, string_types) else user.username, None)
+    if group is not None:
+        _group = group if isinstance(group, string_types) else group.name
+        return (None, "ROLE_{}".format(_group.upper()))
+    return (None, None)
+
+
 @on_ogc_backend(geoserver.BACKEND_PACKAGE)
-def purge_geofence_layer_rules(resource):
-    """purge layer existing GeoFence Cache Rules"""
+def purge_geofence_layer_rules(resource, principals=None):
+    """purge layer existing GeoFence Cache Rules
+
+    :param principals: only purge the rules of these principals, see
+        `geofence_principal`; all the rules of the layer by default
+    """
     # Scan GeoFence Rules associated to the Layer
     """
     curl -u admin:geoserver
@@ -287,7 +502,9 @@ def purge_geofence_layer_rules(resource):
             if gs_rules and gs_rules['rules']:
                 for r in gs_rules['rules']:
                     if r['layer'] and r['layer'] == resource.layer.name:
-                        r_ids.append(r['id'])
+                        if principals is None or \
+                                (r.get('userName') or None, r.get('roleName') or None) in principals:
+                            r_ids.append(r['id'])
 
             # Delete GeoFence Rules associated to the Layer
             # curl -X DELETE -u admin:geoserver http://<host>:<port>/geoserver/rest/geofence/rules/id/{r_id}
@@ -533,9 +750,12 @@ def set_geofence_all(instance):
 
 
 @on_ogc_backend(geoserver.BACKEND_PACKAGE)
-def sync_geofence_with_guardian(layer, perms, user=None, group=None, group_perms=None):
+def sync_geofence_with_guardian(layer, perms, user=None, group=None, group_perms=None, invalidate_cache=True):
     """
     Sync Guardian permissions to GeoFence.
+
+    Pass ``invalidate_cache=False`` when syncing many layers in a row and
+    invalidate the GeoFence cache once at the end.
     """
     _layer_name = layer.name if layer and hasattr(layer, 'name') else layer.alternate.split(":")[0]
     _layer_workspace = get_layer_workspace(layer)
@@ -658,6 +878,8 @@ def sync_geofence_with_guardian(layer, perms, user=None, group=None, group_perms
                     for request, enabled in gf_requests[service].items():
                         _update_geofence_rule(layer, _layer_name, _layer_workspace,
                                               service, request=request, group=_group, allow=enabled)
+    if not invalidate_cache:
+        return
     if not getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
         set_geofence_invalidate_cache()
     else:
@@ -688,6 +910,202 @@ def set_owner_permissions(resource, members=None):
                         assign_perm(perm, user, resource.layer)
 
 
+def get_owner_permissions(resource):
+    """the permissions set_owner_permissions grants to the owner of a resource"""
+    from .models import (VIEW_PERMISSIONS, ADMIN_PERMISSIONS, LAYER_ADMIN_PERMISSIONS)
+    perms = VIEW_PERMISSIONS + ADMIN_PERMISSIONS
+    if settings.RESOURCE_PUBLISHING or settings.ADMIN_MODERATE_UPLOADS:
+        perms = [perm for perm in perms
+                 if perm not in {'change_resourcebase_permissions', 'publish_resourcebase'}]
+    if resource.polymorphic_ctype and resource.polymorphic_ctype.name == 'layer':
+        perms = perms + LAYER_ADMIN_PERMISSIONS
+    return perms
+
+
+def bulk_set_object_permissions(resource, user_perms, group_perms):
+    """Make the object permissions of a resource match the given ones.
+
+    Only the difference with the current guardian rows is written: the revoked
+    permissions with one delete per table, the new ones with bulk_create. Layer
+    specific permissions are set on the layer, the others on the resource base.
+    Run it in a transaction.
+
+    :param user_perms: {user: permission codenames}
+    :param group_perms: {group: permission codenames}
+    :return: the users and the groups whose permissions changed
+    """
+    from guardian.models import UserObjectPermission, GroupObjectPermission
+    from .models import LAYER_ONLY_PERMISSIONS
+
+    resource = resource.get_self_resource()
+    resource_ctype = ContentType.objects.get_for_model(resource)
+    layer_ctype = None
+    if resource.polymorphic_ctype and resource.polymorphic_ctype.name == 'layer':
+        layer_ctype = ContentType.objects.get_for_model(resource.layer)
+    ctypes = [_ct for _ct in (resource_ctype, layer_ctype) if _ct]
+
+    codenames = set()
+    for perms in list(user_perms.values()) + list(group_perms.values()):
+        codenames.update(perms)
+    permissions = {
+        (_p.content_type_id, _p.codename): _p.id
+        for _p in Permission.objects.filter(content_type__in=ctypes, codename__in=codenames)}
+
+    def _desired(principal_perms):
+        rows = set()
+        for principal, perms in principal_perms.items():
+            for perm in perms:
+                ctype = layer_ctype if layer_ctype and perm in LAYER_ONLY_PERMISSIONS else resource_ctype
+                if (ctype.id, perm) not in permissions:
+                    raise Permission.DoesNotExist(
+                        "Permission {} does not exist for {}".format(perm, ctype))
+                rows.add((principal.id, permissions[(ctype.id, perm)], ctype.id))
+        return rows
+
+    changed = []
+    for model, principal_field, principal_perms in (
+            (UserObjectPermission, 'user_id', user_perms),
+            (GroupObjectPermission, 'group_id', group_perms)):
+        desired = _desired(principal_perms)
+        current = {}
+        for _row in model.objects.filter(
+                content_type__in=ctypes, object_pk=str(resource.id)).values(
+                'id', principal_field, 'permission_id', 'content_type_id'):
+            current[(_row[principal_field], _row['permission_id'], _row['content_type_id'])] = _row['id']
+        revoked = set(current) - desired
+        granted = desired - set(current)
+        if revoked:
+            model.objects.filter(id__in=[current[_key] for _key in revoked]).delete()
+        if granted:
+            model.objects.bulk_create([
+                model(**{principal_field: _principal_id},
+                      permission_id=_permission_id,
+                      content_type_id=_ctype_id,
+                      object_pk=str(resource.id))
+                for _principal_id, _permission_id, _ctype_id in granted])
+        changed.append({_key[0] for _key in revoked | granted})
+    clear_object_permissions_cache()
+
+    changed_users = [_u for _u in user_perms if _u.id in changed[0]]
+    changed_users += list(get_user_model().objects.filter(
+        id__in=changed[0] - {_u.id for _u in user_perms}))
+    changed_groups = [_g for _g in group_perms if _g.id in changed[1]]
+    changed_groups += list(Group.objects.filter(
+        id__in=changed[1] - {_g.id for _g in group_perms}))
+    return changed_users, changed_groups
+
+
+def bulk_set_resources_permissions(resources, perms, users=None, groups=None, delete=False,
+                                   chunk_size=None, start_after=None, progress=None):
+    """Grant or revoke the same permissions to users and groups on many resources.
+
+    The guardian rows are written with set-based queries, one bulk insert or a
+    few deletes per chunk of resources, each chunk in its own transaction. The
+    resources are walked by increasing id, so an interrupted run can be resumed
+    passing the last processed id as ``start_after``.
+
+    The permissions of the resource owners are never touched and AnonymousUser
+    permissions go to the 'anonymous' group. The GeoFence rules of the changed
+    layers are not synchronized here: the layers are flagged as dirty and
+    synchronized at once, with a single cache invalidation, at the end.
+
+    :param resources: a ResourceBase (or subclass) queryset
+    :param perms: the permission codenames
+    :param users: the users, usernames are accepted too
+    :param groups: the groups, group names are accepted too
+    :param delete: revoke the permissions instead of granting them
+    :param progress: callable(processed, total, last_id) invoked after each chunk
+    :return: {'processed': int, 'total': int, 'last_id': int}
+    """
+    from guardian.models import UserObjectPermission, GroupObjectPermission
+    from geonode.base.models import ResourceBase
+    from geonode.layers.models import Layer
+    from .models import LAYER_ONLY_PERMISSIONS
+
+    chunk_size = chunk_size or getattr(settings, 'SECURITY_BULK_PERMISSIONS_CHUNK_SIZE', 500)
+
+    # Resolve the principals once
+    usernames = {str(_u) for _u in users or []}
+    group_names = {str(_g) for _g in groups or []}
+    if "AnonymousUser" in usernames:
+        usernames.discard("AnonymousUser")
+        group_names.add('anonymous')
+    user_ids = list(get_user_model().objects.filter(username__in=usernames).values_list('id', flat=True))
+    group_ids = list(Group.objects.filter(name__in=group_names).values_list('id', flat=True))
+
+    # Resolve the permissions once
+    resource_ctype = ContentType.objects.get_for_model(ResourceBase)
+    layer_ctype = ContentType.objects.get_for_model(Layer)
+    existing = {
+        (_p.content_type_id, _p.codename): _p.id
+        for _p in Permission.objects.filter(content_type__in=[resource_ctype, layer_ctype], codename__in=perms)}
+    permissions = []
+    for perm in set(perms):
+        ctype = layer_ctype if perm in LAYER_ONLY_PERMISSIONS else resource_ctype
+        if (ctype.id, perm) not in existing:
+            raise Permission.DoesNotExist(
+                "Permission {} does not exist for {}".format(perm, ctype))
+        permissions.append((existing[(ctype.id, perm)], ctype.id, ctype == layer_ctype))
+    permission_ids = [_p[0] for _p in permissions]
+
+    resources = resources.order_by('id').values_list('id', 'owner_id', 'polymorphic_ctype_id')
+    total = resources.filter(id__gt=start_after or 0).count()
+    processed = 0
+    last_id = start_after
+    geofence_enabled = settings.OGC_SERVER['default'].get("GEOFENCE_SECURITY_ENABLED", False)
+    while (user_ids or group_ids) and permission_ids:
+        chunk = list(resources.filter(id__gt=last_id or 0)[:chunk_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            if delete:
+                for user_id in user_ids:
+                    UserObjectPermission.objects.filter(
+                        user_id=user_id,
+                        permission_id__in=permission_ids,
+                        object_pk__in=[str(_id) for _id, _owner_id, _ctype_id in chunk if _owner_id != user_id]
+                    ).delete()
+                if group_ids:
+                    GroupObjectPermission.objects.filter(
+                        group_id__in=group_ids,
+                        permission_id__in=permission_ids,
+                        object_pk__in=[str(_id) for _id, _owner_id, _ctype_id in chunk]
+                    ).delete()
+            else:
+                user_rows = []
+                group_rows = []
+                for _id, _owner_id, _ctype_id in chunk:
+                    for permission_id, ctype_id, layer_only in permissions:
+                        if layer_only and _ctype_id != layer_ctype.id:
+                            continue
+                        user_rows.extend(
+                            UserObjectPermission(
+                                user_id=user_id, permission_id=permission_id,
+                                content_type_id=ctype_id, object_pk=str(_id))
+                            for user_id in user_ids if user_id != _owner_id)
+                        group_rows.extend(
+                            GroupObjectPermission(
+                                group_id=group_id, permission_id=permission_id,
+                                content_type_id=ctype_id, object_pk=str(_id))
+                            for group_id in group_ids)
+                UserObjectPermission.objects.bulk_create(user_rows, ignore_conflicts=True)
+                GroupObjectPermission.objects.bulk_create(group_rows, ignore_conflicts=True)
+                clear_object_permissions_cache()
+            if geofence_enabled:
+                ResourceBase.objects.filter(
+                    id__in=[_id for _id, _owner_id, _ctype_id in chunk if _ctype_id == layer_ctype.id]
+                ).update(dirty_state=True)
+        processed += len(chunk)
+        last_id = chunk[-1][0]
+        if progress:
+            progress(processed, total, last_id)
+
+    # Synchronize GeoFence once; the periodic task takes care of it when delayed
+    if geofence_enabled and processed and not getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
+        sync_resources_with_guardian()
+    return {'processed': processed, 'total': total, 'last_id': last_id}
+
+
 def remove_object_permissions(instance):
     """Remove object permissions on given resource.
 
@@ -814,9 +1232,11 @@ def sync_resources_with_guardian(resource=None):
         dirty_resources = ResourceBase.objects.filter(dirty_state=True)
     if dirty_resources and dirty_resources.count() > 0:
         logger.debug(" --------------------------- synching with guardian!")
+        synched = False
         for r in dirty_resources:
             if r.polymorphic_ctype.name == 'layer':
                 layer = None
+                synched = True
                 try:
                     purge_geofence_layer_rules(r)
                     layer = Layer.objects.get(id=r.id)
@@ -830,14 +1250,17 @@ def sync_resources_with_guardian(resource=None):
                             geofence_user = str(user)
                             if "AnonymousUser" in geofence_user:
                                 geofence_user = None
-                            sync_geofence_with_guardian(layer, perms, user=geofence_user)
+                            sync_geofence_with_guardian(layer, perms, user=geofence_user, invalidate_cache=False)
                     # All the other groups
                     if 'groups' in perm_spec:
                         for group, perms in perm_spec['groups'].items():
                             group = Group.objects.get(name=group)
                             # Set the GeoFence Group Rules
-                            sync_geofence_with_guardian(layer, perms, group=group)
+                            sync_geofence_with_guardian(layer, perms, group=group, invalidate_cache=False)
                     r.clear_dirty_state()
                 except Exception as e:
                     logger.exception(e)
                     logger.warn("!WARNING! - Failure Synching-up Security Rules for Resource [%s]" % (r))
+        # Invalidate the GeoFence Cache once for all the synched layers
+        if synched:
+            set_geofence_invalidate_cache()
@@ -41,7 +41,9 @@ SILENCED_SYSTEM_CHECKS = [
     '1_8.W001',
     'fields.W340',
     'auth.W004',
-    'urls.W002'
+    'urls.W002',
+    # geonode.security.backends.ObjectPermissionBackend extends the Guardian one
+    'guardian.W001'
 ]
 
 # GeoNode Version
@@ -755,11 +757,15 @@ MIDDLEWARE = (
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Shares the object permissions checks of the GET requests
+    'geonode.security.middleware.ObjectPermissionsCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'oauth2_provider.middleware.OAuth2TokenMiddleware',
     'geonode.base.middleware.MaintenanceMiddleware',
     'geonode.base.middleware.ReadOnlyMiddleware',   # a Middleware enabling Read Only mode of Geonode
+    # Runs the side effects of the resources saved by a request once, at its end
+    'geonode.base.post_commit.PostCommitWorkMiddleware',
 )
 
 MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
@@ -789,7 +795,7 @@ SECURE_HSTS_INCLUDE_SUBDOMAINS = ast.literal_eval(os.environ.get('SECURE_HSTS_IN
 AUTHENTICATION_BACKENDS = (
     'oauth2_provider.backends.OAuth2Backend',
     'django.contrib.auth.backends.ModelBackend',
-    'guardian.backends.ObjectPermissionBackend',
+    'geonode.security.backends.ObjectPermissionBackend',
     'allauth.account.auth_backends.AuthenticationBackend',
 )
 
@@ -1276,7 +1282,9 @@ if HAYSTACK_SEARCH:
             'INDEX_NAME': os.getenv('HAYSTACK_ENGINE_INDEX_NAME', 'haystack'),
         },
     }
-    HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+    # Buffers the changed objects and updates the index in bulk from the 'update' queue
+    HAYSTACK_SIGNAL_PROCESSOR = os.getenv(
+        'HAYSTACK_SIGNAL_PROCESSOR', 'geonode.haystack_signals.QueuedSignalProcessor')
     HAYSTACK_SEARCH_RESULTS_PER_PAGE = int(os.getenv('HAYSTACK_SEARCH_RESULTS_PER_PAGE', '200'))
 
 # Available download formats
@@ -1349,6 +1357,12 @@ API_LIMIT_PER_PAGE = int(os.getenv('API_LIMIT_PER_PAGE', '200'))
 API_INCLUDE_REGIONS_COUNT = ast.literal_eval(
     os.getenv('API_INCLUDE_REGIONS_COUNT', 'False'))
 
+# Match the extent searches on the bounding boxes only (the PostGIS && operator)
+# instead of ST_Intersects. Faster, but the bbox of a resource in a projected SRID
+# is not a rectangle in EPSG:4326 and may then match extents it does not intersect.
+API_EXTENT_SEARCH_BBOX_OVERLAPS = ast.literal_eval(
+    os.getenv('API_EXTENT_SEARCH_BBOX_OVERLAPS', 'False'))
+
 # Settings for EXIF plugin
 EXIF_ENABLED = ast.literal_eval(os.getenv('EXIF_ENABLED', 'True'))
 
@@ -1826,6 +1840,13 @@ if 'geonode.services' in INSTALLED_APPS:
         'schedule': 600.0,
     }
 
+if HAYSTACK_SEARCH:
+    # Reindexes the resources whose indexed permissions are outdated
+    CELERY_BEAT_SCHEDULE['reconcile_search_acls'] = {
+        'task': 'geonode.tasks.search.reconcile_acls',
+        'schedule': float(os.getenv('HAYSTACK_ACLS_RECONCILE_INTERVAL', '3600')),
+    }
+
 DELAYED_SECURITY_SIGNALS = ast.literal_eval(os.environ.get('DELAYED_SECURITY_SIGNALS', 'False'))
 CELERY_ENABLE_UTC = ast.literal_eval(os.environ.get('CELERY_ENABLE_UTC', 'True'))
 CELERY_TIMEZONE = TIME_ZONE
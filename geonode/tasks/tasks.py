@@ -23,9 +23,7 @@ from celery.utils.log import get_task_logger
 from django.conf import settings
 from django.core.mail import send_mail
 
-from django.db import (
-    connections,
-    transaction)
+from django.db import connections
 
 from geonode.celery_app import app
 
@@ -165,18 +163,57 @@ def send_queued_notifications(self, *args):
     settings.PINAX_NOTIFICATIONS_QUEUE_ALL needs to be true in order to take
     advantage of this.
 
+    The recipients of each queued notice are sent in batches, see
+    geonode.notifications_helper.send_queued_notifications_batches.
     """
-    from importlib import import_module
-    notifications = getattr(settings, 'NOTIFICATIONS_MODULE', None)
+    from geonode.notifications_helper import send_queued_notifications_batches
+    send_queued_notifications_batches()
 
-    if notifications:
-        engine = import_module(f"{notifications}.engine")
-        send_all = getattr(engine, 'send_all')
-        # Make sure application can write to location where lock files are stored
-        if not args and getattr(settings, 'NOTIFICATION_LOCK_LOCATION', None):
-            send_all(settings.NOTIFICATION_LOCK_LOCATION)
-        else:
-            send_all(*args)
+
+@app.task(
+    bind=True,
+    base=FaultTolerantTask,
+    name='geonode.tasks.search.update_index',
+    queue='update',
+    expires=600,
+    acks_late=False,
+    autoretry_for=(Exception, ),
+    retry_kwargs={'max_retries': 3, 'countdown': 10},
+    retry_backoff=True,
+    retry_backoff_max=700,
+    retry_jitter=True)
+def update_search_index(self, updates, removals):
+    """Updates the search index in bulk.
+
+    updates - {model label: [pks]} of the objects to (re)index
+    removals - the identifiers of the objects to remove from the index
+
+    The ids are queued by geonode.haystack_signals.QueuedSignalProcessor.
+    """
+    from geonode.haystack_signals import update_index
+    update_index(updates, removals)
+
+
+@app.task(
+    bind=True,
+    base=FaultTolerantTask,
+    name='geonode.tasks.search.reconcile_acls',
+    queue='update',
+    expires=3600,
+    acks_late=False,
+    autoretry_for=(Exception, ),
+    retry_kwargs={'max_retries': 3, 'countdown': 10},
+    retry_backoff=True,
+    retry_backoff_max=700,
+    retry_jitter=True)
+def reconcile_search_acls(self):
+    """Reindexes the resources whose indexed permissions are outdated.
+
+    See geonode.haystack_signals.reconcile_search_acls.
+    """
+    from geonode.haystack_signals import reconcile_search_acls
+    reconciled = reconcile_search_acls()
+    logger.info(f"Reindexed the permissions of {reconciled} resources.")
 
 
 @app.task(
@@ -193,14 +230,43 @@ def send_queued_notifications(self, *args):
     retry_jitter=True)
 def set_permissions(self, permissions_names, resources_names,
                     users_usernames, groups_names, delete_flag):
+    """Set/Unset permissions on many layers.
+
+    The layers are updated in chunks committed one by one; the last processed
+    layer is checkpointed in the cache, so a retry resumes from where the
+    previous attempt stopped. The progress is reported as the 'PROGRESS'
+    state of the task.
+    """
+    from django.core.cache import cache
     from geonode.layers.utils import set_layers_permissions
-    with transaction.atomic():
-        for permissions_name in permissions_names:
-            set_layers_permissions(
-                permissions_name,
-                resources_names,
-                users_usernames,
-                groups_names,
-                delete_flag,
-                verbose=True
-            )
+
+    checkpoint_key = f"geonode.tasks.layers.set_permissions:{self.request.id}"
+    checkpoint = cache.get(checkpoint_key) or {}
+    for step, permissions_name in enumerate(permissions_names):
+        if step < checkpoint.get('step', 0):
+            continue
+
+        def _progress(processed, total, last_id):
+            cache.set(checkpoint_key, {'step': step, 'last_id': last_id}, 24 * 60 * 60)
+            if not self.request.is_eager:
+                self.update_state(state='PROGRESS', meta={
+                    'permissions': permissions_name,
+                    'step': step + 1,
+                    'steps': len(permissions_names),
+                    'processed': processed,
+                    'total': total})
+
+        set_layers_permissions(
+            permissions_name,
+            resources_names,
+            users_usernames,
+            groups_names,
+            delete_flag,
+            verbose=True,
+            start_after=checkpoint.get('last_id') if step == checkpoint.get('step') else None,
+            progress=_progress
+        )
+    cache.delete(checkpoint_key)
+    if getattr(settings, 'HAYSTACK_SEARCH', False):
+        # the bulk permissions writes bypass the search index signals
+        reconcile_search_acls.apply_async()
@@ -18,11 +18,17 @@
 #########################################################################
 
 from user_messages.models import Thread, Message, GroupMemberThread
+from geonode.documents import DocumentsAppConfig
+from geonode.documents.models import Document
 from geonode.messaging.notifications import message_received_notification
+from geonode.notifications_backend import EmailBackend
+from geonode.notifications_helper import get_notification_recipients, send_notifications_batch
 from geonode.people.models import Profile
 from geonode.tests.base import GeoNodeBaseTestSupport
+from geonode.tests.utils import NotificationsTestsHelper
 from unittest.mock import patch
 from django.contrib.auth.models import Group
+from django.core import mail
 
 
 class TestSendEmail(GeoNodeBaseTestSupport):
@@ -69,3 +75,60 @@ class TestSendEmail(GeoNodeBaseTestSupport):
     def test_email_sent_to_group_single(self, email_message):
         message_received_notification(message=self.m2)
         self.assertEqual(email_message.call_count, 1)
+
+
+class TestResourceNotifications(NotificationsTestsHelper):
+
+    def setUp(self):
+        super(TestResourceNotifications, self).setUp()
+        self.owner = Profile.objects.create(username='doc_owner', email='owner@test.test')
+        self.viewer = Profile.objects.create(username='doc_viewer', email='viewer@test.test')
+        self.member = Profile.objects.create(username='doc_member', email='member@test.test')
+        self.stranger = Profile.objects.create(username='doc_stranger', email='stranger@test.test')
+        self.admin = Profile.objects.create(username='doc_admin', email='admin@test.test', is_superuser=True)
+        self.group = Group.objects.create(name='doc_viewers')
+        self.member.groups.add(self.group)
+        self.document = Document.objects.create(owner=self.owner, title='Notified document')
+        self.document.set_permissions({
+            'users': {self.viewer.username: ['view_resourcebase']},
+            'groups': {self.group.name: ['view_resourcebase']}})
+        for user in (self.viewer, self.member, self.stranger, self.admin):
+            self.setup_notifications_for(DocumentsAppConfig.NOTIFICATIONS, user)
+
+    def test_recipients_are_the_viewers(self):
+        get_notification_recipients('document_updated', resource=self.document)
+        with self.assertNumQueries(1):
+            recipients = set(get_notification_recipients('document_updated', resource=self.document))
+        self.assertEqual(recipients, {self.viewer, self.member, self.admin})
+        recipients = get_notification_recipients(
+            'document_updated', exclude_user=self.viewer, resource=self.document)
+        self.assertEqual(set(recipients), {self.member, self.admin})
+
+    def test_notifications_are_rendered_once(self):
+        recipients = get_notification_recipients('document_updated', resource=self.document)
+        mail.outbox = []
+        with patch('geonode.notifications_backend.EmailBackend._render',
+                   autospec=True, side_effect=EmailBackend._render) as render:
+            sent = send_notifications_batch(recipients, 'document_updated', {'resource': self.document})
+        self.assertEqual(sent, 3)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(
+            sorted(_m.to[0] for _m in mail.outbox),
+            ['admin@test.test', 'member@test.test', 'viewer@test.test'])
+
+    def test_failed_notifications_are_not_sent_twice(self):
+        from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+
+        def _send_messages(backend, messages):
+            if messages[0].to == ['member@test.test']:
+                raise Exception("recipient refused")
+            return send_messages(backend, messages)
+
+        send_messages = LocMemEmailBackend.send_messages
+        recipients = get_notification_recipients('document_updated', resource=self.document)
+        mail.outbox = []
+        with patch.object(LocMemEmailBackend, 'send_messages', autospec=True, side_effect=_send_messages):
+            send_notifications_batch(recipients, 'document_updated', {'resource': self.document})
+        self.assertEqual(
+            sorted(_m.to[0] for _m in mail.outbox),
+            ['admin@test.test', 'viewer@test.test'])
@@ -17,10 +17,18 @@
 #
 #########################################################################
 
+from unittest.mock import MagicMock, patch
+
+from geonode.base.post_commit import deferred_resource_work
 from geonode.documents.models import Document
+from geonode.layers.models import Layer
 from geonode.people.models import Profile
 from geonode.tests.base import GeoNodeBaseTestSupport
 from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+HAYSTACK_CONNECTIONS = {
+    'default': {'ENGINE': 'haystack.backends.simple_backend.SimpleEngine'}}
 
 
 class ResourceBaseSearchTest(GeoNodeBaseTestSupport):
@@ -58,3 +66,80 @@ class ResourceBaseSearchTest(GeoNodeBaseTestSupport):
         purpose__icontains=test&f_method=or'
         response = self.client.get(url)
         self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ASYNC_SIGNALS=True, HAYSTACK_CONNECTIONS=HAYSTACK_CONNECTIONS)
+@patch('geonode.base.post_commit.transaction.on_commit', side_effect=lambda func: func())
+@patch('geonode.tasks.tasks.update_search_index')
+class QueuedSignalProcessorTest(SimpleTestCase):
+
+    def test_updates_are_deduplicated(self, update_search_index, on_commit):
+        from geonode.haystack_signals import queue_index_update
+
+        with deferred_resource_work():
+            queue_index_update(Document(pk=1))
+            queue_index_update(Document(pk=1))
+            queue_index_update(Document(pk=2))
+            queue_index_update(Layer(pk=1))
+            update_search_index.apply_async.assert_not_called()
+        update_search_index.apply_async.assert_called_once_with(args=(
+            {'documents.Document': [1, 2], 'layers.Layer': [1]}, []))
+
+    def test_batches_are_flushed(self, update_search_index, on_commit):
+        from geonode.haystack_signals import queue_index_update
+
+        with deferred_resource_work():
+            queue_index_update(Document(pk=1))
+        with deferred_resource_work():
+            queue_index_update(Document(pk=2))
+        self.assertEqual(
+            [_call[1]['args'] for _call in update_search_index.apply_async.call_args_list],
+            [({'documents.Document': [1]}, []), ({'documents.Document': [2]}, [])])
+
+        # nothing is left to flush
+        with deferred_resource_work():
+            pass
+        self.assertEqual(update_search_index.apply_async.call_count, 2)
+
+    def test_deletes_and_updates(self, update_search_index, on_commit):
+        from geonode.haystack_signals import QueuedSignalProcessor
+
+        with patch.object(QueuedSignalProcessor, 'setup'):
+            processor = QueuedSignalProcessor(None, None)
+        with deferred_resource_work():
+            # saved, then deleted
+            processor.handle_save(Document, Document(pk=1))
+            processor.handle_delete(Document, Document(pk=1))
+            # deleted, then saved again
+            processor.handle_delete(Document, Document(pk=2))
+            processor.handle_save(Document, Document(pk=2))
+            processor.handle_delete(Layer, Layer(pk=3))
+        update_search_index.apply_async.assert_called_once_with(args=(
+            {'documents.Document': [2]}, ['documents.document.1', 'layers.layer.3']))
+
+
+@override_settings(HAYSTACK_CONNECTIONS=HAYSTACK_CONNECTIONS)
+class UpdateIndexTest(TestCase):
+
+    def test_update_index(self):
+        from geonode import haystack_signals
+
+        owner = Profile.objects.create(username='test')
+        document = Document.objects.create(title='indexed', owner=owner)
+        backend = MagicMock(batch_size=100)
+        index = MagicMock()
+        index.build_queryset.return_value = Document.objects.all()
+        connection = MagicMock()
+        connection.get_backend.return_value = backend
+        connection.get_unified_index.return_value.get_index.return_value = index
+
+        with patch.object(haystack_signals, 'connections', {'default': connection}):
+            haystack_signals.update_index(
+                {'documents.Document': [document.id, document.id + 1000]}, ['layers.layer.1'], using='default')
+
+        backend.update.assert_called_once_with(index, [document])
+        index.prefetch_acls.assert_called_once_with([document])
+        # the objects not found anymore are removed, along with the deleted ones
+        self.assertEqual(
+            [_call[0][0] for _call in backend.remove.call_args_list],
+            [f'documents.document.{document.id + 1000}', 'layers.layer.1'])
@@ -7,6 +7,7 @@ from osgeo import ogr
 from datetime import datetime, timedelta
 from unittest.mock import patch
 
+from geonode import GeoNodeException
 from geonode.br.management.commands.utils.utils import ignore_time
 from geonode.tests.base import GeoNodeBaseTestSupport
 from geonode.utils import copy_tree, fixup_shp_columnnames, unzip_file
@@ -109,3 +110,34 @@ class TestFixupShp(GeoNodeBaseTestSupport):
         shp_parent = os.path.dirname(layer_shp)
         if shp_parent.startswith(tempfile.gettempdir()):
             shutil.rmtree(shp_parent)
+
+
+class TestUnzipFile(GeoNodeBaseTestSupport):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def test_unzip_file_streams_members(self):
+        layer_zip = os.path.join(self.tempdir, "layer.zip")
+        with zipfile.ZipFile(layer_zip, "w") as the_zip:
+            the_zip.writestr("layer/", "")
+            the_zip.writestr("layer/layer.shp", b"0" * 4096)
+            the_zip.writestr("layer/layer.dbf", b"1")
+
+        destination = os.path.join(self.tempdir, "out")
+        layer_shp = unzip_file(layer_zip, tempdir=destination)
+        self.assertEqual(layer_shp, os.path.join(destination, "layer", "layer.shp"))
+        self.assertEqual(os.path.getsize(layer_shp), 4096)
+        self.assertTrue(os.path.isfile(os.path.join(destination, "layer", "layer.dbf")))
+
+    def test_unzip_file_rejects_unsafe_members(self):
+        layer_zip = os.path.join(self.tempdir, "evil.zip")
+        with zipfile.ZipFile(layer_zip, "w") as the_zip:
+            the_zip.writestr("layer.shp", b"0")
+            the_zip.writestr("../layer.dbf", b"1")
+
+        destination = os.path.join(self.tempdir, "out")
+        with self.assertRaises(GeoNodeException):
+            unzip_file(layer_zip, tempdir=destination)
+        # Nothing has been extracted
+        self.assertEqual(os.listdir(destination), [])
@@ -26,11 +26,12 @@ scattered over the codebase
 
 import os.path
 
-from geonode.utils import fixup_shp_columnnames
+from geonode.utils import extract_zip_members, fixup_shp_columnnames
 from geoserver.resource import FeatureType, Coverage
 from django.utils.translation import ugettext as _
 
 from collections import UserList
+from concurrent.futures import ThreadPoolExecutor
 import zipfile
 import os
 import re
@@ -269,11 +270,8 @@ def scan_file(file_name, scan_hint=None, charset=None):
             charset=charset)
         archive = file_name if kept_zip else None
     else:
-        paths = []
-        for p in os.listdir(dirname):
-            _f = os.path.join(dirname, p)
-            fixup_shp_columnnames(_f, charset)
-            paths.append(_f)
+        paths = [os.path.join(dirname, p) for p in os.listdir(dirname)]
+        _fixup_shapefiles(paths, charset)
         archive = None
     if paths is not None:
         safe_paths = _rename_files(paths)
@@ -341,22 +339,32 @@ def _process_zip(zip_path, destination_dir, scan_hint=None, charset=None):
 
 
 def _sanitize_zip_contents(zip_handler, destination_dir, charset):
-    clean_macosx_dir(zip_handler.namelist())
-    result = _extract_zip(zip_handler, destination_dir, charset)
+    members = [m for m in zip_handler.infolist() if '__MACOSX' not in m.filename]
+    result = _extract_zip(zip_handler, destination_dir, charset, members=members)
     return result
 
 
-def _extract_zip(zip_handler, destination, charset):
-    file_names = zip_handler.namelist()
-    zip_handler.extractall(destination)
-    paths = []
-    for p in file_names:
-        _f = os.path.join(destination, p)
-        fixup_shp_columnnames(_f, charset)
-        paths.append(_f)
+def _extract_zip(zip_handler, destination, charset, members=None):
+    paths = extract_zip_members(zip_handler, destination, members=members)
+    _fixup_shapefiles(paths, charset)
     return paths
 
 
+def _fixup_shapefiles(paths, charset):
+    """Fix the column names of every shapefile found in paths
+
+    Only the .shp files need to be opened through OGR; each shapefile is
+    independent from the others so they are processed concurrently.
+    """
+    shp_paths = [p for p in paths if p.lower().endswith('.shp')]
+    if len(shp_paths) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(shp_paths), 4)) as executor:
+            list(executor.map(lambda p: fixup_shp_columnnames(p, charset), shp_paths))
+    else:
+        for p in shp_paths:
+            fixup_shp_columnnames(p, charset)
+
+
 def _probe_zip_for_sld(zip_handler, destination_dir):
     file_names = clean_macosx_dir(zip_handler.namelist())
     result = []
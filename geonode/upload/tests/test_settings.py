@@ -46,7 +46,7 @@ ALLOWED_HOSTS = ['localhost', 'geonode', 'django', 'geonode.example.com']
 
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',
-    'guardian.backends.ObjectPermissionBackend'
+    'geonode.security.backends.ObjectPermissionBackend'
 )
 
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
@@ -29,6 +29,8 @@ from collections import namedtuple
 from django import forms
 from django.utils.translation import ugettext as _
 
+from geonode import GeoNodeException
+from geonode.utils import check_zip_members
 from ..geoserver.helpers import ogc_server_settings
 from . import files
 from .utils import get_kml_doc
@@ -65,17 +67,7 @@ def validate_uploaded_files(cleaned, uploaded_files, field_spatial_types):
         if not zipfile.is_zipfile(cleaned["base_file"]):
             raise forms.ValidationError(_("Invalid zip file detected"))
 
-        # Let's check if the zip file contains a valid ESRI Shapefile
-        valid_extensions = validate_shapefile(cleaned["base_file"])
-        if not valid_extensions:
-            # Let's check if the zip file contains a valid KMZ
-            valid_extensions = validate_kmz(cleaned["base_file"])
-        if not valid_extensions:
-            # Let's check if the zip file contains a valid KML
-            valid_extensions = validate_kml_zip(cleaned["base_file"])
-        if not valid_extensions:
-            # Let's check if the zip file contains any valid Raster Image
-            valid_extensions = validate_raster_zip(cleaned["base_file"])
+        valid_extensions = validate_zip(cleaned["base_file"])
         if not valid_extensions:
             # No suitable data have been found on the ZIP file; raise a ValidationError
             raise forms.ValidationError(
@@ -206,36 +198,61 @@ def validate_kml(possible_files):
     return result
 
 
-def validate_kml_zip(kmz_django_file):
-    kml_bytes = None
-    with zipfile.ZipFile(kmz_django_file, allowZip64=True) as zip_handler:
-        zip_contents = zip_handler.namelist()
-        kml_files = [i for i in zip_contents if i.lower().endswith(".kml")]
-        if not kml_files:
-            return None
-        if len(kml_files) > 1:
-            raise forms.ValidationError(
-                _("Only one kml file per ZIP is allowed"))
-        kml_zip_path = kml_files[0]
-        kml_bytes = zip_handler.read(kml_zip_path)
+def validate_zip(zip_django_file):
+    """Validates the contents of an uploaded zip file
+
+    The archive is opened only once and its members are never extracted.
+    The checks for the supported formats run over the same listing of its
+    members by priority (ESRI Shapefile, KMZ, KML, Raster Image) and the
+    first valid one wins.
+    """
+    validators = (
+        _validate_shapefile_zip,
+        _validate_kmz_zip,
+        _validate_kml_zip,
+        _validate_raster_zip,
+    )
+    with zipfile.ZipFile(zip_django_file, allowZip64=True) as zip_handler:
+        zip_contents = _zip_contents(zip_handler)
+        for validator in validators:
+            valid_extensions = validator(zip_handler, zip_contents)
+            if valid_extensions:
+                return valid_extensions
+    return None
+
+
+def _zip_contents(zip_handler):
+    try:
+        check_zip_members(zip_handler)
+    except GeoNodeException as e:
+        raise forms.ValidationError(str(e))
+    return [i.filename for i in zip_handler.infolist() if not i.is_dir()]
+
+
+def _validate_kml_zip(zip_handler, zip_contents):
+    kml_files = [i for i in zip_contents if i.lower().endswith(".kml")]
+    if not kml_files:
+        return None
+    if len(kml_files) > 1:
+        raise forms.ValidationError(
+            _("Only one kml file per ZIP is allowed"))
+    kml_bytes = zip_handler.read(kml_files[0])
     kml_doc, namespaces = get_kml_doc(kml_bytes)
     if kml_doc and namespaces:
         return ("zip",)
     return None
 
 
-def validate_kmz(kmz_django_file):
-    with zipfile.ZipFile(kmz_django_file, allowZip64=True) as zip_handler:
-        zip_contents = zip_handler.namelist()
-        kml_files = [i for i in zip_contents if i.lower().endswith(".kml")]
-        if len(kml_files) > 1:
-            raise forms.ValidationError(
-                _("Only one kml file per kmz is allowed"))
-        try:
-            kml_zip_path = kml_files[0]
-            kml_bytes = zip_handler.read(kml_zip_path)
-        except IndexError:
-            return None
+def _validate_kmz_zip(zip_handler, zip_contents):
+    kml_files = [i for i in zip_contents if i.lower().endswith(".kml")]
+    if len(kml_files) > 1:
+        raise forms.ValidationError(
+            _("Only one kml file per kmz is allowed"))
+    try:
+        kml_zip_path = kml_files[0]
+        kml_bytes = zip_handler.read(kml_zip_path)
+    except IndexError:
+        return None
     other_filenames = [
         i for i in zip_contents if not i.lower().endswith(".kml")]
     if _validate_kml_bytes(kml_bytes, other_filenames):
@@ -244,13 +261,35 @@ def validate_kmz(kmz_django_file):
         return None
 
 
+def _validate_shapefile_zip(zip_handler, zip_contents):
+    if _validate_shapefile_components(zip_contents):
+        return ("zip",)
+    return None
+
+
+def _validate_raster_zip(zip_handler, zip_contents):
+    valid_extensions = validate_raster(zip_contents, allow_multiple=True)
+    if valid_extensions:
+        if "zip-mosaic" not in valid_extensions:
+            return ("zip",)
+        else:
+            return ("zip-mosaic",)
+    return None
+
+
+def validate_kml_zip(kmz_django_file):
+    with zipfile.ZipFile(kmz_django_file, allowZip64=True) as zip_handler:
+        return _validate_kml_zip(zip_handler, _zip_contents(zip_handler))
+
+
+def validate_kmz(kmz_django_file):
+    with zipfile.ZipFile(kmz_django_file, allowZip64=True) as zip_handler:
+        return _validate_kmz_zip(zip_handler, _zip_contents(zip_handler))
+
+
 def validate_shapefile(zip_django_file):
-    valid_extensions = None
     with zipfile.ZipFile(zip_django_file, allowZip64=True) as zip_handler:
-        contents = zip_handler.namelist()
-        if _validate_shapefile_components(contents):
-            valid_extensions = ("zip",)
-    return valid_extensions
+        return _validate_shapefile_zip(zip_handler, _zip_contents(zip_handler))
 
 
 def validate_raster(contents, allow_multiple=False):
@@ -307,13 +346,5 @@ def validate_raster(contents, allow_multiple=False):
 
 
 def validate_raster_zip(zip_django_file):
-    valid_extensions = None
     with zipfile.ZipFile(zip_django_file, allowZip64=True) as zip_handler:
-        contents = zip_handler.namelist()
-        valid_extensions = validate_raster(contents, allow_multiple=True)
-    if valid_extensions:
-        if "zip-mosaic" not in valid_extensions:
-            return ("zip",)
-        else:
-            return ("zip-mosaic",)
-    return None
+        return _validate_raster_zip(zip_handler, _zip_contents(zip_handler))
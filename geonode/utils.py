@@ -31,6 +31,7 @@ import shutil
 import string
 import logging
 import tarfile
+import itertools
 import datetime
 import requests
 import tempfile
@@ -41,10 +42,10 @@ from osgeo import ogr
 from io import StringIO
 from decimal import Decimal
 from slugify import slugify
-from contextlib import closing
+from contextlib import closing, contextmanager
 from collections import defaultdict
 from math import atan, exp, log, pi, sin, tan, floor
-from zipfile import ZipFile, is_zipfile, ZIP_DEFLATED
+from zipfile import ZipFile, ZipInfo, is_zipfile, ZIP_DEFLATED
 from requests.packages.urllib3.util.retry import Retry
 
 from django.conf import settings
@@ -96,6 +97,7 @@ ALPHABET_REVERSE = {c: i for (i, c) in enumerate(ALPHABET)}
 BASE = len(ALPHABET)
 SIGN_CHARACTER = '$'
 SQL_PARAMS_RE = re.compile(r'%\(([\w_\-]+)\)s')
+ZIP_CHUNK_SIZE = 1024 * 1024
 
 requests.packages.urllib3.disable_warnings()
 
@@ -126,15 +128,59 @@ def unzip_file(upload_file, extension='.shp', tempdir=None):
     if not os.path.isdir(tempdir):
         os.makedirs(tempdir)
 
-    the_zip = ZipFile(upload_file, allowZip64=True)
-    the_zip.extractall(tempdir)
-    for item in the_zip.namelist():
-        if item.endswith(extension):
-            absolute_base_file = os.path.join(tempdir, item)
+    with ZipFile(upload_file, allowZip64=True) as the_zip:
+        for item in extract_zip_members(the_zip, tempdir):
+            if item.endswith(extension):
+                absolute_base_file = item
 
     return absolute_base_file
 
 
+def check_zip_members(zip_handler, members=None):
+    """
+    Checks that the archive members can be safely extracted, without reading their contents.
+
+    Raises a GeoNodeException as soon as a member tries to escape the destination folder.
+    """
+    if members is None:
+        members = zip_handler.infolist()
+    for member in members:
+        name = member.filename if hasattr(member, 'filename') else member
+        parts = name.replace('\\', '/').split('/')
+        if os.path.isabs(name) or name.startswith('/') or '..' in parts or ':' in parts[0]:
+            raise GeoNodeException(
+                "Invalid file name '{}' found in the archive.".format(name))
+    return members
+
+
+def extract_zip_members(zip_handler, destination, members=None):
+    """
+    Streams the archive members into the destination folder, one member at a time.
+
+    All the member names are checked before writing anything to disk and the CRC of
+    each member is verified while it is copied, so a broken archive fails on the
+    first corrupted member instead of after a full extraction.
+    Returns the list of the extracted file paths.
+    """
+    members = check_zip_members(zip_handler, members)
+    paths = []
+    for member in members:
+        if not isinstance(member, ZipInfo):
+            member = zip_handler.getinfo(member)
+        _path = os.path.join(destination, member.filename)
+        if member.is_dir():
+            if not os.path.isdir(_path):
+                os.makedirs(_path)
+            continue
+        _dir = os.path.dirname(_path)
+        if _dir and not os.path.isdir(_dir):
+            os.makedirs(_dir)
+        with zip_handler.open(member) as source, open(_path, 'wb') as target:
+            shutil.copyfileobj(source, target, ZIP_CHUNK_SIZE)
+        paths.append(_path)
+    return paths
+
+
 def extract_tarfile(upload_file, extension='.shp', tempdir=None):
     """
     Extracts a tarfile into a temporary directory and returns the full path of the .shp file inside (if any)
@@ -878,6 +924,46 @@ def _get_viewer_projection_info(srid):
     return _viewer_projection_lookup.get(srid, {})
 
 
+def get_request_cache(request, name):
+    """Returns the dict `name` living as long as the request.
+
+    Only safe (GET/HEAD) requests are cached: any other request, or no
+    request at all, gets a new empty dict every time.
+    """
+    if getattr(request, 'method', None) not in ('GET', 'HEAD'):
+        return {}
+    return request.__dict__.setdefault('_geonode_cache', {}).setdefault(name, {})
+
+
+@contextmanager
+def count_queries():
+    """Counts the queries run in the block: `with count_queries() as queries: ... queries[0]`"""
+    queries = [0]
+
+    def _count(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(_count):
+        yield queries
+
+
+def _get_resource_group_managers(obj_to_check):
+    """Returns the ids of the non superuser managers of the groups of the resource."""
+    from guardian.shortcuts import get_groups_with_perms
+    from geonode.groups.models import GroupMember
+
+    group_names = set(get_groups_with_perms(obj_to_check).values_list('name', flat=True))
+    if obj_to_check.group:
+        group_names.add(obj_to_check.group.name)
+    if not group_names:
+        return set()
+    return set(GroupMember.objects.filter(
+        group__slug__in=group_names,
+        role=GroupMember.MANAGER,
+        user__is_superuser=False).values_list('user', flat=True))
+
+
 def resolve_object(request, model, query, permission='base.view_resourcebase',
                    user=None, permission_required=True, permission_msg=None):
     """Resolve an object using the provided query and check the optional
@@ -887,36 +973,34 @@ def resolve_object(request, model, query, permission='base.view_resourcebase',
     permission - an optional permission to check
     permission_required - if False, allow get methods to proceed
     permission_msg - optional message to use in 403
+
+    The resolved objects, the group managers and the permission checks are
+    cached for the lifetime of GET requests (see `get_request_cache`).
     """
-    user = request.user if request and request.user else user
-    obj = get_object_or_404(model, **query)
-    obj_to_check = obj.get_self_resource()
+    with count_queries() as queries:
+        try:
+            return _resolve_object(request, model, query, permission=permission, user=user,
+                                   permission_required=permission_required, permission_msg=permission_msg)
+        finally:
+            logger.debug(f"resolve_object {model.__name__} {query}: {queries[0]} queries")
 
-    from guardian.shortcuts import assign_perm, get_groups_with_perms
-    from geonode.groups.models import GroupProfile
 
-    groups = get_groups_with_perms(obj_to_check,
-                                   attach_perms=True)
+def _resolve_object(request, model, query, permission='base.view_resourcebase',
+                    user=None, permission_required=True, permission_msg=None):
+    user = request.user if request and request.user else user
+    cache = get_request_cache(request, 'resolve_object')
 
-    if obj_to_check.group and obj_to_check.group not in groups:
-        groups[obj_to_check.group] = obj_to_check.group
+    obj_key = (model._meta.label, tuple(sorted((k, str(v)) for k, v in query.items())))
+    if obj_key not in cache:
+        cache[obj_key] = get_object_or_404(model, **query)
+    obj = cache[obj_key]
+    obj_to_check = obj.get_self_resource()
 
-    obj_group_managers = []
-    obj_group_members = []
-    if groups:
-        for group in groups:
-            try:
-                group_profile = GroupProfile.objects.get(slug=group.name)
-                managers = group_profile.get_managers()
-                if managers:
-                    for manager in managers:
-                        if manager not in obj_group_managers and not manager.is_superuser:
-                            obj_group_managers.append(manager)
-                if group_profile.user_is_member(
-                        user) and user not in obj_group_members:
-                    obj_group_members.append(user)
-            except GroupProfile.DoesNotExist:
-                pass
+    managers_key = ('managers', obj_to_check.pk)
+    if managers_key not in cache:
+        cache[managers_key] = _get_resource_group_managers(obj_to_check)
+    obj_group_managers = cache[managers_key]
+    is_group_manager = bool(user and user.pk in obj_group_managers)
 
     if settings.RESOURCE_PUBLISHING or settings.ADMIN_MODERATE_UPLOADS:
         is_admin = False
@@ -925,40 +1009,37 @@ def resolve_object(request, model, query, permission='base.view_resourcebase',
         if user and user.is_authenticated:
             is_admin = user.is_superuser if user else False
             try:
-                is_manager = user.groupmember_set.all().filter(role='manager').exists()
+                is_manager_key = ('is_manager', user.pk)
+                if is_manager_key not in cache:
+                    cache[is_manager_key] = user.groupmember_set.all().filter(role='manager').exists()
+                is_manager = cache[is_manager_key]
             except Exception:
                 is_manager = False
         if (not obj_to_check.is_approved):
             if not user or user.is_anonymous:
                 raise Http404
             elif not is_admin:
-                if is_manager and user in obj_group_managers:
+                if is_manager and is_group_manager:
                     if (not user.has_perm('publish_resourcebase', obj_to_check)) and (
                         not user.has_perm('view_resourcebase', obj_to_check)) and (
                             not user.has_perm('change_resourcebase_metadata', obj_to_check)) and (
                                 not is_owner and not settings.ADMIN_MODERATE_UPLOADS):
                         pass
                     else:
-                        assign_perm(
-                            'view_resourcebase', user, obj_to_check)
-                        assign_perm(
+                        from guardian.shortcuts import assign_perm, get_perms
+
+                        perms = [
+                            'view_resourcebase',
                             'publish_resourcebase',
-                            user,
-                            obj_to_check)
-                        assign_perm(
                             'change_resourcebase_metadata',
-                            user,
-                            obj_to_check)
-                        assign_perm(
-                            'download_resourcebase',
-                            user,
-                            obj_to_check)
-
+                            'download_resourcebase']
                         if is_owner:
-                            assign_perm(
-                                'change_resourcebase', user, obj_to_check)
-                            assign_perm(
-                                'delete_resourcebase', user, obj_to_check)
+                            perms += ['change_resourcebase', 'delete_resourcebase']
+                        # assign only what is missing, this runs while reading the resource
+                        granted = set(get_perms(user, obj_to_check))
+                        for perm in perms:
+                            if perm not in granted:
+                                assign_perm(perm, user, obj_to_check)
 
     allowed = True
     if permission.split('.')[-1] in ['change_layer_data',
@@ -967,12 +1048,15 @@ def resolve_object(request, model, query, permission='base.view_resourcebase',
             obj_to_check = obj
     if permission:
         if permission_required or request.method != 'GET':
-            if user in obj_group_managers:
+            if is_group_manager:
                 allowed = True
             else:
-                allowed = user.has_perm(
-                    permission,
-                    obj_to_check)
+                allowed_key = ('allowed', user.pk, obj_to_check._meta.label, obj_to_check.pk, permission)
+                if allowed_key not in cache:
+                    cache[allowed_key] = user.has_perm(
+                        permission,
+                        obj_to_check)
+                allowed = cache[allowed_key]
     if not allowed:
         mesg = permission_msg or _('Permission Denied')
         raise PermissionDenied(mesg)
@@ -2188,3 +2272,15 @@ def json_serializer_producer(dictionary):
                     y = model_to_dict(_obj)
             output[x] = to_json(y)
     return output
+
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into lists of at most 'size' items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk